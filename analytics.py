@@ -0,0 +1,147 @@
+import math
+from collections import namedtuple
+
+np = None  # NumPy, once load_numpy has imported it
+_numpy_missing = False
+
+RECENT_RUNS = 10  # runs that make up a scenario's current form
+MIN_RUNS = 3  # runs needed before a scenario's form means anything
+MIN_SCENARIOS = 3  # scenarios needed before an aim type can be called the weakest
+SPREAD_FLOOR = 0.01  # of the PB, so a few identical runs don't make a PB look certain
+FOCUS_POOL = 20
+
+ScenarioSkill = namedtuple("ScenarioSkill", "name aim_type runs pb mean std recent_mean recent_std trend "
+                                            "last_played gap reach")
+ScenarioSkill.__doc__ = """
+How a scenario is going. recent_* and trend (score per run, least squares) cover the last RECENT_RUNS
+runs. gap is how far recent_mean is below the PB, as a fraction of it. reach is how many recent
+spreads the PB is above the next run's expected score (recent_mean + trend): the lower, the likelier a PB.
+"""
+AimTypeSkill = namedtuple("AimTypeSkill", "aim_type scenarios runs gap trend")
+AimTypeSkill.__doc__ = """Averages over an aim type's scenarios; trend is relative to each PB."""
+
+
+def load_numpy():
+    """
+    NumPy, imported on first use rather than with the module since it is slow to load, or None if it
+    isn't installed; it is optional, the pure-Python passes give the same results, just slower.
+    """
+    global np, _numpy_missing
+    if np is None and not _numpy_missing:
+        try:
+            import numpy
+        except ImportError:
+            _numpy_missing = True
+        else:
+            np = numpy
+    return np
+
+
+def _encode(runs):
+    """
+    Scenario codes, names, timestamps and scores (None where a run has none) of the runs. Names are
+    only lowercased once each, not once per run; scenarios are coded in order of first appearance.
+    """
+    runs = runs if isinstance(runs, list) else list(runs)
+    run_names, stamps, scores = [r[0] for r in runs], [r[1] for r in runs], [r[2] for r in runs]
+    names, by_key, code_of = [], {}, {}
+    for name in dict.fromkeys(run_names):
+        key = name.lower()
+        code = by_key.get(key)
+        if code is None: code = by_key[key] = len(names); names.append(name)
+        code_of[name] = code
+    return list(map(code_of.__getitem__, run_names)), names, stamps, scores
+
+
+def _columns_numpy(codes, stamps, scores, groups, recent):
+    """Per-scenario columns in a handful of array passes over runs sorted by (scenario, time)."""
+    scores = np.array(scores, dtype=np.float64)  # None becomes NaN
+    scored = ~np.isnan(scores)
+    codes, stamps = np.array(codes, dtype=np.int64)[scored], np.array(stamps, dtype=np.float64)[scored]
+    scores = scores[scored]
+    if not len(codes): return ()
+    order = np.argsort(stamps)
+    order = order[np.argsort(codes[order], kind="stable")]
+    codes, stamps, scores = codes[order], stamps[order], scores[order]
+    starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+    counts = np.diff(np.r_[starts, len(codes)])
+    group = np.repeat(np.arange(len(starts)), counts)
+    mean = np.add.reduceat(scores, starts) / counts
+    std = np.sqrt(np.add.reduceat((scores - mean[group]) ** 2, starts) / counts)
+    from_end = counts[group] - 1 - (np.arange(len(codes)) - starts[group])
+    tail = from_end < recent
+    tail_group, tail_scores = group[tail], scores[tail]
+    k = np.minimum(counts, recent)
+    recent_mean = np.bincount(tail_group, tail_scores, len(starts)) / k
+    deviation = tail_scores - recent_mean[tail_group]
+    recent_std = np.sqrt(np.bincount(tail_group, deviation * deviation, len(starts)) / k)
+    x = (k[tail_group] - 1 - from_end[tail]) - (k[tail_group] - 1) / 2
+    sxx = np.bincount(tail_group, x * x, len(starts))
+    trend = np.divide(np.bincount(tail_group, x * deviation, len(starts)), sxx, out=np.zeros(len(starts)),
+                      where=sxx > 0)
+    columns = (codes[starts], counts, np.maximum.reduceat(scores, starts), mean, std, recent_mean, recent_std, trend,
+               stamps[starts + counts - 1])
+    return zip(*(column.tolist() for column in columns))
+
+
+def _columns_python(codes, stamps, scores, groups, recent):
+    runs = [[] for _ in range(groups)]
+    for code, timestamp, score in zip(codes, stamps, scores):
+        if score is not None: runs[code].append((timestamp, score))
+    for code, items in enumerate(runs):
+        if not items: continue
+        items.sort()
+        values = [score for _, score in items]
+        n, tail = len(values), values[-recent:]
+        k = len(tail)
+        mean, recent_mean = sum(values) / n, sum(tail) / k
+        middle = (k - 1) / 2
+        sxx = sum((i - middle) ** 2 for i in range(k))
+        trend = sum((i - middle) * (score - recent_mean) for i, score in enumerate(tail)) / sxx if sxx else 0.0
+        yield (code, n, max(values), mean, math.sqrt(sum((score - mean) ** 2 for score in values) / n), recent_mean,
+               math.sqrt(sum((score - recent_mean) ** 2 for score in tail) / k), trend, items[-1][0])
+
+
+class SkillProfile:
+    """
+    Per-scenario and per-aim type statistics over a run history of (scenario name, timestamp, score)
+    tuples, e.g. StatsIndex.runs(). With NumPy the per-run work is a few vectorised passes; without
+    it the same numbers come from plain loops. aim_type_of maps a lowercased scenario name to its aim
+    type (or None); scenarios without one are left out of the aim type stats.
+    """
+
+    def __init__(self, runs, aim_type_of=lambda key: None, recent=RECENT_RUNS, use_numpy=None):
+        codes, names, stamps, scores = _encode(runs)
+        columns = _columns_numpy if (load_numpy() is not None if use_numpy is None else use_numpy) else _columns_python
+        self.scenarios = {}  # lowercased name -> ScenarioSkill
+        totals = {}  # aim type -> [scenarios, runs, gap sum, relative trend sum]
+        for code, n, pb, mean, std, recent_mean, recent_std, trend, last_played in (
+                columns(codes, stamps, scores, len(names), recent) if codes else ()):
+            key, scale = names[code].lower(), abs(pb) or 1.0
+            gap = (pb - recent_mean) / scale
+            reach = (pb - recent_mean - trend) / max(recent_std, SPREAD_FLOOR * scale)
+            aim_type = aim_type_of(key)
+            self.scenarios[key] = ScenarioSkill(names[code], aim_type, n, pb, mean, std, recent_mean, recent_std, trend,
+                                                last_played, gap, reach)
+            if aim_type:
+                total = totals.setdefault(aim_type, [0, 0, 0.0, 0.0])
+                total[0] += 1; total[1] += n; total[2] += gap; total[3] += trend / scale
+        self.aim_types = {aim_type: AimTypeSkill(aim_type, count, n, gap / count, trend / count)
+                          for aim_type, (count, n, gap, trend) in totals.items()}
+
+    def likely_pbs(self, count=FOCUS_POOL, min_runs=MIN_RUNS):
+        """The count scenarios played at least min_runs times whose PB looks most within reach."""
+        ready = [s for s in self.scenarios.values() if s.runs >= min_runs]
+        return sorted(ready, key=lambda s: s.reach)[:count]
+
+    def weakest_aim_type(self, min_scenarios=MIN_SCENARIOS):
+        """The aim type whose scenarios are, on average, played furthest below their PBs. None if none qualifies."""
+        qualifying = [a for a in self.aim_types.values() if a.scenarios >= min_scenarios]
+        return max(qualifying, key=lambda a: a.gap, default=None)
+
+    def weakest(self, count=FOCUS_POOL, min_scenarios=MIN_SCENARIOS):
+        """The count scenarios of the weakest aim type furthest below their PBs."""
+        weakest = self.weakest_aim_type(min_scenarios)
+        if weakest is None: return []
+        scenarios = [s for s in self.scenarios.values() if s.aim_type == weakest.aim_type]
+        return sorted(scenarios, key=lambda s: s.gap, reverse=True)[:count]
@@ -0,0 +1,1194 @@
+"""
+Benchmarks run against a local stand-in for the kovaaks.com webapp backend.
+
+Usage: python bench.py <benchmark> [<benchmark> ...]
+       python bench.py all
+       python bench.py record    (records live API responses for the loops benchmark to replay)
+"""
+import bisect
+import gzip
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+from urllib.request import urlopen
+
+UPSTREAM = "https://kovaaks.com/webapp-backend"
+FIXTURES_FILE = os.environ.get("KOVAAKS_BENCH_FIXTURES", os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                                       "bench_fixtures.json.gz"))
+
+
+class FakeBackend:
+    """
+    Serves generated leaderboards and scenarios and counts every request it answers. Recorded
+    fixtures are replayed ahead of the generated data, and with an upstream set, requests without a
+    fixture are fetched from it and recorded.
+    """
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.failure_rate = 0.0  # fraction of requests answered with a 503
+        self.throttle_rate = 0.0  # fraction of requests answered with a 429
+        self.etags = False  # send ETags and answer If-None-Match with 304
+        self.leaderboards = {}  # leaderboardId -> list of (score, username), best first
+        self.epochs = {}  # (leaderboardId, username) -> when the score was set, for rows changed by mutate_leaderboard
+        self.scenarios = []  # raw "popular" rows
+        self.fixtures = {}  # path and query below /webapp-backend -> recorded response body
+        self.upstream = None
+        self.request_count = 0
+        self.bytes_sent = 0
+        self._lock = threading.Lock()
+        backend = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                backend._handle(self)
+
+            def log_message(self, *args):
+                pass
+
+        # The default listen backlog of 5 drops connections under concurrent paging.
+        ThreadingHTTPServer.request_queue_size = 128
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self.base_url = f"http://127.0.0.1:{self._server.server_address[1]}/webapp-backend"
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def reset_counters(self):
+        with self._lock: self.request_count, self.bytes_sent = 0, 0
+
+    def load_fixtures(self, path=FIXTURES_FILE):
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            self.fixtures.update({key: body.encode() for key, body in json.load(f).items()})
+        return len(self.fixtures)
+
+    def save_fixtures(self, path=FIXTURES_FILE):
+        with gzip.open(path, 'wt', encoding='utf-8') as f:
+            json.dump({key: body.decode() for key, body in self.fixtures.items()}, f)
+
+    def _fixture(self, request):
+        key = request.path.partition("/webapp-backend")[2]
+        payload = self.fixtures.get(key)
+        if payload is None and self.upstream:
+            with urlopen(self.upstream + key, timeout=30) as resp:
+                payload = resp.read()
+            with self._lock: self.fixtures[key] = payload
+        return payload
+
+    def add_leaderboard(self, leaderboard_id, size, seed=0):
+        rng = random.Random(seed)
+        scores = sorted((round(rng.lognormvariate(6, 0.5), 2) for _ in range(size)), reverse=True)
+        self.leaderboards[leaderboard_id] = [(s, f"player{leaderboard_id}_{i}") for i, s in enumerate(scores)]
+        return self.leaderboards[leaderboard_id]
+
+    def mutate_leaderboard(self, leaderboard_id, new_players=0, improvements=0, rng=random):
+        """Adds players and raises some existing PBs, as a live leaderboard changes between visits."""
+        with self._lock:
+            rows, epoch = {name: score for score, name in self.leaderboards[leaderboard_id]}, int(time.time())
+            for _ in range(new_players):
+                name = f"player{leaderboard_id}_new{len(rows)}"
+                rows[name] = round(rng.lognormvariate(6, 0.5), 2)
+                self.epochs[leaderboard_id, name] = epoch
+            for name in rng.sample(sorted(rows), min(improvements, len(rows))):
+                rows[name] = round(rows[name] * rng.uniform(1.001, 1.1), 2)
+                self.epochs[leaderboard_id, name] = epoch
+            # A stable sort, so tied rows keep their order as they do on the real leaderboards.
+            self.leaderboards[leaderboard_id] = sorted(((score, name) for name, score in rows.items()),
+                                                       key=lambda row: -row[0])
+
+    def add_scenarios(self, count, seed=0):
+        rng = random.Random(seed)
+        aim_types = ["Clicking", "Tracking", "Switching", "Strafe"]
+        for i in range(count):
+            entries = int(rng.paretovariate(1.2) * 50)
+            self.scenarios.append({
+                "rank": len(self.scenarios) + 1, "leaderboardId": 100_000 + len(self.scenarios),
+                "scenarioName": f"Scenario {len(self.scenarios)} {rng.choice(aim_types)}",
+                "scenario": {"aimType": rng.choice(aim_types), "authors": [f"author{rng.randint(0, 500)}"],
+                             "description": ""},
+                "counts": {"plays": entries * rng.randint(1, 20), "entries": entries},
+            })
+
+    def _handle(self, request):
+        if self.latency: time.sleep(self.latency)
+        roll = random.random()
+        if roll < self.failure_rate + self.throttle_rate:
+            status = 503 if roll < self.failure_rate else 429
+            with self._lock: self.request_count += 1
+            request.send_response(status)
+            request.send_header("Retry-After", "0")
+            request.send_header("Content-Length", "0")
+            request.end_headers()
+            return
+        url = urlparse(request.path)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        page, per_page = int(query.get("page", 0)), int(query.get("max", 10))
+        try:
+            payload = self._fixture(request)
+        except OSError as e:
+            print(f"   Upstream request failed: {e}")
+            request.send_error(502)
+            return
+        if payload is not None:
+            body = None
+        elif url.path.endswith("/leaderboard/scores/global"):
+            rows = self.leaderboards.get(int(query["leaderboardId"]), [])
+            data = [{"steamId": str(76561190000000000 + zlib.crc32(name.encode())), "score": score, "rank": rank,
+                     "steamAccountName": name, "webappUsername": name,
+                     "attributes": {"fov": 103, "cm360": 34.6, "kills": 50,
+                                    "epoch": self.epochs.get((int(query["leaderboardId"]), name), 1_700_000_000)}}
+                    for rank, (score, name) in enumerate(rows[page * per_page:(page + 1) * per_page],
+                                                         start=page * per_page + 1)]
+            body = {"data": data, "total": len(rows)}
+        elif url.path.endswith("/user/scenario/total-play"):
+            username, by_id = query["username"], {row["leaderboardId"]: row for row in self.scenarios}
+            rows = [dict(by_id.get(lid, {"leaderboardId": lid, "scenarioName": f"Leaderboard {lid}"}), score=score, rank=rank)
+                    for lid, board in self.leaderboards.items()
+                    for rank, (score, name) in enumerate(board, start=1) if name == username]
+            body = {"data": rows[page * per_page:(page + 1) * per_page], "total": len(rows)}
+        elif url.path.endswith("/scenario/popular"):
+            rows = self.scenarios
+            if "scenarioNameSearch" in query:
+                needle = query["scenarioNameSearch"].lower()
+                rows = [r for r in rows if needle in r["scenarioName"].lower()]
+            body = {"data": rows[page * per_page:(page + 1) * per_page], "total": len(rows)}
+        else:
+            request.send_error(404)
+            return
+        if body is not None: payload = json.dumps(body).encode()
+        etag = f'"{hash(payload) & 0xffffffff:08x}"'
+        if self.etags and request.headers.get("If-None-Match") == etag:
+            with self._lock: self.request_count += 1
+            request.send_response(304)
+            request.send_header("ETag", etag)
+            request.end_headers()
+            return
+        with self._lock:
+            self.request_count += 1
+            self.bytes_sent += len(payload)
+        request.send_response(200)
+        request.send_header("Content-Type", "application/json")
+        if self.etags: request.send_header("ETag", etag)
+        request.send_header("Content-Length", str(len(payload)))
+        request.end_headers()
+        request.wfile.write(payload)
+
+
+_backend = None
+
+
+def get_backend():
+    """Starts the shared stand-in server and points the client's endpoints at it."""
+    global _backend
+    if _backend is None:
+        _backend = FakeBackend()
+        # Keep the benchmarks' caches away from the user's real ones.
+        os.environ["KOVAAKS_CACHE_DIR"] = tempfile.mkdtemp(prefix="kovaaks-bench-")
+        # endpoints.py reads this at import time, so it must be set before the client is imported.
+        os.environ["KOVAAKS_API_BASE"] = _backend.base_url
+    return _backend
+
+
+def bench_rank():
+    """Requests per rank lookup: linear page walk vs bisection."""
+    backend = get_backend()
+    from kovaaker import KovaakerClient
+    from kovaakscenpicker import get_rank_for_score
+
+    rows = backend.add_leaderboard(1, 200_000, seed=1)
+    client = KovaakerClient()
+    for fraction in (0.001, 0.1, 0.5, 0.9, 0.999):
+        target = rows[int(len(rows) * fraction)][0]
+
+        backend.reset_counters(); start = time.perf_counter()
+        linear_rank = 1_000_000
+        for page in client.scenario_leaderboard(1, per_page=100, by_page=True):
+            hit = next((s.rank for s in page if s.score <= target), None)
+            if hit is not None: linear_rank = hit; break
+        linear_requests, linear_time = backend.request_count, time.perf_counter() - start
+
+        backend.reset_counters(); start = time.perf_counter()
+        rank = get_rank_for_score(1, target, len(rows), client)
+        fast_requests, fast_time = backend.request_count, time.perf_counter() - start
+
+        assert rank == linear_rank, (rank, linear_rank)
+        print(f"rank @ {fraction:>6.1%}: linear {linear_requests:5d} req {linear_time * 1000:8.1f} ms | "
+              f"bisect {fast_requests:3d} req {fast_time * 1000:7.1f} ms")
+
+
+def bench_score_index():
+    """Requests per get_user_score: cold scan vs repeat lookups served by the score index."""
+    backend = get_backend()
+    from kovaaker import KovaakerClient
+    from score_index import ScoreIndex
+
+    rows = backend.add_leaderboard(2, 50_000, seed=2)
+    with tempfile.TemporaryDirectory() as tmp:
+        client = KovaakerClient(score_index=ScoreIndex(os.path.join(tmp, "scores.db")))
+        for label, username in (("cold, mid-pack", rows[25_000][1]), ("warm, same user", rows[25_000][1]),
+                                ("cold miss", "nobody"), ("warm miss", "nobody"),
+                                ("warm, tail user", rows[40_000][1])):
+            backend.reset_counters(); start = time.perf_counter()
+            client.get_user_score(2, username)
+            print(f"{label:>16}: {backend.request_count:4d} req {(time.perf_counter() - start) * 1000:8.2f} ms")
+        client.score_index.close()
+
+
+def write_stats_csv(folder, name, stamp, score, kill_rows=120):
+    """Writes one synthetic KovaaK's stats CSV and returns its path."""
+    path = os.path.join(folder, f"{name} - Challenge - {stamp} Stats.csv")
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write("Kill #,Timestamp,Bot,Weapon,TTK,Shots,Hits,Accuracy,Damage Done,Damage Possible,Efficiency,Cheated\n")
+        f.writelines(f"{k},12:00:{k % 60:02d}.000,Bot,Gun,0.5s,2,1,0.5,100,200,0.5,false\n" for k in range(1, kill_rows))
+        f.write("\nWeapon,Shots,Hits,Damage Done,Damage Possible,,Sens Scale,Horiz Sens,Vert Sens,FOV\n"
+                "Gun,238,119,11900,23800,,cm/360,34.6,34.6,103\n")
+        f.write(f"\nKills:,119\nDeaths:,0\nFight Time:,60.0\nAvg TTK:,0.5\nDamage Done:,11900\n"
+                f"Score:,{score:.2f}\nScenario:,{name}\nHash:,abcdef\nGame Version:,3.4\n"
+                f"Sens Scale:,cm/360\nHoriz Sens:,34.6\nVert Sens:,34.6\nFOV:,103\nFOVScale:,Overwatch\n"
+                f"Resolution:,1920x1080\nAvg FPS:,240\n")
+    return path
+
+
+def write_stats_folder(folder, count, scenarios=2_000, seed=0, kill_rows=120):
+    """Fills a folder with synthetic KovaaK's stats CSVs."""
+    rng = random.Random(seed)
+    for i in range(count):
+        name = f"Scenario {rng.randrange(scenarios)}"
+        stamp = time.strftime("%Y.%m.%d-%H.%M.%S", time.localtime(1_600_000_000 + i * 97))
+        write_stats_csv(folder, name, stamp, rng.uniform(100, 1000), kill_rows)
+
+
+def bench_stats_index():
+    """Cold (serial and process pool) and incremental stats-folder indexing, and played/PB lookups, on 50k CSVs."""
+    import stats_index
+    from stats_index import StatsIndex
+
+    with tempfile.TemporaryDirectory() as tmp:
+        folder = os.path.join(tmp, "stats"); os.mkdir(folder)
+        write_stats_folder(folder, 50_000)
+        cache_file = os.path.join(tmp, "index.json")
+        threshold, stats_index.POOL_THRESHOLD = stats_index.POOL_THRESHOLD, float("inf")
+        try:
+            start = time.perf_counter(); read = StatsIndex(folder, os.path.join(tmp, "serial.json")).refresh()
+        finally:
+            stats_index.POOL_THRESHOLD = threshold
+        print(f"{'cold, serial':>14}: {(time.perf_counter() - start) * 1000:8.1f} ms, {read} files read")
+        for label in ("cold", "warm (cached)"):
+            start = time.perf_counter()
+            index = StatsIndex(folder, cache_file); read = index.refresh()
+            print(f"{label:>14}: {(time.perf_counter() - start) * 1000:8.1f} ms, {read} files read")
+        write_stats_folder(folder, 100, seed=1)
+        start = time.perf_counter(); read = StatsIndex(folder, cache_file).refresh()
+        print(f"{'+100 new':>14}: {(time.perf_counter() - start) * 1000:8.1f} ms, {read} files read")
+        played = index.played()
+        start = time.perf_counter()
+        for i in range(100_000): f"scenario {i % 4000}" in played
+        print(f"{'played lookup':>14}: {(time.perf_counter() - start) * 1e9 / 100_000:8.1f} ns")
+
+
+def bench_catalog(latency=0.03):
+    """Pick latency: two round trips per pick (old path) vs the in-memory scenario catalog."""
+    backend = get_backend()
+    from kovaaker import KovaakerClient
+    from catalog import ScenarioCatalog
+
+    if not backend.scenarios: backend.add_scenarios(20_000)
+    client = KovaakerClient()
+    backend.latency = latency
+    try:
+        start = time.perf_counter()
+        for _ in range(10):
+            page_index = random.randint(0, client.scenario_count() // 20 - 1)
+            random.choice(next(client.scenario_search(start_page=page_index, per_page=20)))
+        print(f"{'network pick':>14}: {(time.perf_counter() - start) * 1000 / 10:10.1f} ms/pick "
+              f"({latency * 1000:.0f} ms injected latency)")
+    finally:
+        backend.latency = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "catalog.json.gz")
+        catalog = ScenarioCatalog(client, path)
+        start = time.perf_counter(); catalog.refresh()
+        print(f"{'full refresh':>14}: {(time.perf_counter() - start) * 1000:10.1f} ms, "
+              f"{len(catalog)} scenarios, {os.path.getsize(path) / 1024:.0f} KiB on disk")
+        catalog = ScenarioCatalog(client, path)
+        start = time.perf_counter(); catalog.load()
+        print(f"{'snapshot load':>14}: {(time.perf_counter() - start) * 1000:10.1f} ms")
+        sampler = catalog.sampler()
+        start = time.perf_counter()
+        for _ in range(100_000): sampler.draw()
+        print(f"{'catalog pick':>14}: {(time.perf_counter() - start) * 1e6 / 100_000:10.3f} us/pick")
+
+
+def bench_paging(latency=0.05):
+    """Full-leaderboard scan throughput at several concurrency levels, with injected latency."""
+    backend = get_backend()
+    from kovaaker import KovaakerClient
+
+    backend.add_leaderboard(3, 20_000, seed=3)
+    client = KovaakerClient()
+    client.max_concurrency = 16
+    backend.latency = latency
+    try:
+        for concurrency in (1, 2, 4, 8, 16):
+            backend.reset_counters(); start = time.perf_counter()
+            pages = sum(1 for _ in client.scenario_leaderboard(3, per_page=100, concurrency=concurrency))
+            elapsed = time.perf_counter() - start
+            print(f"concurrency {concurrency:2d}: {pages / elapsed:7.1f} pages/s, "
+                  f"{backend.request_count - pages} wasted requests ({latency * 1000:.0f} ms injected latency)")
+        time.sleep(latency * 2)  # let the last scan's trailing requests land before counting
+        backend.reset_counters()
+        for page in client.scenario_leaderboard(3, per_page=100, concurrency=8):
+            break
+        time.sleep(latency * 2)
+        print(f"early stop after 1 page at concurrency 8: {backend.request_count} requests issued")
+    finally:
+        backend.latency = 0
+
+
+def console_hooks(is_active=lambda: True):
+    """Hooks dict for driving the challenge code without the GUI."""
+    from round_engine import SignalEvent
+    return {"is_active": is_active, "update_status": lambda text: None, "add_history": lambda text: None,
+            "update_history": lambda text: None, "update_score_label": lambda text: None,
+            "challenge_ended": lambda: None, "skip_event": SignalEvent(), "pause_timer": lambda: None,
+            "resume_timer": lambda: None, "stop_polling_event": SignalEvent()}
+
+
+def bench_unplayed(latency=0.02, played_fraction=0.9):
+    """Time to first unplayed scenario: serial checks vs the concurrent candidate pool."""
+    backend = get_backend()
+    from kovaaker import KovaakerClient
+    import kovaakscenpicker
+
+    rng = random.Random(4)
+    backend.scenarios.clear(); backend.add_scenarios(400, seed=4)
+    for row in backend.scenarios:
+        rows = backend.add_leaderboard(row["leaderboardId"], min(row["counts"]["entries"], 5_000), seed=row["rank"])
+        row["counts"]["entries"] = len(rows)
+        if rows and rng.random() < played_fraction:
+            position = rng.randrange(len(rows))
+            rows[position] = (rows[position][0], "benchuser")
+    from catalog import get_scenario_catalog
+    get_scenario_catalog().refresh_in_background().join()
+    backend.latency = latency
+    try:
+        for workers in (1, 4, 8):
+            timings, requests_made = [], 0
+            for trial in range(5):
+                random.seed(trial)
+                client = KovaakerClient()
+                backend.reset_counters(); start = time.perf_counter()
+                candidates = [s for s in get_scenario_catalog().sampler().sample(20) if s.entries]
+                candidates.sort(key=lambda s: s.entries)
+                kovaakscenpicker.first_unplayed_scenario(client, "benchuser", candidates, console_hooks(), workers)
+                timings.append(time.perf_counter() - start); requests_made += backend.request_count
+            print(f"{workers} worker(s): median {sorted(timings)[2] * 1000:8.1f} ms to first unplayed, "
+                  f"{requests_made / 5:6.1f} requests/search")
+    finally:
+        backend.latency = 0
+
+
+def legacy_watch_for_new_csv(stats_folder, initial_files, stop_event):
+    """The original listdir poller, kept here as the baseline."""
+    for _ in range(80):
+        if stop_event.is_set(): return None
+        new_files = set(os.listdir(stats_folder)) - initial_files
+        for file in new_files:
+            if file.lower().endswith('.csv'): return os.path.join(stats_folder, file)
+        stop_event.wait(1.5)
+    return None
+
+
+def bench_watcher(idle_seconds=2.2):
+    """New-CSV detection latency and CPU use while idle, at several stats folder sizes."""
+    import stats_watcher
+
+    watchers = {"legacy listdir": legacy_watch_for_new_csv, "mtime poll": stats_watcher.poll_for_new_csv}
+    if stats_watcher._libc: watchers["inotify"] = stats_watcher.inotify_for_new_csv
+    for size in (1_000, 10_000, 50_000):
+        with tempfile.TemporaryDirectory() as folder:
+            for i in range(size): open(os.path.join(folder, f"old {i} Stats.csv"), 'w').close()
+            for label, watcher in watchers.items():
+                initial_files, stop_event, found = stats_watcher.snapshot_folder(folder), threading.Event(), []
+                thread = threading.Thread(target=lambda: found.append(
+                    (watcher(folder, initial_files, stop_event), time.perf_counter())))
+                cpu_start = time.process_time(); thread.start()
+                time.sleep(idle_seconds)
+                written = time.perf_counter()
+                with open(os.path.join(folder, f"new {label} Stats.csv"), 'w') as f: f.write("Score:,1\n")
+                thread.join(10); stop_event.set()
+                cpu = time.process_time() - cpu_start
+                print(f"{size:6d} files, {label:>14}: detected in {(found[0][1] - written) * 1000:7.1f} ms, "
+                      f"{cpu * 1000:7.1f} ms CPU over {idle_seconds:.1f}s idle")
+
+
+def legacy_parse_score(csv_path):
+    """The original text-mode line scan, kept here as the baseline (minus the os.remove)."""
+    with open(csv_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.startswith("Score:,"): return float(line.strip().split(',')[1])
+    return None
+
+
+def bench_parser(count=10_000):
+    """Stats CSV parse throughput in files/s: text line scan vs mmap summary parse vs process pool."""
+    from stats_parser import parse_stats_file, parse_folder
+
+    for kill_rows in (120, 2_000):
+        with tempfile.TemporaryDirectory() as folder:
+            write_stats_folder(folder, count, kill_rows=kill_rows)
+            paths = [entry.path for entry in os.scandir(folder)]
+            for label, run in (("line scan", lambda: [legacy_parse_score(p) for p in paths]),
+                               ("mmap summary", lambda: [parse_stats_file(p) for p in paths]),
+                               ("process pool", lambda: parse_folder(folder))):
+                start = time.perf_counter(); run()
+                print(f"{kill_rows:5d} kill rows, {label:>13}: {count / (time.perf_counter() - start):10.0f} files/s")
+
+
+def bench_http(failure_rate=0.1, throttle_rate=0.05):
+    """Full scans through injected 503s and 429s, then ETag revalidation; prints the client's counters."""
+    backend = get_backend()
+    from kovaaker import KovaakerClient
+
+    rows = backend.add_leaderboard(5, 20_000, seed=5)
+    client = KovaakerClient()
+    backend.failure_rate, backend.throttle_rate = failure_rate, throttle_rate
+    try:
+        start = time.perf_counter()
+        found = client.get_user_score(5, rows[-1][1])
+        print(f"scan with {failure_rate:.0%} 503s + {throttle_rate:.0%} 429s: "
+              f"{'found' if found and found['rank'] == len(rows) else 'WRONG RESULT'} "
+              f"in {(time.perf_counter() - start) * 1000:.0f} ms")
+    finally:
+        backend.failure_rate = backend.throttle_rate = 0.0
+    print(f"  {client.stats.snapshot()}")
+    backend.etags = True
+    try:
+        for label in ("first pass", "revalidated"):
+            backend.reset_counters()
+            sum(1 for _ in client.scenario_leaderboard(5, per_page=100))
+            print(f"{label:>12}: {backend.bytes_sent / 1024:8.0f} KiB sent, {backend.request_count} requests, "
+                  f"{client.response_cache.size / 1024:.0f} KiB cached")
+    finally:
+        backend.etags = False
+    print(f"  {client.stats.snapshot()}")
+
+
+def legacy_score_rows(data):
+    """The original per-row Score construction, kept here as the baseline."""
+    from models import Score
+    return [Score(
+        entry.get("steamId"), entry.get("score"), entry.get("rank"), entry.get("steamAccountName"),
+        entry.get("kovaaksPlusActive"), entry.get("attributes", {}).get("fov"), entry.get("attributes", {}).get("hash"),
+        entry.get("attributes", {}).get("cm360"), entry.get("attributes", {}).get("epoch"), entry.get("attributes", {}).get("kills"),
+        entry.get("attributes", {}).get("avgFps"), entry.get("attributes", {}).get("avgTtk"), entry.get("attributes", {}).get("fovScale"),
+        entry.get("attributes", {}).get("vertSens"), entry.get("attributes", {}).get("horizSens"), entry.get("attributes", {}).get("resolution"),
+        entry.get("attributes", {}).get("sensScale"), entry.get("attributes", {}).get("accuracyDamage"),
+        entry.get("attributes", {}).get("challengeStart"), entry.get("attributes", {}).get("scenarioVersion"),
+        entry.get("attributes", {}).get("clientBuildVersion"), entry.get("webappUsername"),
+    ) for entry in data]
+
+
+def bench_columnar(rows=100_000, per_page=100):
+    """Parse throughput and peak memory over a recorded 100k-row leaderboard: Score lists vs LeaderboardPage."""
+    import tracemalloc
+    from models import LeaderboardPage
+
+    rng = random.Random(6)
+    recorded = [json.dumps({"data": [
+        {"steamId": str(76561190000000000 + rank), "score": 1000 - rank / 100, "rank": rank,
+         "steamAccountName": f"steam{rank}", "kovaaksPlusActive": rank % 3 == 0, "webappUsername": f"user{rank}",
+         "attributes": {"fov": 103, "hash": "%016x" % rng.getrandbits(64), "cm360": 34.6, "epoch": 1_700_000_000 + rank,
+                        "kills": 50, "avgFps": 240.0, "avgTtk": 0.4, "fovScale": "Overwatch", "vertSens": 1.0,
+                        "horizSens": 1.0, "resolution": "1920x1080", "sensScale": "cm/360", "accuracyDamage": 900,
+                        "challengeStart": "12:00:00.000", "scenarioVersion": "1", "clientBuildVersion": "3.4"}}
+        for rank in range(start + 1, start + per_page + 1)]}).encode() for start in range(0, rows, per_page)]
+    decoded = [json.loads(payload)["data"] for payload in recorded]
+    for label, build in (("Score dataclasses", legacy_score_rows),
+                         ("columnar, all fields", LeaderboardPage),
+                         ("columnar, projected", lambda data: LeaderboardPage(data, ()))):
+        start = time.perf_counter()
+        for payload in recorded: build(json.loads(payload)["data"])
+        elapsed = time.perf_counter() - start
+        start = time.perf_counter()
+        for data in decoded: build(data)
+        build_elapsed = time.perf_counter() - start
+        tracemalloc.start()
+        kept = [build(json.loads(payload)["data"]) for payload in recorded]
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop(); del kept
+        print(f"{label:>20}: {rows / build_elapsed:9.0f} rows/s build only, {rows / elapsed:9.0f} rows/s incl. json.loads, "
+              f"{peak / 2 ** 20:6.1f} MiB peak holding all rows")
+
+
+def bench_thresholds():
+    """Requests to grade a First Try run: rank lookup after the run vs cut-offs resolved before it."""
+    backend = get_backend()
+    from kovaaker import KovaakerClient
+    from kovaakscenpicker import get_rank_for_score
+    from models import Scenario
+    from thresholds import ThresholdCache, DIFFICULTY_THRESHOLDS
+
+    rows = backend.add_leaderboard(7, 150_000, seed=7)
+    scenario = Scenario(1, 7, "Threshold bench", "Tracking", [], "", 0, len(rows))
+    client = KovaakerClient()
+    with tempfile.TemporaryDirectory() as tmp:
+        thresholds = ThresholdCache(client, os.path.join(tmp, "thresholds.json"))
+        for label, grade in (("rank lookup", lambda: get_rank_for_score(7, rows[60_000][0], len(rows), client)),
+                             ("cut-offs, cold", lambda: thresholds.cutoffs(scenario)),
+                             ("cut-offs, cached", lambda: thresholds.cutoffs(scenario))):
+            backend.reset_counters(); start = time.perf_counter(); grade()
+            print(f"{label:>18}: {backend.request_count:3d} req {(time.perf_counter() - start) * 1000:8.2f} ms")
+        scores = [score for score, _ in rows]
+        start = time.perf_counter(); ThresholdCache(client, os.path.join(tmp, "snapshot.json")).cutoffs(
+            scenario, tuple(DIFFICULTY_THRESHOLDS.values()), scores)
+        print(f"{'cut-offs, snapshot':>18}:   0 req {(time.perf_counter() - start) * 1000:8.2f} ms")
+
+
+def bench_tracing(calls=200_000):
+    """Per-span overhead with tracing off and on, and a traced score scan's summary."""
+    from tracing import Tracer
+
+    for enabled in (False, True):
+        tracer = Tracer(enabled)
+        start = time.perf_counter()
+        for _ in range(calls):
+            with tracer.span("noop"): pass
+        print(f"tracing {'on ' if enabled else 'off'}: {(time.perf_counter() - start) / calls * 1e9:7.0f} ns/span")
+    backend = get_backend()
+    import tracing
+    from kovaaker import KovaakerClient
+
+    backend.add_leaderboard(8, 5_000, seed=8)
+    tracing.tracer.enabled = True  # get_json checks per call; @traced functions would need KOVAAK_TRACE at import
+    tracing.tracer.start_session("bench")
+    with tracing.span("scan"):
+        for _ in KovaakerClient().scenario_leaderboard(8, per_page=100, concurrency=4): pass
+    tracing.tracer.end_session()
+    tracing.tracer.enabled = False
+
+
+class SimulatedGame:
+    """
+    Stands in for KovaaK's: every launch writes a finished run's CSV to the stats folder after
+    play_seconds, or never if play_seconds is None.
+    """
+
+    def __init__(self, stats_folder, play_seconds=0.3, score=lambda name: 1e6):
+        self.stats_folder = stats_folder
+        self.play_seconds = play_seconds
+        self.score = score
+        self.launches = []  # (monotonic time, scenario name)
+        self.finished = []  # monotonic time each run's CSV was complete
+
+    def launch(self, scenario_name, stats_folder=None, stop_event=None):
+        self.launches.append((time.monotonic(), scenario_name))
+        if self.play_seconds is None: return
+        threading.Timer(self.play_seconds, self._finish, args=(scenario_name, len(self.launches))).start()
+
+    def _finish(self, scenario_name, run):
+        if not os.path.isdir(self.stats_folder): return  # the benchmark has already moved on
+        stamp = time.strftime("%Y.%m.%d-%H.%M.%S", time.localtime(1_700_000_000 + run))
+        write_stats_csv(self.stats_folder, scenario_name, stamp, self.score(scenario_name))
+        self.finished.append(time.monotonic())
+
+
+def _percentile(values, p):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p))] if ordered else float("nan")
+
+
+def play_rounds(mode, rounds, game, username="benchuser", rival="benchrival"):
+    """Runs one challenge loop headlessly until `rounds` rounds have a result, returning the hooks' history."""
+    import kovaakscenpicker
+
+    history = []
+    hooks = console_hooks(is_active=lambda: len(history) < rounds)
+    hooks["update_history"] = history.append
+    kovaakscenpicker.launch_scenario = game.launch
+    if mode == "pb":
+        kovaakscenpicker.run_pb_challenge_loop(game.stats_folder, username, hooks)
+    elif mode == "first-try":
+        kovaakscenpicker.run_online_challenge_loop(game.stats_folder, username, "Medium", hooks)
+    else:
+        kovaakscenpicker.run_rival_challenge_loop(game.stats_folder, username, rival, hooks)
+    return history
+
+
+def _prepare_loop_backend():
+    """Scenarios and leaderboards for driving the loops, or the recorded fixtures when they exist."""
+    backend = get_backend()
+    if os.path.exists(FIXTURES_FILE):
+        print(f"replaying {backend.load_fixtures()} recorded responses from {FIXTURES_FILE}")
+    elif not backend.scenarios or len(backend.scenarios) < 200:
+        backend.scenarios.clear(); backend.add_scenarios(200, seed=11)
+        rng = random.Random(11)
+        for row in backend.scenarios:
+            rows = backend.add_leaderboard(row["leaderboardId"], min(row["counts"]["entries"], 3_000), seed=row["rank"])
+            row["counts"]["entries"] = len(rows)
+            if rows:
+                position = rng.randrange(len(rows))
+                rows[position] = (rows[position][0], "benchrival")
+    from catalog import get_scenario_catalog
+    get_scenario_catalog().refresh_in_background().join()
+    return backend
+
+
+def bench_loops(rounds=6, latency=0.03, play_seconds=0.3):
+    """
+    Drives the three challenge loops end to end against the stand-in server and a simulated game:
+    rounds per minute, requests per round, and round latency (launch to launch, and the dead time
+    from a run finishing to the next launch). Replays bench_fixtures.json.gz when it exists.
+    """
+    import contextlib
+    import io
+
+    backend = _prepare_loop_backend()
+    backend.latency = latency
+    try:
+        for mode in ("pb", "first-try", "rival"):
+            with tempfile.TemporaryDirectory() as stats_folder:
+                game = SimulatedGame(stats_folder, play_seconds)
+                backend.reset_counters(); start = time.perf_counter()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    history = play_rounds(mode, rounds, game)
+                elapsed = time.perf_counter() - start
+            launches = [t for t, _ in game.launches]
+            laps = [b - a for a, b in zip(launches, launches[1:])]
+            dead = [launch - done for done, launch in zip(game.finished, launches[1:])]
+            print(f"{mode:>9}: {len(history) / elapsed * 60:6.1f} rounds/min, {backend.request_count / max(1, len(history)):6.1f} "
+                  f"req/round, launch-to-launch p50 {_percentile(laps, 0.5):5.2f}s p95 {_percentile(laps, 0.95):5.2f}s, "
+                  f"dead time p50 {_percentile(dead, 0.5):5.2f}s")
+    finally:
+        backend.latency = 0
+
+
+def _wait_until(condition, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline: raise TimeoutError("the challenge didn't get there in time")
+        time.sleep(0.001)
+    return time.monotonic()
+
+
+def bench_skip(latency=0.03, trials=5):
+    """
+    Skip and End responsiveness, pressing the buttons the way the GUI does: Skip mid-run to the next
+    launch, and End mid-run or during a status-message pause to the challenge having ended. Also
+    counts rounds after a skip that gave up without waiting for a score.
+    """
+    import contextlib
+    import io
+    import kovaakscenpicker
+
+    backend = _prepare_loop_backend()
+    backend.latency = latency
+    runners = {"pb": lambda folder, hooks: kovaakscenpicker.run_pb_challenge_loop(folder, "benchuser", hooks),
+               "first-try": lambda folder, hooks: kovaakscenpicker.run_online_challenge_loop(folder, "benchuser", "Medium", hooks),
+               "rival": lambda folder, hooks: kovaakscenpicker.run_rival_challenge_loop(folder, "benchuser", "benchrival", hooks)}
+    try:
+        for mode, run in runners.items():
+            timings = {"skip -> next launch": [], "end mid-run -> ended": [], "end mid-pause -> ended": []}
+            gave_up = 0
+            for label in timings:
+                for _ in range(trials):
+                    with tempfile.TemporaryDirectory() as stats_folder, contextlib.redirect_stdout(io.StringIO()):
+                        game = SimulatedGame(stats_folder, 0.1 if "pause" in label else None)
+                        kovaakscenpicker.launch_scenario = game.launch
+                        state, history, ended = {"active": True}, [], threading.Event()
+                        hooks = console_hooks(is_active=lambda: state["active"])
+                        hooks["update_history"], hooks["challenge_ended"] = history.append, ended.set
+                        threading.Thread(target=run, args=(stats_folder, hooks), daemon=True).start()
+                        if "pause" in label:
+                            _wait_until(lambda: game.finished and history); time.sleep(0.05)
+                        else:
+                            _wait_until(lambda: game.launches); time.sleep(0.2)
+                        start = time.monotonic()
+                        if label.startswith("skip"):
+                            hooks["skip_event"].set()
+                            timings[label].append(_wait_until(lambda: len(game.launches) > 1) - start)
+                            time.sleep(0.3)
+                            gave_up += sum(text.startswith("(No new score)") for text in history)
+                        else:
+                            state["active"] = False; hooks["stop_polling_event"].set()
+                            timings[label].append(_wait_until(ended.is_set) - start)
+                        state["active"] = False; hooks["stop_polling_event"].set(); ended.wait(10)
+            print(f"{mode:>9}: " + ", ".join(f"{label} p50 {_percentile(t, 0.5) * 1000:6.0f} ms max {max(t) * 1000:6.0f} ms"
+                                            for label, t in timings.items()) + f", {gave_up}/{trials} gave up after a skip")
+    finally:
+        backend.latency = 0
+
+
+def bench_archive(days=365, rounds_per_day=300):
+    """
+    Run archive over a year of sessions: time per recorded round on the caller's thread, background
+    write throughput, size on disk against plain JSON lines, and full-scan and range-query times.
+    """
+    from models import Scenario
+    from run_archive import RunArchive
+
+    rng = random.Random(23)
+    scenarios = [Scenario(i, 100_000 + i, f"scenario {i} {rng.choice(['tracking', 'clicking', 'switching'])}", None,
+                          None, None, None, None) for i in range(2_000)]
+    now = {"t": time.time() - days * 86_400}
+    total = days * rounds_per_day
+    with tempfile.TemporaryDirectory() as tmp:
+        archive = RunArchive(os.path.join(tmp, "runs.bin"), clock=lambda: now["t"])
+        start = time.perf_counter(); session = None
+        for i in range(total):
+            if i % 30 == 0:
+                if session: archive.end_session(session, "pb")
+                session = archive.start_session("pb", {"username": "benchuser"}, 600.0)
+            now["t"] += 86_400 / rounds_per_day
+            score = rng.uniform(100, 1_000)
+            archive.record_round(session, "pb", rng.choice(scenarios), score, score * rng.uniform(0.9, 1.1),
+                                 rng.choice(("success", "fail", "skipped")), 600.0 - (i % 30) * 20)
+        queued = time.perf_counter() - start
+        archive.flush(); written = time.perf_counter() - start
+        records = archive._seq
+        size = os.path.getsize(archive.path) + os.path.getsize(archive.journal_path)
+        json_size = len("".join(json.dumps(r, separators=(',', ':')) + "\n" for r in archive.query()).encode())
+        print(f"append: {queued / records * 1e6:6.2f} us/record on the caller, {records / written:10,.0f} records/s written, "
+              f"{records:,} records in {size / 1e6:.1f} MB ({json_size / size:.1f}x smaller than JSON lines)")
+        archive.close()
+        start = time.perf_counter(); archive = RunArchive(os.path.join(tmp, "runs.bin"), clock=lambda: now["t"])
+        print(f"  open: {(time.perf_counter() - start) * 1000:8.1f} ms")
+        start = time.perf_counter(); everything = archive.query()
+        elapsed = time.perf_counter() - start
+        print(f"  scan: {elapsed * 1000:8.1f} ms for {len(everything):,} records ({len(everything) / elapsed:,.0f} records/s)")
+        for label, seconds in (("last day", 86_400), ("last week", 7 * 86_400), ("last month", 30 * 86_400)):
+            start = time.perf_counter(); found = archive.query(start=now["t"] - seconds)
+            print(f"{label:>10}: {(time.perf_counter() - start) * 1000:8.1f} ms, {len(found):,} records")
+        start = time.perf_counter(); found = archive.query(scenario=scenarios[7].scenarioName)
+        print(f"one scenario, all time: {(time.perf_counter() - start) * 1000:8.1f} ms, {len(found):,} records")
+        start = time.perf_counter(); unfinished = archive.unfinished_session()
+        print(f"unfinished session lookup: {(time.perf_counter() - start) * 1000:6.1f} ms, "
+              f"{len(unfinished[2]) if unfinished else 0} rounds to resume")
+        archive.close()
+
+
+def record_fixtures(rounds=3):
+    """
+    Plays a few headless rounds of each loop against the live API through the stand-in server and
+    saves every response it forwarded to bench_fixtures.json.gz for later replays.
+    Set KOVAAKS_BENCH_USER and KOVAAKS_BENCH_RIVAL to real usernames first.
+    """
+    import contextlib
+    import io
+
+    backend = get_backend()
+    backend.upstream = UPSTREAM
+    from catalog import get_scenario_catalog
+    get_scenario_catalog().refresh_in_background().join()
+    for mode in ("pb", "first-try", "rival"):
+        with tempfile.TemporaryDirectory() as stats_folder, contextlib.redirect_stdout(io.StringIO()):
+            play_rounds(mode, rounds, SimulatedGame(stats_folder), os.environ.get("KOVAAKS_BENCH_USER", "benchuser"),
+                        os.environ.get("KOVAAKS_BENCH_RIVAL", "benchrival"))
+    backend.save_fixtures()
+    print(f"recorded {len(backend.fixtures)} responses to {FIXTURES_FILE}")
+
+
+def bench_startup(trials=5):
+    """Cold start of the console entry point: eager imports, lazy imports, and a command handed to a warm server."""
+    import subprocess
+
+    backend = get_backend()
+    if not backend.scenarios: backend.add_scenarios(200)
+    here = os.path.dirname(os.path.abspath(__file__))
+
+    def timed(args):
+        timings = []
+        for _ in range(trials):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, *args], cwd=here, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+            timings.append(time.perf_counter() - start)
+        return sorted(timings)[len(timings) // 2] * 1000
+
+    print(f"{'eager imports (old)':>24}: {timed(['-c', 'import requests, psutil, kovaaker, kovaakscenpicker']):7.1f} ms")
+    print(f"{'import kovaakscenpicker':>24}: {timed(['-c', 'import kovaakscenpicker']):7.1f} ms")
+    print(f"{'pick --local':>24}: {timed(['-m', 'kovaakscenpicker', 'pick', '--local']):7.1f} ms")
+    server = subprocess.Popen([sys.executable, "-m", "kovaakscenpicker", "serve"], cwd=here,
+                              stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    try:
+        server.stdout.readline()  # the "Serving on" line
+        print(f"{'pick via warm server':>24}: {timed(['-m', 'kovaakscenpicker', 'pick']):7.1f} ms")
+    finally:
+        server.terminate(); server.wait()
+
+
+class FakeProcessTable:
+    """Process table for ProcessMonitor: {pid: name}, editable from the benchmark."""
+
+    def __init__(self, processes=None):
+        self.processes_by_pid = dict(processes or {})
+        self.walks = 0
+
+    def processes(self):
+        self.walks += 1
+        return list(self.processes_by_pid.items())
+
+    def name(self, pid):
+        return self.processes_by_pid.get(pid)
+
+
+def bench_process(checks=200):
+    """Game liveness checks (process walk vs cached PID) and time from launch to ready vs the old fixed 3s."""
+    import psutil
+    from game_process import ProcessMonitor
+
+    own_name = psutil.Process().name()
+    start = time.perf_counter()
+    for _ in range(checks): any(p.info['name'] == own_name for p in psutil.process_iter(['name']))
+    print(f"process_iter walk: {(time.perf_counter() - start) / checks * 1e6:9.1f} us/check "
+          f"({len(psutil.pids())} processes)")
+    monitor = ProcessMonitor(own_name); monitor.is_running()
+    start = time.perf_counter()
+    for _ in range(checks): monitor.is_running()
+    print(f"   cached PID:     {(time.perf_counter() - start) / checks * 1e6:9.1f} us/check")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        stats_folder = os.path.join(tmp, "FPSAimTrainer", "stats")
+        log_folder = os.path.join(tmp, "FPSAimTrainer", "Saved", "Logs")
+        os.makedirs(stats_folder); os.makedirs(log_folder)
+        for startup in (0.5, 1.5, 6.0):
+            table = FakeProcessTable({1: "explorer.exe"})
+            monitor = ProcessMonitor(process_table=table, has_window=lambda pid: None)
+
+            def start_game():
+                time.sleep(startup / 3); table.processes_by_pid[4242] = "FPSAimTrainer.exe"
+                with open(os.path.join(log_folder, "FPSAimTrainer.log"), 'a') as log:
+                    for _ in range(10): log.write("LogInit: loading\n"); log.flush(); time.sleep(startup / 15)
+
+            threading.Thread(target=start_game, daemon=True).start()
+            start = time.perf_counter(); ready = monitor.wait_until_ready(stats_folder)
+            print(f"game startup {startup:3.1f}s: ready={ready} after {time.perf_counter() - start:5.2f}s "
+                  f"(old fixed wait 3.00s), {table.walks} process walks")
+            os.remove(os.path.join(log_folder, "FPSAimTrainer.log"))
+
+
+def bench_ui(rounds=20_000, threads=4):
+    """UI work per round through the frame-drained event queue, history memory over a long session, and log search."""
+    import tracemalloc
+    from ui_events import UIEventQueue, HistoryBuffer, HistoryLog, FRAME_INTERVAL_MS
+
+    queue, stop = UIEventQueue(), threading.Event()
+
+    def worker(n):
+        for i in range(rounds // threads):
+            queue.status(f"🔎 Searching for an unplayed scenario (Page {i % 30 + 1}/30)...")
+            queue.add_history(f"(Pending) Scenario {n}-{i}"); queue.status("▶️ Now playing")
+            queue.update_history(f"Scenario {n}-{i} - New Score: {i}.00"); queue.score(f"PBs Achieved: {i}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        buffer, applied, frames = HistoryBuffer(log=HistoryLog(os.path.join(tmp, "history.log"))), 0, 0
+
+        def drain():
+            nonlocal applied, frames
+            status, score, history_edits, calls = queue.drain()
+            applied += (status is not None) + (score is not None) + len(history_edits); frames += 1
+            for kind, text in history_edits:
+                if kind == "add": buffer.add(text)
+                else: buffer.replace_last(text)
+
+        tracemalloc.start()
+        workers = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+        start = time.perf_counter()
+        for t in workers: t.start()
+        while any(t.is_alive() for t in workers): drain(); time.sleep(FRAME_INTERVAL_MS / 1000)
+        drain(); buffer.flush()
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory(); tracemalloc.stop()
+        print(f"{queue.posted:,} updates posted in {elapsed:.2f}s -> {applied:,} widget updates over {frames} frames "
+              f"(one root.after per update before); peak {peak / 1024:,.0f} KiB")
+        log = HistoryLog(os.path.join(tmp, "history.log"))
+        start = time.perf_counter(); matches = log.search("Scenario 3-1999 ")
+        print(f"search over {rounds:,} logged rounds: {(time.perf_counter() - start) * 1000:.1f} ms, {len(matches)} match(es)")
+
+
+def bench_search(count=150_000, repeats=200):
+    """Local scenario search: index build (and save/load) time over a full-size catalog and per-query latency."""
+    from models import Scenario
+    from scenario_search import ScenarioSearchIndex, parse_query
+
+    rng = random.Random(18)
+    words = ["close", "long", "strafe", "tile", "frenzy", "smooth", "bot", "pasu", "voltaic", "reactive", "track",
+             "flick", "micro", "wide", "angle", "sphere", "air", "dodge", "ww", "popcorn", "1w6ts", "gridshot"]
+    aim_types = ["Clicking", "Tracking", "Switching", "Strafe", ""]
+    # Most scenarios have no description; the rest a sentence or two.
+    scenarios = [Scenario(i, 100_000 + i, " ".join(rng.sample(words, 3)) + f" {i}", rng.choice(aim_types),
+                          [f"author{rng.randint(0, 3000)}"],
+                          " ".join(rng.choices(words, k=rng.randint(4, 20))) if rng.random() < 0.3 else "",
+                          int(rng.paretovariate(1.1) * 100), int(rng.paretovariate(1.2) * 50)) for i in range(count)]
+    start = time.perf_counter(); index = ScenarioSearchIndex(scenarios)
+    print(f"build: {time.perf_counter() - start:.2f}s for {count:,} scenarios, {len(index._postings):,} trigrams")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "search.bin")
+        start = time.perf_counter(); index.save(path, [0, count]); saved = time.perf_counter() - start
+        start = time.perf_counter(); loaded = ScenarioSearchIndex.load(path, scenarios, [0, count])
+        print(f"save: {saved:.2f}s, {os.path.getsize(path) / 2 ** 20:.1f} MiB; load: {time.perf_counter() - start:.2f}s "
+              f"({'same' if loaded._postings == index._postings else 'DIFFERENT'} postings)")
+    for query in ("v", "clo", "close long", "voltaic frenzy 1234", "aim:tracking entries<5k",
+                  "pasu aim:clicking plays>10k", "author2999", "vltaic frenzzy"):
+        text, filters = parse_query(query)
+        start = time.perf_counter()
+        for _ in range(repeats): results = index.search(text, 20, **filters)
+        print(f"{query!r:>30}: {(time.perf_counter() - start) / repeats * 1e6:9.1f} us, {len(results)} results")
+
+
+def bench_sampler(count=150_000, draws=200_000):
+    """Weighted scenario draws: random.choices over the whole list (O(n) per draw) vs the alias-table sampler, and rebuild costs."""
+    from models import Scenario
+    from sampler import ScenarioSampler
+
+    rng = random.Random(21)
+    aim_types = ["Clicking", "Tracking", "Switching", "Strafe", "Reactive", "Speed", ""]
+
+    class Source:
+        version = 1
+        scenarios = staticmethod(lambda: catalog)
+
+    catalog = [Scenario(i, 100_000 + i, f"scenario {i}", rng.choice(aim_types), [f"author{rng.randint(0, 3000)}"], "",
+                        int(rng.paretovariate(1.1) * 100), int(rng.paretovariate(1.2) * 50)) for i in range(count)]
+    weights = [s.plays for s in catalog]
+    start = time.perf_counter()
+    for _ in range(200): random.choices(catalog, weights)
+    print(f"{'random.choices':>26}: {(time.perf_counter() - start) / 200 * 1e6:10.1f} us/draw")
+    sampler = ScenarioSampler(Source(), "plays")
+    start = time.perf_counter(); len(sampler)
+    print(f"{'build (' + f'{count:,}' + ')':>26}: {(time.perf_counter() - start) * 1000:10.1f} ms")
+    for label, filters in (("no filter", {}), ("aim:tracking", {"aim_types": ["tracking"]}),
+                           ("aim:tracking,clicking", {"aim_types": ["tracking", "clicking"]}),
+                           ("author:author7", {"authors": ["author7"]}),
+                           ("author:author8", {"authors": ["author8"]}), ("entries>=1k", {"min_entries": 1_000})):
+        start = time.perf_counter(); sampler.set_filters(**filters); rebuild = time.perf_counter() - start
+        start = time.perf_counter()
+        for _ in range(draws): sampler.draw()
+        elapsed = time.perf_counter() - start
+        print(f"{label:>26}: rebuild {rebuild * 1000:7.2f} ms, {draws / elapsed:10,.0f} draws/s, {len(sampler):,} scenarios")
+    sampler.set_filters(aim_types=["speed"])
+    picked = [sampler.draw().leaderboardId for _ in range(1_000)]
+    repeats = sum(picked[i] in picked[max(0, i - 50):i] for i in range(len(picked)))
+    print(f"{'repeats within 50 draws':>26}: {repeats} of {len(picked)}")
+
+
+def bench_analytics(runs=100_000, scenarios=2_000, trials=2_000):
+    """SkillProfile build over a 100k-run history: plain loops vs NumPy, and how often each focus's next run is a PB."""
+    import analytics
+    from analytics import SkillProfile
+
+    rng = random.Random(24)
+    aim_types = ["Clicking", "Tracking", "Switching", "Strafe", "Reactive", "Speed"]
+    # Each scenario has a skill level that drifts (up or down) over its runs, plus run-to-run noise.
+    truth = [(f"scenario {i}", rng.choice(aim_types), rng.uniform(300, 3000), rng.gauss(0.002, 0.004),
+              rng.uniform(0.02, 0.08)) for i in range(scenarios)]
+    played = [0] * scenarios
+    history, start_ts = [], time.time() - 365 * 86400
+    for i in range(runs):
+        s = min(int(rng.paretovariate(0.8)) - 1, scenarios - 1)
+        name, _, base, drift, noise = truth[s]
+        level = base * (1 + drift) ** played[s]; played[s] += 1
+        history.append((name, start_ts + i * 300 + rng.random(), rng.gauss(level, level * noise)))
+    # As StatsIndex.runs(ordered=False) hands them over: in folder order, loaded from the index's JSON cache.
+    rng.shuffle(history)
+    history = [tuple(run) for run in json.loads(json.dumps(history))]
+    aim_of = {name.lower(): aim for name, aim, *_ in truth}.get
+    results = {}
+    for label, use_numpy in (("plain loops", False), ("numpy", True)):
+        if use_numpy and analytics.load_numpy() is None: print(f"{label:>14}: NumPy not installed"); continue
+        times = []
+        for _ in range(5):
+            start = time.perf_counter(); profile = SkillProfile(history, aim_of, use_numpy=use_numpy)
+            times.append(time.perf_counter() - start)
+        results[label] = profile
+        print(f"{label:>14}: {sorted(times)[2] * 1000:7.1f} ms median, {min(times) * 1000:7.1f} ms best, "
+              f"{len(profile.scenarios):,} scenarios from {runs:,} runs")
+    if len(results) == 2:
+        a, b = results.values()
+        worst = max(abs(x - y) / (abs(y) or 1) for k, s in a.scenarios.items()
+                    for x, y in zip(s[2:], b.scenarios[k][2:]) if not isinstance(x, str))
+        print(f"{'agreement':>14}: largest relative difference {worst:.1e}")
+    start = time.perf_counter(); likely = profile.likely_pbs(); weakest = profile.weakest()
+    print(f"{'selection':>14}: {(time.perf_counter() - start) * 1000:7.1f} ms for both pools, weakest aim type "
+          f"{profile.weakest_aim_type().aim_type}")
+    by_name = {name.lower(): i for i, (name, *_) in enumerate(truth)}
+    ready = [s for s in profile.scenarios.values() if s.runs >= analytics.MIN_RUNS]
+
+    def pb_rate(pool):
+        hits = 0
+        for _ in range(trials):
+            skill = rng.choice(pool)
+            _, _, base, drift, noise = truth[by_name[skill.name.lower()]]
+            level = base * (1 + drift) ** played[by_name[skill.name.lower()]]
+            hits += rng.gauss(level, level * noise) > skill.pb
+        return hits / trials
+    print(f"{'next-run PBs':>14}: random played scenario {pb_rate(ready):6.1%}, likely-pb pool {pb_rate(likely):6.1%}")
+
+
+def bench_rival(latency=0.02, rounds=10, played_fraction=0.1):
+    """Rival round resolution: random pick plus leaderboard scan (old) vs picks from the preloaded rival profile."""
+    backend = get_backend()
+    import kovaakscenpicker
+    from kovaaker import KovaakerClient
+    from rival_profile import RivalProfile
+
+    rng = random.Random(19)
+    backend.scenarios.clear(); backend.leaderboards.clear(); backend.add_scenarios(400, seed=19)
+    for row in backend.scenarios:
+        rows = backend.add_leaderboard(row["leaderboardId"], min(row["counts"]["entries"], 3_000), seed=row["rank"])
+        row["counts"]["entries"] = len(rows)
+        if rows and rng.random() < played_fraction:
+            position = rng.randrange(len(rows))
+            rows[position] = (rows[position][0], "profilerival")
+    from catalog import get_scenario_catalog
+    get_scenario_catalog().refresh_in_background().join()
+    backend.latency = latency
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            for label in ("random pick + scan", "rival profile"):
+                client = KovaakerClient()
+                profile = RivalProfile(client, "profilerival", os.path.join(tmp, "rival.json")) if label == "rival profile" else None
+                backend.reset_counters(); start = time.perf_counter(); first = None; picks = valid = 0
+                if profile is not None: profile.refresh_in_background(); profile.ready.wait()
+                while valid < rounds:
+                    result = kovaakscenpicker.resolve_rival_round(client, "profilerival", lambda text: None, profile=profile)
+                    picks += 1
+                    if result and result[1]:
+                        valid += 1; first = first or time.perf_counter() - start
+                elapsed = time.perf_counter() - start
+                print(f"{label:>18}: {valid}/{picks} picks valid, first round after {first * 1000:8.1f} ms, "
+                      f"{rounds} rounds in {elapsed:6.2f}s, {backend.request_count} requests")
+                if profile is not None: profile.refresh_in_background().join()
+    finally:
+        backend.latency = 0
+
+
+def bench_multi_user(size=20_000):
+    """Requests to resolve N users on one leaderboard: a get_user_score scan each vs one get_user_scores pass."""
+    backend = get_backend()
+    from kovaaker import KovaakerClient
+
+    rows = backend.add_leaderboard(20, size, seed=20)
+    rng = random.Random(20)
+    for n in (1, 5, 20):
+        positions = rng.sample(range(size), n)
+        for i, position in enumerate(positions): rows[position] = (rows[position][0], f"Friend{n}_{i}")
+        # Lookups use a different case than the leaderboard, as typed into the GUI.
+        names = [f"friend{n}_{i}" for i in range(n)]
+        client = KovaakerClient()
+        backend.reset_counters(); start = time.perf_counter()
+        single = {name: client.get_user_score(20, name) for name in names}
+        old_requests, old_time = backend.request_count, time.perf_counter() - start
+        backend.reset_counters(); start = time.perf_counter()
+        users, _ = client.get_user_scores(20, names)
+        assert users == single
+        print(f"{n:2d} user(s): {old_requests:4d} requests {old_time * 1000:7.1f} ms one scan each -> "
+              f"{backend.request_count:4d} requests {(time.perf_counter() - start) * 1000:7.1f} ms in one pass "
+              f"(deepest at rank {max(positions) + 1})")
+    targets = [rows[size // 4][0], rows[size // 2][0], rows[size * 3 // 4][0]]
+    backend.reset_counters(); _, ranks = KovaakerClient().get_user_scores(20, target_scores=targets)
+    print(f"3 target scores: {backend.request_count} requests, ranks {sorted(ranks.values())}")
+
+
+def bench_mirror(size=50_000):
+    """
+    Requests and bytes to re-read a leaderboard that changed since the last visit: a full scan vs an
+    incremental sync of the mirrored copy, and how far the synced copy is from the server's.
+    """
+    backend = get_backend()
+    from kovaaker import KovaakerClient
+    from kovaakscenpicker import get_rank_for_score
+    from leaderboard_mirror import LeaderboardMirror
+    from models import Scenario
+    from thresholds import ThresholdCache, cutoffs_from_scores, DIFFICULTY_THRESHOLDS
+
+    backend.add_leaderboard(30, size, seed=30)
+    rng = random.Random(30)
+    with tempfile.TemporaryDirectory() as tmp:
+        client = KovaakerClient()
+        client.mirror = LeaderboardMirror(client, tmp, min_interval=0)
+        backend.reset_counters(); start = time.perf_counter()
+        client.get_user_scores(30, ("nobody",))
+        print(f"{'first visit':>22}: {backend.request_count:5d} req {backend.bytes_sent / 1e6:7.2f} MB "
+              f"{(time.perf_counter() - start) * 1000:7.0f} ms (full scan, mirrored)")
+        for new_players, improvements in ((0, 0), (1, 0), (5, 5), (20, 20), (100, 100)):
+            backend.mutate_leaderboard(30, new_players, improvements, rng)
+            watched = backend.leaderboards[30][rng.randrange(size)][1]
+            backend.reset_counters()
+            KovaakerClient().get_user_scores(30, (watched, "nobody"))
+            full_requests, full_bytes = backend.request_count, backend.bytes_sent
+            backend.reset_counters(); start = time.perf_counter()
+            users, _ = client.get_user_scores(30, (watched, "nobody"))
+            elapsed = time.perf_counter() - start
+            truth = backend.leaderboards[30]
+            board = client.mirror.get(30)
+            # PB improvements that stay between two pages the sync didn't fetch leave rows a place out.
+            misplaced = sum((score, name) != (board.scores[i], board.usernames[i]) if i < len(board) else 1
+                            for i, (score, name) in enumerate(truth)) + abs(len(board) - len(truth))
+            true_scores = [score for score, _ in truth]
+            rank_error = max(abs(board.rank_for_score(target) - bisect.bisect_left(true_scores, -target, key=lambda x: -x) - 1)
+                             for target in (rng.uniform(true_scores[-1], true_scores[0]) for _ in range(200)))
+            watched_rank = next(i for i, (_, name) in enumerate(truth, start=1) if name == watched)
+            print(f"{f'+{new_players} players, {improvements} PBs':>22}: {full_requests:5d} req {full_bytes / 1e6:7.2f} MB "
+                  f"full scan -> {backend.request_count:5d} req {backend.bytes_sent / 1e6:7.2f} MB {elapsed * 1000:6.0f} ms "
+                  f"synced; {misplaced:,} rows misplaced, score ranks off by <= {rank_error}, watched user "
+                  f"{'right' if users[watched] == {'rank': watched_rank, 'score': truth[watched_rank - 1][0]} else 'WRONG'}")
+            # Lookups through a client whose mirror was just synced, as grading a run does.
+            lookup = KovaakerClient()
+            lookup.mirror = LeaderboardMirror(lookup, tmp)
+            targets = [rng.uniform(true_scores[-1], true_scores[0]) for _ in range(20)]
+            backend.reset_counters()
+            lookup_error = max(abs(get_rank_for_score(30, target, client=lookup)
+                                   - bisect.bisect_left(true_scores, -target, key=lambda x: -x) - 1) for target in targets)
+            lookup_requests = backend.request_count / len(targets)
+            percentiles = tuple(DIFFICULTY_THRESHOLDS.values())
+            cutoffs = ThresholdCache(lookup, os.path.join(tmp, "thresholds.json"), ttl=0).cutoffs(
+                Scenario(1, 30, "Mirror bench", "Tracking", [], "", 0, len(truth)), percentiles)
+            print(f"{'':>22}  rank lookups off by <= {lookup_error} ({lookup_requests:.1f} req each), cut-offs "
+                  f"{'right' if cutoffs == cutoffs_from_scores(true_scores, percentiles) else 'WRONG'}")
+        size_on_disk = os.path.getsize(os.path.join(tmp, "30.json.gz"))
+        capped = LeaderboardMirror(client, tmp, max_disk_bytes=int(size_on_disk * 2.5))
+        for leaderboard_id in (31, 32, 33): capped.store(leaderboard_id, board)
+        print(f"{'disk cap':>22}: {size_on_disk / 1024:.0f} KiB per copy, 4 stored under a 2.5-copy cap -> kept "
+              f"{sorted(name for name in os.listdir(tmp) if name.endswith('.json.gz'))}")
+
+
+BENCHMARKS = {
+    "rank": bench_rank,
+    "score_index": bench_score_index,
+    "stats_index": bench_stats_index,
+    "catalog": bench_catalog,
+    "paging": bench_paging,
+    "unplayed": bench_unplayed,
+    "watcher": bench_watcher,
+    "parser": bench_parser,
+    "http": bench_http,
+    "columnar": bench_columnar,
+    "thresholds": bench_thresholds,
+    "tracing": bench_tracing,
+    "loops": bench_loops,
+    "skip": bench_skip,
+    "archive": bench_archive,
+    "startup": bench_startup,
+    "process": bench_process,
+    "ui": bench_ui,
+    "search": bench_search,
+    "sampler": bench_sampler,
+    "analytics": bench_analytics,
+    "rival": bench_rival,
+    "multi_user": bench_multi_user,
+    "mirror": bench_mirror,
+}
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ["record"]: record_fixtures(); sys.exit()
+    names = sys.argv[1:] or ["all"]
+    for name in (BENCHMARKS if names == ["all"] else names):
+        print(f"== {name} ==")
+        BENCHMARKS[name]()
@@ -0,0 +1,180 @@
+import gzip
+import json
+import os
+import threading
+import time
+from models import Scenario
+from sampler import ScenarioSampler
+from scenario_search import ScenarioSearchIndex, parse_query
+from storage import cache_path
+
+DEFAULT_MAX_AGE = 24 * 60 * 60
+
+
+class ScenarioCatalog:
+    """
+    Local snapshot of every scenario on kovaaks.com, stored as gzipped JSON rows. Picks are served
+    from memory; the snapshot is refreshed page by page in the background and still works offline.
+    """
+
+    def __init__(self, client, path=None, max_age=DEFAULT_MAX_AGE):
+        self.client = client
+        self.path = path or cache_path("catalog.json.gz")
+        self.search_path = self.path.removesuffix(".json.gz") + "-search.bin"
+        self.max_age = max_age
+        self.fetched_at = 0
+        self.version = 0  # bumped whenever the set of scenarios changes, so samplers know to rebuild
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._by_id = {}
+        self._scenarios = []
+        self._refresh_thread = None
+        self._search_index = None
+        self._saved_version = None  # version whose scenarios are those of the snapshot on disk
+        self._by_name = (None, {})  # (version it was built at, lowercased name -> Scenario)
+
+    def __len__(self):
+        return len(self._scenarios)
+
+    def load(self):
+        """Loads the last snapshot from disk. Returns False if there isn't a usable one."""
+        try:
+            with gzip.open(self.path, 'rt', encoding='utf-8') as f:
+                snapshot = json.load(f)
+            scenarios = [Scenario(*row) for row in snapshot["rows"]]
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print(f"   No usable scenario catalog snapshot: {e}")
+            return False
+        with self._lock:
+            self._by_id = {s.leaderboardId: s for s in scenarios}
+            self._scenarios = list(self._by_id.values())
+            self.fetched_at = snapshot.get("fetched", 0)
+            self._search_index = None
+            self.version += 1
+            self._saved_version = self.version
+        return True
+
+    def save(self):
+        with self._lock:
+            rows = [[s.rank, s.leaderboardId, s.scenarioName, s.aimType, s.authors, s.description, s.plays, s.entries]
+                    for s in self._scenarios]
+            snapshot = {"fetched": self.fetched_at, "rows": rows}
+        with self._save_lock:
+            tmp_path = self.path + ".tmp"
+            with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+                json.dump(snapshot, f, separators=(',', ':'))
+            os.replace(tmp_path, self.path)
+
+    def is_stale(self):
+        return time.time() - self.fetched_at > self.max_age
+
+    def refresh(self, per_page=100):
+        """
+        Pages through the whole scenario list, merging each page into memory as it arrives so picks
+        keep working during the refresh. Scenarios that no longer exist are dropped at the end.
+        """
+        seen = set()
+        try:
+            for page in self.client.scenario_search(per_page=per_page, by_page=True, concurrency=4, strict=True):
+                with self._lock:
+                    for scenario in page:
+                        if not scenario.leaderboardId: continue
+                        seen.add(scenario.leaderboardId)
+                        if scenario.leaderboardId not in self._by_id:
+                            self._scenarios.append(scenario); self.version += 1
+                        self._by_id[scenario.leaderboardId] = scenario
+        except Exception as e:
+            # Offline or a page failed: keep what we have, without dropping scenarios we didn't get to.
+            print(f"   Scenario catalog refresh failed: {e}")
+            return False
+        if not seen: return False
+        with self._lock:
+            self._by_id = {k: v for k, v in self._by_id.items() if k in seen}
+            self._scenarios = list(self._by_id.values())
+            self.fetched_at = time.time()
+            self._search_index = None
+            self.version += 1
+            version = self.version
+        try:
+            self.save()
+        except OSError as e:
+            print(f"   Could not save scenario catalog: {e}")
+        else:
+            with self._lock:
+                if self.version == version: self._saved_version = version
+        return True
+
+    def refresh_in_background(self):
+        """Starts a refresh on a daemon thread unless one is already running."""
+        if self._refresh_thread and self._refresh_thread.is_alive(): return self._refresh_thread
+        self._refresh_thread = threading.Thread(target=self.refresh, daemon=True)
+        self._refresh_thread.start()
+        return self._refresh_thread
+
+    def scenarios(self):
+        with self._lock: return list(self._scenarios)
+
+    def by_name(self):
+        """Lowercased scenario name -> Scenario, for matching stats folder runs to the catalog."""
+        with self._lock:
+            if self._by_name[0] != self.version:
+                self._by_name = (self.version, {s.scenarioName.lower(): s for s in self._scenarios if s.scenarioName})
+            return self._by_name[1]
+
+    def search(self, query, limit=20, **filters):
+        """
+        Searches the snapshot locally, e.g. search("tracking entries<5k"). The query may carry
+        filters (see scenario_search.parse_query); keyword filters override them. No network access.
+        """
+        text, parsed = parse_query(query)
+        parsed.update(filters)
+        return self.search_index().search(text, limit, **parsed)
+
+    def search_index(self):
+        """
+        The ScenarioSearchIndex, built on first use after each load/refresh (a refresh in progress is
+        picked up when it completes). The index of the snapshot on disk is saved next to it and loaded
+        back, rather than rebuilt, by the next process.
+        """
+        with self._lock:
+            if self._search_index is not None: return self._search_index
+            scenarios, version = list(self._scenarios), self.version
+            key = [self.fetched_at, len(scenarios)] if version == self._saved_version else None
+        index = ScenarioSearchIndex.load(self.search_path, scenarios, key) if key else None
+        if index is None:
+            index = ScenarioSearchIndex(scenarios)
+            if key:
+                try:
+                    index.save(self.search_path, key)
+                except OSError as e:
+                    print(f"   Could not save the scenario search index: {e}")
+        with self._lock:
+            if self.version == version: self._search_index = index
+        return index
+
+    def sampler(self, weight="uniform", **filters):
+        """
+        A new weighted sampler over the catalog (see sampler.ScenarioSampler), e.g.
+        sampler("plays", aim_types=["tracking"]). It keeps up with refreshes and has its own no-repeat window.
+        """
+        sampler = ScenarioSampler(self, weight)
+        if filters: sampler.set_filters(**filters)
+        return sampler
+
+
+_shared_catalog = None
+_shared_lock = threading.Lock()
+
+
+def get_scenario_catalog(client_factory=None):
+    """Process-wide catalog: loaded from disk once and refreshed in the background when stale."""
+    global _shared_catalog
+    with _shared_lock:
+        if _shared_catalog is None:
+            if client_factory is None:
+                from kovaaker import get_client
+                client_factory = get_client
+            _shared_catalog = ScenarioCatalog(client_factory())
+            _shared_catalog.load()
+        if _shared_catalog.is_stale(): _shared_catalog.refresh_in_background()
+        return _shared_catalog
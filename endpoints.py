@@ -1,3 +1,10 @@
-POPULAR_SCENARIOS = "https://kovaaks.com/webapp-backend/scenario/popular?page=%d&max=%d"
-POPULAR_SCENARIOS_SEARCH = "https://kovaaks.com/webapp-backend/scenario/popular?page=%d&max=%d&scenarioNameSearch=%s"
-SCENARIO_GLOBAL_LEADERBOARD = "https://kovaaks.com/webapp-backend/leaderboard/scores/global?leaderboardId=%d&page=%d&max=%d"
\ No newline at end of file
+import os
+
+# Overridable so the benchmarks can point the client at a local stand-in server.
+API_BASE = os.environ.get("KOVAAKS_API_BASE", "https://kovaaks.com/webapp-backend")
+
+POPULAR_SCENARIOS = API_BASE + "/scenario/popular?page=%d&max=%d"
+POPULAR_SCENARIOS_SEARCH = API_BASE + "/scenario/popular?page=%d&max=%d&scenarioNameSearch=%s"
+SCENARIO_GLOBAL_LEADERBOARD = API_BASE + "/leaderboard/scores/global?leaderboardId=%d&page=%d&max=%d"
+# Every scenario a user has a score on, with their PB, most played first.
+USER_SCENARIO_PLAYS = API_BASE + "/user/scenario/total-play?username=%s&page=%d&max=%d&sort_param%%5B%%5D=count"
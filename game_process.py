@@ -0,0 +1,131 @@
+import os
+import time
+
+GAME_PROCESS_NAME = "fpsaimtrainer.exe"
+READY_TIMEOUT = 30.0
+WALK_INTERVAL = 1.0  # seconds between full process walks while waiting for the game to appear
+
+
+class PsutilProcessTable:
+    """The machine's process table through psutil, imported on first use."""
+
+    def __init__(self):
+        import psutil
+        self._psutil = psutil
+
+    def processes(self):
+        """(pid, name) for every process. This is the expensive full walk."""
+        for proc in self._psutil.process_iter(['name']):
+            yield proc.pid, proc.info['name'] or ""
+
+    def name(self, pid):
+        """Name of the process with this pid, or None if it has exited."""
+        try:
+            return self._psutil.Process(pid).name()
+        except self._psutil.Error:
+            return None
+
+
+def _has_visible_window(pid):
+    """Whether the process owns a visible top-level window; None where that can't be checked."""
+    if os.name != 'nt': return None
+    import ctypes
+    from ctypes import wintypes
+    user32 = ctypes.windll.user32
+    found = []
+
+    @ctypes.WINFUNCTYPE(wintypes.BOOL, wintypes.HWND, wintypes.LPARAM)
+    def check(hwnd, _):
+        owner = wintypes.DWORD()
+        user32.GetWindowThreadProcessId(hwnd, ctypes.byref(owner))
+        if owner.value == pid and user32.IsWindowVisible(hwnd):
+            found.append(hwnd)
+            return False
+        return True
+
+    user32.EnumWindows(check, 0)
+    return bool(found)
+
+
+def game_log_path(stats_folder):
+    """Where the game's Unreal log sits relative to its stats folder (<game>/FPSAimTrainer/Saved/Logs)."""
+    if not stats_folder: return None
+    return os.path.join(os.path.dirname(os.path.normpath(stats_folder)), "Saved", "Logs", "FPSAimTrainer.log")
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime if path else None
+    except OSError:
+        return None
+
+
+class ProcessMonitor:
+    """
+    Tracks the KovaaK's process by PID. Only the first lookup (or one after the game exits) walks
+    the process table; after that a check is a single "is this PID still the game" query.
+    process_table and has_window can be swapped for fakes.
+    """
+
+    def __init__(self, name=GAME_PROCESS_NAME, process_table=None, has_window=_has_visible_window):
+        self.name = name.lower()
+        self._table = process_table
+        self.has_window = has_window
+        self.pid = None
+
+    @property
+    def table(self):
+        if self._table is None: self._table = PsutilProcessTable()
+        return self._table
+
+    def _find(self):
+        for pid, name in self.table.processes():
+            if name.lower() == self.name: return pid
+        return None
+
+    def is_running(self):
+        if self.pid is not None:
+            name = self.table.name(self.pid)
+            if name and name.lower() == self.name: return True
+        self.pid = self._find()
+        return self.pid is not None
+
+    def wait_until_ready(self, stats_folder=None, timeout=READY_TIMEOUT, settle=1.0, poll=0.1, stop_event=None,
+                         walk_interval=WALK_INTERVAL):
+        """
+        Waits for a freshly started game to be able to take a steam:// command: the process is up
+        and, depending on what can be observed here, its log has gone quiet for `settle` seconds
+        after writing, or its window has been visible for `settle` seconds, or just the process
+        has. A touched stats folder always counts. Returns False on timeout or stop. Until the
+        process turns up, the process table is walked only every walk_interval seconds.
+        """
+        deadline = time.monotonic() + timeout
+        log_path = game_log_path(stats_folder)
+        log_start, folder_start = _mtime(log_path), _mtime(stats_folder)
+        seen_at = window_since = None
+        next_walk = 0.0
+        while time.monotonic() < deadline and not (stop_event and stop_event.is_set()):
+            now = time.monotonic()
+            if folder_start is not None and _mtime(stats_folder) != folder_start: return True
+            if self.pid is None and now < next_walk:
+                pass  # not there on the last walk, and is_running would walk again
+            elif not self.is_running():
+                seen_at = window_since = None
+                next_walk = now + walk_interval
+            else:
+                seen_at = seen_at or now
+                window = self.has_window(self.pid)
+                window_since = (window_since or now) if window else None
+                log_mtime = _mtime(log_path)
+                if log_mtime is not None:
+                    if window is not False and log_mtime != log_start and time.time() - log_mtime >= settle:
+                        return True
+                    # A log the game no longer writes to shouldn't hold the launch up for the whole timeout.
+                    if window_since and now - window_since >= 5 * settle: return True
+                elif window is not None:
+                    if window_since and now - window_since >= settle: return True
+                elif now - seen_at >= settle:
+                    return True
+            if stop_event: stop_event.wait(poll)
+            else: time.sleep(poll)
+        return False
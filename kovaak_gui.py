@@ -2,6 +2,7 @@ import tkinter as tk
 from tkinter import messagebox, Scrollbar, Listbox, Frame, Label, Entry, Button, ttk
 from tkinter import filedialog
 import threading
+import multiprocessing
 import os
 from kovaakscenpicker import (
     run_online_challenge_loop,
@@ -10,6 +11,11 @@ from kovaakscenpicker import (
     run_rival_challenge_loop,
     find_stats_folder_automatically
 )
+from round_engine import SignalEvent
+from run_archive import get_run_archive
+from ui_events import UIEventQueue, HistoryBuffer, HistoryLog, FRAME_INTERVAL_MS
+
+FOCUS_LABELS = {"Random": "random", "Likely PB": "likely-pb", "Weakest Aim Type": "weakest"}
 
 
 class ChallengeGUI:
@@ -22,12 +28,16 @@ class ChallengeGUI:
 
         self.challenge_active = False;
         self.challenge_thread = None
-        self.skip_event = threading.Event();
-        self.stop_polling_event = threading.Event()
+        self.skip_event = SignalEvent();
+        self.stop_polling_event = SignalEvent()
         self.timer_id = None;
         self.timer_paused = False;
         self.time_left_seconds = 0
+        self.time_limited = False
         self.stats_folder_path = None
+        self.ui_events = UIEventQueue()
+        self.history = HistoryBuffer(log=HistoryLog())
+        self.showing_search = False
 
         footer_frame = Frame(root);
         footer_frame.pack(side="bottom", fill="x", pady=5)
@@ -84,6 +94,10 @@ class ChallengeGUI:
         self.pb_button = Button(pb_frame, text="Start PB Hunt", font=("Segoe UI", 12, "bold"),
                                 command=lambda: self.start_challenge("pb"));
         self.pb_button.pack(side="left", expand=True)
+        self.focus_combo = ttk.Combobox(pb_frame, values=list(FOCUS_LABELS), state="readonly", width=16,
+                                        font=("Segoe UI", 10));
+        self.focus_combo.set("Random");
+        self.focus_combo.pack(side="left", padx=5)
         rival_frame = ttk.LabelFrame(content_frame, text="Beat the Rival Challenge", padding=(10, 5));
         rival_frame.pack(pady=5, padx=10, fill="x")
         rival_input_frame = Frame(rival_frame);
@@ -111,6 +125,13 @@ class ChallengeGUI:
         self.status_label = Label(content_frame, text="Searching for KovaaK's stats folder...", font=("Segoe UI", 11),
                                   wraplength=500);
         self.status_label.pack(pady=5)
+        search_frame = Frame(content_frame);
+        search_frame.pack(fill="x", padx=10)
+        Label(search_frame, text="Search history:", font=("Segoe UI", 9)).pack(side="left")
+        self.search_entry = Entry(search_frame, font=("Segoe UI", 9));
+        self.search_entry.pack(side="left", fill="x", expand=True, padx=5)
+        self.search_entry.bind("<Return>", lambda event: self.search_history())
+        Button(search_frame, text="Clear", font=("Segoe UI", 9), command=self.clear_search).pack(side="left")
         history_frame = Frame(content_frame);
         history_frame.pack(pady=5, fill="both", expand=True, padx=10)
         scrollbar = Scrollbar(history_frame);
@@ -123,6 +144,9 @@ class ChallengeGUI:
         footer.pack()
 
         self.find_stats_folder()
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        self.drain_ui_events()
+        self.root.after(200, self.offer_resume)
 
     def find_stats_folder(self):
         found_path = find_stats_folder_automatically()
@@ -143,7 +167,28 @@ class ChallengeGUI:
             self.manual_path_entry.insert(0, dir_path)
             self.status_label.config(text="✅ Stats folder selected. Ready to start!")
 
-    def start_challenge(self, mode, difficulty=None):
+    def offer_resume(self):
+        """Offers to carry on a challenge that was cut short by a crash or the window being closed."""
+        archive = get_run_archive()
+        unfinished = archive.unfinished_session()
+        if not unfinished: return
+        start, settings, rounds = unfinished
+        time_left = next((r.time_left for r in reversed(rounds) if r.time_left is not None), start.time_left)
+        # Out of time: nothing to resume, so close the session rather than find it again on every launch.
+        if time_left is not None and time_left < 1: archive.end_session(start.session, start.mode); return
+        mode = {"first-try": "percentile"}.get(start.mode, start.mode)
+        left = ""  # an unlimited challenge
+        if time_left is not None: m, s = divmod(int(time_left), 60); left = f" with {m:02d}:{s:02d} left"
+        if not messagebox.askyesno("Resume Challenge", f"Your last {start.mode} challenge was interrupted{left}. "
+                                                       f"Resume it?"):
+            archive.end_session(start.session, start.mode); return
+        self.focus_combo.set(next((k for k, v in FOCUS_LABELS.items() if v == settings.get("focus")), "Random"))
+        for entry, value in ((self.username_entry, settings.get("username")), (self.rival_username_entry, settings.get("rival"))):
+            if value: entry.delete(0, tk.END); entry.insert(0, value)
+        self.start_challenge(mode, settings.get("difficulty"), resume=(start.session, rounds),
+                             time_left=int(time_left) if time_left is not None else 0)  # 0: unlimited
+
+    def start_challenge(self, mode, difficulty=None, resume=None, time_left=None):
         # --- MODIFIED: Get the path from either the automatic or manual source ---
         path = self.stats_folder_path
         if not path:  # If auto-search failed, get it from the manual entry box
@@ -161,29 +206,35 @@ class ChallengeGUI:
         time_selection = self.time_limit_combo.get()
         time_limit_minutes = {"Unlimited": 0, "5 Minutes": 5, "10 Minutes": 10, "20 Minutes": 20, "30 Minutes": 30}[
             time_selection]
+        time_limit_seconds = time_left if time_left is not None else time_limit_minutes * 60
+        self.time_limited = time_limit_seconds > 0
 
         self.challenge_active = True;
-        self.history_listbox.delete(0, tk.END);
-        self.stop_polling_event.clear();
+        self.history.flush(); self.clear_search();
+        self.stop_polling_event.clear(); self.skip_event.clear();
         self.toggle_buttons(active=True)
         hooks = {"is_active": lambda: self.challenge_active, "update_status": self.update_status,
                  "add_history": self.add_history, "update_history": self.update_history,
                  "update_score_label": self.update_score_label, "challenge_ended": self.on_challenge_end,
                  "skip_event": self.skip_event, "pause_timer": self.pause_timer, "resume_timer": self.resume_timer,
-                 "stop_polling_event": self.stop_polling_event}
+                 "stop_polling_event": self.stop_polling_event,
+                 "time_left": lambda: self.time_left_seconds if self.time_limited else None}
 
         if mode == "percentile":
             self.score_label.config(
                 text="Score: 0 Successful, 0 Unsuccessful"); self.challenge_thread = threading.Thread(
-                target=run_online_challenge_loop, args=(path, username, difficulty, hooks), daemon=True)
+                target=run_online_challenge_loop, args=(path, username, difficulty, hooks), kwargs={"resume": resume},
+                daemon=True)
         elif mode == "pb":
             self.score_label.config(text="PBs Achieved: 0"); self.challenge_thread = threading.Thread(
-                target=run_pb_challenge_loop, args=(path, username, hooks), daemon=True)
+                target=run_pb_challenge_loop, args=(path, username, hooks),
+                kwargs={"resume": resume, "focus": FOCUS_LABELS[self.focus_combo.get()]}, daemon=True)
         elif mode == "rival":
             self.score_label.config(text="Rival PBs Beaten: 0"); self.challenge_thread = threading.Thread(
-                target=run_rival_challenge_loop, args=(path, username, rival_username, hooks), daemon=True)
+                target=run_rival_challenge_loop, args=(path, username, rival_username, hooks), kwargs={"resume": resume},
+                daemon=True)
 
-        if time_limit_minutes > 0: self.start_timer(time_limit_minutes * 60)
+        if self.time_limited: self.start_timer(time_limit_seconds)
         self.challenge_thread.start()
 
     def toggle_buttons(self, active):
@@ -195,6 +246,7 @@ class ChallengeGUI:
         self.medium_button.config(state=s);
         self.hard_button.config(state=s);
         self.pb_button.config(state=s);
+        self.focus_combo.config(state="disabled" if active else "readonly");
         self.rival_button.config(state=s)
         self.username_entry.config(state="disabled" if active else "normal");
         self.rival_username_entry.config(state="disabled" if active else "normal");
@@ -217,14 +269,16 @@ class ChallengeGUI:
     def update_timer_display(self):
         m, s = divmod(self.time_left_seconds, 60); self.timer_label.config(text=f"Time: {m:02d}:{s:02d}")
 
+    # Called from the challenge thread, so the label is recoloured on the Tk thread.
     def pause_timer(self):
-        self.timer_paused = True; self.timer_label.config(fg="#f39c12")
+        self.timer_paused = True; self.ui_events.call(lambda: self.timer_label.config(fg="#f39c12"))
 
     def resume_timer(self):
-        self.timer_paused = False; self.timer_label.config(fg="#3498db")
+        self.timer_paused = False; self.ui_events.call(lambda: self.timer_label.config(fg="#3498db"))
 
     def on_skip_click(self):
-        self.skip_event.set(); self.stop_polling_event.set()
+        # The challenge cancels the current round itself; stop_polling_event is only for ending it.
+        self.skip_event.set()
 
     def end_challenge(self):
         if self.timer_id: self.root.after_cancel(self.timer_id); self.timer_id = None
@@ -235,7 +289,7 @@ class ChallengeGUI:
         self.skip_button.config(state=tk.DISABLED)
 
     def update_score_label(self, text):
-        self.root.after(0, lambda: self.score_label.config(text=text))
+        self.ui_events.score(text)
 
     def on_random_scenario_click(self):
         if self.challenge_active:
@@ -245,21 +299,60 @@ class ChallengeGUI:
                 target=get_and_launch_random_scenario, args=(hooks,), daemon=True).start()
 
     def update_status(self, text):
-        self.root.after(0, lambda: self.status_label.config(text=text))
+        self.ui_events.status(text)
 
     def add_history(self, text):
-        self.root.after(0, lambda: (self.history_listbox.insert(tk.END, text), self.history_listbox.yview(tk.END)))
+        self.ui_events.add_history(text)
 
     def update_history(self, text):
-        self.root.after(0,
-                        lambda: (self.history_listbox.delete(tk.END - 1) if self.history_listbox.size() > 0 else None,
-                                 self.history_listbox.insert(tk.END, text), self.history_listbox.yview(tk.END)))
+        self.ui_events.update_history(text)
 
     def on_challenge_end(self):
-        self.challenge_active = False; self.root.after(0, lambda: self.toggle_buttons(active=False))
+        self.challenge_active = False; self.ui_events.call(lambda: self.toggle_buttons(active=False))
+
+    def drain_ui_events(self):
+        """Applies everything the worker threads posted since the last frame, then schedules the next frame."""
+        status, score, history_edits, calls = self.ui_events.drain()
+        if status is not None: self.status_label.config(text=status)
+        if score is not None: self.score_label.config(text=score)
+        for kind, text in history_edits:
+            if kind == "add":
+                evicted = self.history.add(text)
+                if self.showing_search: continue
+                if evicted: self.history_listbox.delete(0)
+            else:
+                self.history.replace_last(text)
+                if self.showing_search: continue
+                if self.history_listbox.size(): self.history_listbox.delete(tk.END)
+            self.history_listbox.insert(tk.END, text)
+        if history_edits and not self.showing_search: self.history_listbox.yview(tk.END)
+        for call in calls: call()
+        self.root.after(FRAME_INTERVAL_MS, self.drain_ui_events)
+
+    def search_history(self):
+        query = self.search_entry.get().strip()
+        if not query: self.clear_search(); return
+        self.showing_search = True
+        self.history_listbox.delete(0, tk.END)
+        # The current session's last line isn't logged until it's final, so it's searched here too.
+        current = [line for line in self.history.lines if query.lower() in line.lower()][-1:]
+        for line in current + self.history.log.search(query): self.history_listbox.insert(tk.END, line)
+
+    def clear_search(self):
+        self.showing_search = False
+        self.search_entry.delete(0, tk.END)
+        self.history_listbox.delete(0, tk.END)
+        self.history_listbox.insert(tk.END, *self.history.lines)
+        self.history_listbox.yview(tk.END)
+
+    def on_close(self):
+        self.history.flush()
+        self.root.destroy()
 
 
 if __name__ == "__main__":
+    # The stats index's process pool re-launches the frozen exe; let those children exit early.
+    multiprocessing.freeze_support()
     root = tk.Tk()
     app = ChallengeGUI(root)
     root.mainloop()
\ No newline at end of file
@@ -1,78 +1,295 @@
 import requests
 import json
 import itertools
+import random
+import threading
+import time
+from bisect import bisect_left
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
 from base64 import b64encode
-from urllib.parse import quote
+from urllib.parse import quote, urlsplit
 from models import *
 from endpoints import *
+from requests.adapters import HTTPAdapter
+from tracing import span, traced
+from leaderboard_mirror import MIRROR_FIELDS
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, float("inf"))
+
+
+class HttpStats:
+    """Request counters and a latency histogram, shared by every thread using the client."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {"requests": 0, "retries": 0, "failures": 0, "not_modified": 0, "bytes": 0}
+        self.latency_histogram = [0] * len(LATENCY_BUCKETS)
+
+    def record(self, seconds, size=0, not_modified=False):
+        with self._lock:
+            self.counters["requests"] += 1
+            self.counters["bytes"] += size
+            if not_modified: self.counters["not_modified"] += 1
+            self.latency_histogram[next(i for i, bound in enumerate(LATENCY_BUCKETS) if seconds <= bound)] += 1
+
+    def count(self, counter):
+        with self._lock: self.counters[counter] += 1
+
+    def snapshot(self):
+        with self._lock:
+            labels = [f"<={bound}s" for bound in LATENCY_BUCKETS[:-1]] + [f">{LATENCY_BUCKETS[-2]}s"]
+            return {**self.counters, "latency": dict(zip(labels, self.latency_histogram))}
+
+
+class ResponseCache:
+    """
+    URL -> (ETag, Last-Modified, raw body) cache backing conditional GETs, least recently used first.
+    Bodies are kept as the bytes received, a fraction of the size of the parsed JSON, and the cache is
+    bounded by their total size.
+    """
+
+    def __init__(self, max_bytes=16 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, url):
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry: self._entries.move_to_end(url)
+            return entry
+
+    def put(self, url, etag, last_modified, body):
+        if len(body) > self.max_bytes: return
+        with self._lock:
+            old = self._entries.pop(url, None)
+            if old: self.size -= len(old[2])
+            self._entries[url] = (etag, last_modified, body)
+            self.size += len(body)
+            while self.size > self.max_bytes: self.size -= len(self._entries.popitem(last=False)[1][2])
+
 
 class KovaakerClient:
-    def __init__(self, username: str = None, password: str = None):
+    def __init__(self, username: str = None, password: str = None, score_index=None, max_retries=4,
+                 pool_size=32, timeout=(5, 20)):
         self.username = username
         self.password = password
         self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
         self._auth = {}
+        self.score_index = score_index
+        self.mirror = None  # a LeaderboardMirror, which needs the client to fetch with, so it is attached after
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.stats = HttpStats()
+        self.response_cache = ResponseCache()
+        # Upper bound on in-flight page requests for any single paged scan.
+        self.max_concurrency = 8
+        self.scan_concurrency = 4
 
-    def get_user_score(self, leaderboard_id: int, username: str) -> dict | None:
-        try:
-            for page in self.scenario_leaderboard(leaderboard_id, per_page=100, by_page=True):
-                for score in page:
-                    if score.webappUsername and score.webappUsername.lower() == username.lower():
-                        return {"rank": score.rank, "score": score.score}
-        except Exception as e:
-            print(f"An error occurred while fetching user score: {e}")
-            return None
-        return None
-
-    def scenario_leaderboard(self, id: int, start_page=0, per_page=10, max_page=-1, by_page=True) -> list[Score]:
-        endpoint = SCENARIO_GLOBAL_LEADERBOARD
-        for offset in (itertools.count() if max_page == -1 else range(max_page)):
-            try:
-                resp = self.session.get(endpoint % (id, start_page + offset, per_page))
-                resp.raise_for_status()
-                data = resp.json().get("data", [])
-                if not data: break
-                result = [Score(
-                    entry.get("steamId"), entry.get("score"), entry.get("rank"), entry.get("steamAccountName"),
-                    entry.get("kovaaksPlusActive"), entry.get("attributes", {}).get("fov"), entry.get("attributes", {}).get("hash"),
-                    entry.get("attributes", {}).get("cm360"), entry.get("attributes", {}).get("epoch"), entry.get("attributes", {}).get("kills"),
-                    entry.get("attributes", {}).get("avgFps"), entry.get("attributes", {}).get("avgTtk"), entry.get("attributes", {}).get("fovScale"),
-                    entry.get("attributes", {}).get("vertSens"), entry.get("attributes", {}).get("horizSens"), entry.get("attributes", {}).get("resolution"),
-                    entry.get("attributes", {}).get("sensScale"), entry.get("attributes", {}).get("accuracyDamage"),
-                    entry.get("attributes", {}).get("challengeStart"), entry.get("attributes", {}).get("scenarioVersion"),
-                    entry.get("attributes", {}).get("clientBuildVersion"), entry.get("webappUsername"),
-                ) for entry in data]
-                if by_page: yield result
+    def get_json(self, url: str) -> dict:
+        """
+        GETs a JSON endpoint, retrying connection errors, 429s and 5xx responses with jittered
+        exponential backoff (honouring Retry-After). Responses that carried an ETag or Last-Modified
+        are revalidated with a conditional GET and served from the cache on 304.
+        Raises requests.RequestException once the retries are used up.
+        """
+        with span("http:" + urlsplit(url).path.rsplit("/", 1)[-1]) as trace:
+            cached = self.response_cache.get(url)
+            headers = {}
+            if cached:
+                if cached[0]: headers["If-None-Match"] = cached[0]
+                if cached[1]: headers["If-Modified-Since"] = cached[1]
+            for attempt in range(self.max_retries + 1):
+                start = time.perf_counter()
+                retry_after = None
+                try:
+                    resp = self.session.get(url, headers=headers, timeout=self.timeout)
+                except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                    self.stats.record(time.perf_counter() - start)
+                    if attempt == self.max_retries: self.stats.count("failures"); raise
                 else:
-                    for x in result: yield x
-            except requests.exceptions.RequestException as e:
-                print(f"Network error fetching leaderboard page: {e}")
-                break
+                    self.stats.record(time.perf_counter() - start, len(resp.content), resp.status_code == 304)
+                    trace.set(status=resp.status_code, bytes=len(resp.content), attempts=attempt + 1)
+                    if resp.status_code == 304 and cached: return json.loads(cached[2])
+                    if resp.status_code not in RETRY_STATUSES or attempt == self.max_retries:
+                        if not resp.ok: self.stats.count("failures")
+                        resp.raise_for_status()
+                        body = resp.json()
+                        etag, last_modified = resp.headers.get("ETag"), resp.headers.get("Last-Modified")
+                        if etag or last_modified: self.response_cache.put(url, etag, last_modified, resp.content)
+                        return body
+                    retry_after = resp.headers.get("Retry-After")
+                self.stats.count("retries")
+                delay = random.uniform(0, min(8.0, 0.5 * 2 ** attempt))
+                if retry_after and retry_after.isdigit(): delay = max(delay, min(float(retry_after), 30.0))
+                time.sleep(delay)
+
+    @traced("get_user_score")
+    def get_user_score(self, leaderboard_id: int, username: str, stop_event=None) -> dict | None:
+        """
+        Finds the user's PB on a leaderboard, or None if they have no score on it. Raises
+        requests.RequestException if the leaderboard can't be read, rather than guessing "no score".
+        If stop_event is set mid-scan the scan is abandoned and None is returned, so callers that
+        pass one must check it before trusting a None.
+        """
+        users, _ = self.get_user_scores(leaderboard_id, (username,), stop_event=stop_event)
+        return users[username]
 
+    @traced("get_user_scores")
+    def get_user_scores(self, leaderboard_id: int, usernames=(), target_scores=(), stop_event=None):
+        """
+        Resolves several users' PBs and the ranks several scores would take in a single pass over the
+        leaderboard, stopping as soon as every one is known. Returns ({username: {"rank", "score"} or
+        None}, {target score: rank}); a score below the whole leaderboard gets the rank after the last.
+        Raises and honours stop_event like get_user_score. With a mirror, a mirrored leaderboard is
+        synced and answers locally, and a scan that reads the whole leaderboard anyway is mirrored.
+        """
+        users, pending = {}, {}  # pending: lowercased username -> username as passed in
+        for username in usernames:
+            users[username] = None
+            if self.score_index:
+                found, score_obj = self.score_index.lookup(leaderboard_id, username)
+                if found: users[username] = score_obj; continue
+            pending[username.lower()] = username
+        targets = sorted(set(target_scores), reverse=True)  # the highest target is passed first
+        ranks, next_target, last_rank = {}, 0, 0
+        if not pending and not targets: return users, ranks
+        if self.mirror is not None:
+            board = self.mirror.sync(leaderboard_id, pending.values(), stop_event)
+            if board is not None:
+                for username in pending.values(): users[username] = board.user(username)
+                ranks.update((target, board.rank_for_score(target)) for target in targets)
+                return users, ranks
+        scanned = self.mirror.builder() if self.mirror is not None else None
+        for page in self.scenario_leaderboard(leaderboard_id, per_page=self.mirror.per_page if self.mirror else 100,
+                                              by_page=True, concurrency=self.scan_concurrency, strict=True,
+                                              fields=MIRROR_FIELDS if self.mirror else ()):
+            if stop_event is not None and stop_event.is_set(): return users, ranks
+            if scanned is not None: scanned.extend(page)
+            if pending:
+                for i, name in enumerate(page.usernames):
+                    if name and name.lower() in pending:
+                        users[pending.pop(name.lower())] = {"rank": page.ranks[i], "score": page.scores[i]}
+            scores = page.scores
+            while next_target < len(targets) and scores[-1] <= targets[next_target]:
+                target = targets[next_target]
+                ranks[target] = page.ranks[bisect_left(scores, -target, key=lambda score: -score)]
+                next_target += 1
+            last_rank = page.ranks[-1]
+            if not pending and next_target == len(targets): return users, ranks
+        if scanned is not None: self.mirror.store(leaderboard_id, scanned)
+        for target in targets[next_target:]: ranks[target] = last_rank + 1
+        return users, ranks
+
+    def scenario_leaderboard(self, id: int, start_page=0, per_page=10, max_page=-1, by_page=True,
+                             concurrency=1, strict=False, fields=None) -> LeaderboardPage:
+        """
+        Yields LeaderboardPages (or Scores when by_page is False). fields projects the pages down to
+        those Score fields; rank, score and webappUsername are always kept.
+        """
+        on_end = (lambda: self.score_index.mark_scanned(id)) if self.score_index and start_page == 0 else None
+        yield from self._paged(lambda page: self._leaderboard_page(id, page, per_page, fields), start_page, max_page,
+                               by_page, concurrency, "fetching leaderboard page", on_end, strict)
+
+    def _leaderboard_page(self, id: int, page: int, per_page: int, fields=None) -> LeaderboardPage:
+        body = self.get_json(SCENARIO_GLOBAL_LEADERBOARD % (id, page, per_page))
+        result = LeaderboardPage(body.get("data", []), fields, body.get("total"))
+        if result and self.score_index: self.score_index.record_page(id, result.rows())
+        return result
+
+    @traced("scenario_count")
     def scenario_count(self) -> int:
-        resp = self.session.get(POPULAR_SCENARIOS % (0, 1))
-        resp.raise_for_status()
-        return resp.json()["total"]
-
-    def scenario_search(self, query: str = None, start_page=0, per_page=10, max_page=-1, by_page=True) -> list[Scenario]:
-        for offset in (itertools.count() if max_page == -1 else range(max_page)):
-            try:
-                if query is None:
-                    resp = self.session.get(POPULAR_SCENARIOS % (start_page + offset, per_page))
-                else:
-                    resp = self.session.get(POPULAR_SCENARIOS_SEARCH % (start_page + offset, per_page, query))
-                resp.raise_for_status()
-                data = resp.json().get("data", [])
-                if not data: break
-                result = [Scenario(
-                    entry.get("rank"), entry.get("leaderboardId"), entry.get("scenarioName"),
-                    entry.get("scenario", {}).get("aimType"), entry.get("scenario", {}).get("authors"),
-                    entry.get("scenario", {}).get("description"), entry.get("counts", {}).get("plays"),
-                    entry.get("counts", {}).get("entries"),
-                ) for entry in data]
+        return self.get_json(POPULAR_SCENARIOS % (0, 1))["total"]
+
+    def scenario_search(self, query: str = None, start_page=0, per_page=10, max_page=-1, by_page=True,
+                        concurrency=1, strict=False) -> list[Scenario]:
+        yield from self._paged(lambda page: self._search_page(query, page, per_page), start_page, max_page,
+                               by_page, concurrency, "during scenario search", strict=strict)
+
+    def _search_page(self, query: str | None, page: int, per_page: int) -> list[Scenario]:
+        if query is None:
+            url = POPULAR_SCENARIOS % (page, per_page)
+        else:
+            url = POPULAR_SCENARIOS_SEARCH % (page, per_page, quote(query))
+        return [self._scenario(entry) for entry in self.get_json(url).get("data", [])]
+
+    @staticmethod
+    def _scenario(entry) -> Scenario:
+        return Scenario(
+            entry.get("rank"), entry.get("leaderboardId"), entry.get("scenarioName"),
+            (entry.get("scenario") or {}).get("aimType"), (entry.get("scenario") or {}).get("authors"),
+            (entry.get("scenario") or {}).get("description"), (entry.get("counts") or {}).get("plays"),
+            (entry.get("counts") or {}).get("entries"),
+        )
+
+    def user_scenarios(self, username: str, start_page=0, per_page=100, max_page=-1, concurrency=1, strict=False):
+        """Yields pages of (Scenario, the user's PB) for every scenario the user has a score on."""
+        yield from self._paged(lambda page: self._user_scenarios_page(username, page, per_page), start_page,
+                               max_page, True, concurrency, "fetching a user's scenarios", strict=strict)
+
+    def _user_scenarios_page(self, username: str, page: int, per_page: int) -> list[tuple[Scenario, float]]:
+        data = self.get_json(USER_SCENARIO_PLAYS % (quote(username), page, per_page)).get("data", [])
+        return [(self._scenario(entry), entry.get("score") or 0) for entry in data if entry.get("leaderboardId")]
+
+    def _paged(self, fetch_page, start_page, max_page, by_page, concurrency, action, on_end=None, strict=False):
+        """
+        Yields pages (or their items) in order until an empty page or max_page pages. A network error
+        ends the scan quietly, or is raised if strict, for callers that must tell "no more" from "failed".
+        """
+        page_numbers = itertools.count(start_page) if max_page == -1 else iter(range(start_page, start_page + max_page))
+        try:
+            for result in self._fetch_in_order(fetch_page, page_numbers, min(concurrency, self.max_concurrency)):
+                if not result:
+                    if on_end: on_end()
+                    return
                 if by_page: yield result
                 else:
                     for x in result: yield x
-            except requests.exceptions.RequestException as e:
-                print(f"Network error during scenario search: {e}")
-                break
\ No newline at end of file
+        except requests.exceptions.RequestException as e:
+            if strict: raise
+            print(f"Network error {action}: {e}")
+
+    @staticmethod
+    def _fetch_in_order(fetch_page, page_numbers, concurrency):
+        """
+        Fetches pages up to `concurrency` ahead of the consumer on a thread pool and yields them in
+        page order. Stops submitting after an empty page, and cancels whatever is still queued when
+        the consumer stops early.
+        """
+        if concurrency <= 1:
+            for page in page_numbers: yield fetch_page(page)
+            return
+        executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="kovaaker-pages")
+        pending = deque(executor.submit(fetch_page, page) for page in itertools.islice(page_numbers, concurrency))
+        try:
+            while pending:
+                result = pending.popleft().result()
+                yield result
+                if not result: return
+                page = next(page_numbers, None)
+                if page is not None: pending.append(executor.submit(fetch_page, page))
+        finally:
+            for future in pending: future.cancel()
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+_shared_client = None
+_shared_client_lock = threading.Lock()
+
+
+def get_client() -> KovaakerClient:
+    """The process-wide client: one connection pool, response cache, score index and leaderboard mirror for everything."""
+    global _shared_client
+    with _shared_client_lock:
+        if _shared_client is None:
+            from score_index import ScoreIndex
+            from leaderboard_mirror import LeaderboardMirror
+            _shared_client = KovaakerClient(score_index=ScoreIndex())
+            _shared_client.mirror = LeaderboardMirror(_shared_client)
+        return _shared_client
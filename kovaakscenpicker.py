@@ -5,30 +5,46 @@ import random
 import urllib.parse
 import platform
 import time
-from kovaaker import KovaakerClient
-# --- ADDED: Import psutil to check for running processes ---
-import psutil
-
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from models import LeaderboardPage
+from stats_index import StatsIndex
+from catalog import get_scenario_catalog
+from stats_watcher import snapshot_folder, wait_for_new_csv
+from stats_parser import parse_stats_file
+from thresholds import DIFFICULTY_THRESHOLDS, ThresholdCache
+from tracing import traced
+from game_process import ProcessMonitor
+from rival_profile import get_rival_profile
+from sampler import WEIGHTS
+from round_engine import ChallengeMode, Round, RoundEngine, SignalEvent
+from run_archive import get_run_archive
 if os.name == 'nt':
     if hasattr(sys.stdout, "buffer") and sys.stdout is not None:
         sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', errors='ignore')
 
-DIFFICULTY_THRESHOLDS = {"Easy": 0.20, "Medium": 0.50, "Hard": 0.80}
+game_monitor = ProcessMonitor()
+
+
+
+def get_client():
+    """The shared KovaakerClient. kovaaker, and requests with it, is only imported once a client is needed."""
+    from kovaaker import get_client as shared_client
+    return shared_client()
 
 
 def is_kovaaks_running():
-    """Checks if FPSAimTrainer.exe is in the list of running processes."""
-    for proc in psutil.process_iter(['name']):
-        if proc.info['name'].lower() == "fpsaimtrainer.exe":
-            return True
-    return False
+    """Checks if FPSAimTrainer.exe is running, re-checking the last known PID before walking the process list."""
+    return game_monitor.is_running()
 
 
 # --- MODIFIED: The launch_scenario function is now "smart" ---
-def launch_scenario(scenario_name):
+@traced("launch")
+def launch_scenario(scenario_name, stats_folder=None, stop_event=None):
     """
     Launches the scenario intelligently. If KovaaK's is already running,
     it sends the command once. If not, it uses the "double tap" method.
+    Setting stop_event stops waiting for the game, and the second command isn't sent.
     """
     encoded_name = urllib.parse.quote(scenario_name)
     steam_link = f"steam://run/824270/?action=jump-to-scenario;name={encoded_name};mode=challenge"
@@ -51,9 +67,11 @@ def launch_scenario(scenario_name):
                 # First command: This will start KovaaK's if it's closed.
                 os.startfile(steam_link)
 
-                # Wait for the game to initialize.
-                print("   Waiting 3 seconds for game to initialize...")
-                time.sleep(3)
+                # Wait for the game to initialize; the stats folder helps tell when it has.
+                print("   Waiting for the game to initialize...")
+                ready = game_monitor.wait_until_ready(stats_folder, stop_event=stop_event)
+                if stop_event is not None and stop_event.is_set(): return  # skipped or ended meanwhile
+                if not ready: print("   The game didn't report ready in time.")
 
                 # Second command: This is received by the now-running game.
                 print("   Sending follow-up command to ensure scenario loads.")
@@ -74,65 +92,175 @@ def find_stats_folder_automatically():
     return None
 
 
+@traced("await_csv")
 def watch_for_new_csv(stats_folder, initial_files, stop_event):
-    for _ in range(80):
-        if stop_event.is_set(): return None
-        current_files = set(os.listdir(stats_folder));
-        new_files = current_files - initial_files
-        for file in new_files:
-            if file.lower().endswith('.csv'): return os.path.join(stats_folder, file)
-        stop_event.wait(1.5)
-    return None
+    return wait_for_new_csv(stats_folder, initial_files, stop_event, timeout=80 * 1.5)
 
 
+@traced("parse_csv")
 def parse_score_from_csv(csv_path):
     try:
-        with open(csv_path, 'r', encoding='utf-8') as f:
-            for line in f:
-                if line.startswith("Score:,"): score = float(line.strip().split(',')[1]); print(
-                    f"   Parsed score {score} from {os.path.basename(csv_path)}"); return score
+        run = parse_stats_file(csv_path)
+        if run: print(f"   Parsed score {run.score} from {os.path.basename(csv_path)}"); return run.score
     except Exception as e:
         print(f"   Error parsing {csv_path}: {e}")
-    finally:
-        try:
-            os.remove(csv_path); print(f"   Removed temp stats file: {os.path.basename(csv_path)}")
-        except Exception as e:
-            print(f"   Could not remove {csv_path}: {e}")
     return None
 
 
-def get_rank_for_score(leaderboard_id, target_score):
-    client = KovaakerClient()
-    for page in client.scenario_leaderboard(leaderboard_id, per_page=100, by_page=True):
-        for score_entry in page:
-            if score_entry.score <= target_score: return score_entry.rank
+@traced("rank_lookup")
+def get_rank_for_score(leaderboard_id, target_score, total_entries=None, client=None, per_page=100):
+    """
+    Finds the rank a score would take on the (score-sorted) global leaderboard.
+    Pages are probed by bisection, alternating with interpolation on score, so the
+    lookup costs O(log pages) requests instead of a walk from page 0. A mirrored
+    leaderboard is synced and answers locally if the copy is exact; otherwise its
+    guess is checked against the pages around it, usually three requests.
+    """
+    client = client or get_client()
+    hint = None
+    if client.mirror is not None:
+        board = client.mirror.sync(leaderboard_id)
+        if board is not None and board.exact: return board.rank_for_score(target_score)
+        if board is not None: hint = (board.rank_for_score(target_score) - 1) // per_page
+    pages = {}
+
+    def fetch(page_index):
+        if page_index not in pages:
+            pages[page_index] = next(client.scenario_leaderboard(
+                leaderboard_id, start_page=page_index, per_page=per_page, max_page=1, strict=True,
+                fields=()), LeaderboardPage([]))
+        return pages[page_index]
+
+    def at_or_below(page_index):
+        # An empty page is past the end of the leaderboard, so it always qualifies.
+        page = fetch(page_index)
+        return not page or page.scores[-1] <= target_score
+
+    if at_or_below(0):
+        lo, hi = -1, 0
+    elif hint:
+        # Gallop out from the mirror's guess, up then down, until the target is bracketed.
+        lo, hi, step = 0, hint, 1
+        while not at_or_below(hi): lo, hi, step = hi, hi + step, step * 2
+        step = 1
+        while hi - step > lo and at_or_below(hi - step): hi, step = hi - step, step * 2
+        lo = max(lo, hi - step)
+    elif total_entries:
+        lo, hi = 0, max((total_entries - 1) // per_page, 0)
+        # The entry count can be stale; gallop past it if the leaderboard has grown.
+        while not at_or_below(hi): lo, hi = hi, hi * 2 + 1
+    else:
+        lo, hi = 0, 1
+        while not at_or_below(hi): lo, hi = hi, hi * 2
+
+    # Invariant: page lo is entirely above the target, page hi is not.
+    interpolate = True
+    while hi - lo > 1:
+        guess = (lo + hi) // 2
+        hi_page = pages.get(hi)
+        if interpolate and hi_page:
+            lo_score, hi_score = fetch(lo).scores[-1], hi_page.scores[-1]
+            if lo_score > hi_score:
+                fraction = (lo_score - target_score) / (lo_score - hi_score)
+                guess = min(max(lo + round(fraction * (hi - lo)), lo + 1), hi - 1)
+        interpolate = not interpolate
+        if at_or_below(guess): hi = guess
+        else: lo = guess
+
+    page = fetch(hi)
+    for rank, score in zip(page.ranks, page.scores):
+        if score <= target_score: return rank
     return 1_000_000
 
 
-def find_unplayed_scenario(client, username, hooks):
+@traced("stats_index")
+def load_stats_index(stats_folder, hooks):
+    hooks["update_status"]("📂 Indexing your stats folder...")
+    stats_index = StatsIndex(stats_folder)
+    new_runs = stats_index.refresh()
+    print(f"   Stats index: {len(stats_index.played())} played scenarios ({new_runs} new files read)")
+    return stats_index
+
+
+@traced("pick_unplayed")
+def find_unplayed_scenario(client, username, hooks, played=None, sampler=None):
     MAX_PAGES_TO_SEARCH = 30;
     stop_polling_event = hooks["stop_polling_event"]
-    try:
-        total_pages = (client.scenario_count() // 20)
-    except Exception:
-        total_pages = 500
+    catalog = get_scenario_catalog()
+    sampler = sampler or catalog.sampler()
+    total_pages = 500
+    if not len(catalog):
+        try:
+            total_pages = (client.scenario_count() // 20)
+        except Exception:
+            pass
     for i in range(MAX_PAGES_TO_SEARCH):
         if not hooks["is_active"](): return None
         hooks["update_status"](f"🔎 Searching for an unplayed scenario (Page {i + 1}/{MAX_PAGES_TO_SEARCH})...")
-        random_page_index = random.randint(0, total_pages - 1)
-        try:
-            page_scenarios = next(client.scenario_search(start_page=random_page_index, per_page=20)); random.shuffle(
-                page_scenarios)
-        except Exception as e:
-            print(f"Failed to fetch page {random_page_index}: {e}"); continue
-        for scenario in page_scenarios:
-            if not scenario.leaderboardId or not scenario.entries: continue
-            score_obj = client.get_user_score(scenario.leaderboardId, username)
-            if score_obj is None or score_obj['score'] == 0: return scenario
+        if len(catalog):
+            page_scenarios = sampler.sample(20)
+        else:
+            random_page_index = random.randint(0, total_pages - 1)
+            try:
+                page_scenarios = next(client.scenario_search(start_page=random_page_index, per_page=20)); random.shuffle(
+                    page_scenarios)
+            except Exception as e:
+                print(f"Failed to fetch page {random_page_index}: {e}"); continue
+        # A local run proves it's played; the absence of one still needs the online check.
+        candidates = [s for s in page_scenarios if s.leaderboardId and s.entries
+                      and not (played and s.scenarioName and s.scenarioName.lower() in played)]
+        # Smaller leaderboards are cheaper to scan, so they are checked first.
+        candidates.sort(key=lambda s: s.entries)
+        scenario = first_unplayed_scenario(client, username, candidates, hooks)
+        if scenario: return scenario
     return None
 
 
-def get_random_scenario_object(client, per_page=20):
+def first_unplayed_scenario(client, username, candidates, hooks, max_workers=4):
+    """
+    Checks candidates concurrently and returns the first one confirmed unplayed. The remaining
+    checks are cancelled as soon as there is a winner or the challenge stops being active.
+    """
+    if not candidates: return None
+    cancel_event = threading.Event()
+
+    def check(scenario):
+        if cancel_event.is_set(): return None
+        score_obj = client.get_user_score(scenario.leaderboardId, username, stop_event=cancel_event)
+        if cancel_event.is_set(): return None
+        return scenario if score_obj is None or score_obj['score'] == 0 else None
+
+    executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="unplayed-check")
+    pending = {executor.submit(check, scenario) for scenario in candidates}
+    try:
+        while pending:
+            if not hooks["is_active"](): return None
+            done, pending = wait(pending, timeout=0.2, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    scenario = future.result()
+                except Exception as e:
+                    print(f"   Could not check scenario: {e}"); continue
+                if scenario: return scenario
+        return None
+    finally:
+        cancel_event.set()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+_pick_sampler = None
+
+
+def get_random_scenario_object(client, per_page=20, sampler=None, exclude_id=None):
+    """
+    A scenario drawn by sampler (by default one shared by the one-off picks, so they don't repeat),
+    or from a random page of the scenario list while there is no catalog snapshot yet.
+    """
+    global _pick_sampler
+    catalog = get_scenario_catalog()
+    if len(catalog):
+        if sampler is None: sampler = _pick_sampler = _pick_sampler or catalog.sampler()
+        return sampler.draw(exclude_id)
     try:
         total_scenarios = client.scenario_count()
         if total_scenarios == 0: return None
@@ -143,10 +271,10 @@ def get_random_scenario_object(client, per_page=20):
         print(f"❌ Could not fetch a random scenario: {e}"); return None
 
 
-def get_and_launch_random_scenario(hooks):
-    client = KovaakerClient();
+def get_and_launch_random_scenario(hooks, sampler=None):
+    client = get_client();
     hooks["update_status"]("🔎 Picking a random scenario...")
-    selected_scenario = get_random_scenario_object(client)
+    selected_scenario = get_random_scenario_object(client, sampler=sampler)
     if selected_scenario:
         launch_scenario(selected_scenario.scenarioName); hooks["update_status"](
             f"✅ Launched: {selected_scenario.scenarioName}"); hooks["add_history"](
@@ -155,131 +283,562 @@ def get_and_launch_random_scenario(hooks):
         hooks["update_status"]("Error: Could not find a valid scenario.")
 
 
-def run_pb_challenge_loop(stats_folder, username, hooks):
-    client = KovaakerClient();
-    stop_event = hooks["stop_polling_event"];
-    skip_event = hooks["skip_event"];
-    pb_count = 0
-    hooks["update_score_label"](f"PBs Achieved: {pb_count}")
-    while hooks["is_active"]():
-        hooks["pause_timer"]();
-        hooks["update_status"]("🔎 Picking a random scenario...");
-        selected_scenario = get_random_scenario_object(client)
-        if not hooks["is_active"](): break
-        if not selected_scenario or not selected_scenario.leaderboardId: hooks["update_status"](
-            "Error finding a valid scenario. Skipping."); time.sleep(3); continue
-        hooks["update_status"](f"Fetching your PB for {selected_scenario.scenarioName}...");
-        initial_score_obj = client.get_user_score(selected_scenario.leaderboardId, username)
-        initial_score = initial_score_obj['score'] if initial_score_obj else 0
-        hooks["resume_timer"]();
-        initial_files = set(os.listdir(stats_folder));
-        hooks["add_history"](f"(Pending PB) {selected_scenario.scenarioName}");
-        launch_scenario(selected_scenario.scenarioName)
-        goal_text = f"Your PB to beat: {initial_score:.2f}" if initial_score > 0 else "No PB set. Any score is a new PB!"
-        hooks["update_status"](f"▶️ Now playing: {selected_scenario.scenarioName}\n{goal_text}")
-        new_csv_path = watch_for_new_csv(stats_folder, initial_files, stop_event)
-        if skip_event.is_set(): hooks["update_history"](
-            f"(Skipped) {selected_scenario.scenarioName}"); skip_event.clear(); continue
-        if not hooks["is_active"](): hooks["update_history"](f"(Cancelled) {selected_scenario.scenarioName}"); break
-        new_score = parse_score_from_csv(new_csv_path) if new_csv_path else None
-        if new_score:
-            result_text = f"New Score: {new_score:.2f} | Your PB: {initial_score:.2f}";
-            hooks["update_history"](f"{selected_scenario.scenarioName} - {result_text}")
-            if new_score > initial_score:
-                pb_count += 1; hooks["update_score_label"](f"PBs Achieved: {pb_count}"); hooks["update_status"](
-                    f"✅ New PB! Congratulations!\nLoading next scenario..."); time.sleep(3)
-            else:
-                hooks["update_status"](f"So close! No new PB this time.\nLoading next scenario..."); time.sleep(2)
-        else:
-            hooks["update_history"](f"(No new score) {selected_scenario.scenarioName}"); hooks["update_status"](
-                f"No new score file detected. Loading next scenario..."); time.sleep(2)
-    hooks["challenge_ended"]()
-
-
-def run_online_challenge_loop(stats_folder, username, difficulty, hooks):
-    client = KovaakerClient();
-    required_percentile = DIFFICULTY_THRESHOLDS[difficulty];
-    stop_event = hooks["stop_polling_event"];
-    skip_event = hooks["skip_event"]
-    successful_runs, unsuccessful_runs = 0, 0
-    hooks["update_score_label"](f"Score: {successful_runs} Successful, {unsuccessful_runs} Unsuccessful")
-    while hooks["is_active"]():
-        hooks["pause_timer"]();
-        selected_scenario = find_unplayed_scenario(client, username, hooks)
-        if not hooks["is_active"](): break
-        if not selected_scenario: hooks["update_status"](
-            "❌ Could not find an unplayed scenario. Stopping challenge."); time.sleep(4); break
-        hooks["resume_timer"]();
-        total_entries = selected_scenario.entries;
-        initial_files = set(os.listdir(stats_folder))
-        hooks["add_history"](f"(Pending) {selected_scenario.scenarioName}");
-        launch_scenario(selected_scenario.scenarioName)
-        hooks["update_status"](
-            f"▶️ Unplayed map: {selected_scenario.scenarioName}\nGoal: Set a score in the Top {(1 - required_percentile) * 100:.0f}%")
-        new_csv_path = watch_for_new_csv(stats_folder, initial_files, stop_event)
-        if skip_event.is_set(): hooks["update_history"](
-            f"(Skipped) {selected_scenario.scenarioName}"); skip_event.clear(); continue
-        if not hooks["is_active"](): hooks["update_history"](f"(Cancelled) {selected_scenario.scenarioName}"); break
-        new_score = parse_score_from_csv(new_csv_path) if new_csv_path else None
-        if new_score:
-            hooks["update_status"](f"Score detected: {new_score:.2f}. Checking rank online...")
-            achieved_rank = get_rank_for_score(selected_scenario.leaderboardId, new_score);
-            percentile = 1 - (achieved_rank / total_entries)
-            result_text = f"First Score: {new_score:.2f} | Approx. Rank: {achieved_rank} (Top {percentile:.1%})";
-            hooks["update_history"](f"{selected_scenario.scenarioName} - {result_text}")
-            if percentile >= required_percentile:
-                successful_runs += 1; hooks["update_status"](
-                    f"✅ Success! {result_text}\nSearching for next unplayed scenario..."); time.sleep(3)
-            else:
-                unsuccessful_runs += 1; hooks["update_status"](
-                    f"❌ Challenge Failed. {result_text}\nNeeded Top {(1 - required_percentile) * 100:.0f}%."); break
-        else:
-            hooks["update_history"](f"(No new score) {selected_scenario.scenarioName}"); hooks["update_status"](
-                f"Timed out waiting for new score file."); break
-        hooks["update_score_label"](f"Score: {successful_runs} Successful, {unsuccessful_runs} Unsuccessful")
-    hooks["challenge_ended"]()
-
-
-def run_rival_challenge_loop(stats_folder, username, rival_username, hooks):
-    client = KovaakerClient();
-    stop_event = hooks["stop_polling_event"];
-    skip_event = hooks["skip_event"];
-    rival_pbs_beaten = 0
-    hooks["update_score_label"](f"Rival PBs Beaten: {rival_pbs_beaten}")
-    while hooks["is_active"]():
-        hooks["pause_timer"]();
-        hooks["update_status"]("🔎 Picking a random scenario...");
-        selected_scenario = get_random_scenario_object(client)
-        if not hooks["is_active"](): break
-        if not selected_scenario or not selected_scenario.leaderboardId: hooks["update_status"](
-            "Error finding a valid scenario. Skipping."); time.sleep(3); continue
-        hooks["update_status"](f"Fetching {rival_username}'s PB for {selected_scenario.scenarioName}...");
-        rival_score_obj = client.get_user_score(selected_scenario.leaderboardId, rival_username)
-        rival_pb = rival_score_obj['score'] if rival_score_obj else 0
-        if rival_pb == 0: hooks["update_status"](
-            f"Rival has no score for {selected_scenario.scenarioName}. Skipping."); time.sleep(3); continue
-        hooks["resume_timer"]();
-        initial_files = set(os.listdir(stats_folder));
-        hooks["add_history"](f"(vs {rival_username}) {selected_scenario.scenarioName}");
-        launch_scenario(selected_scenario.scenarioName)
-        hooks["update_status"](
-            f"▶️ Now playing: {selected_scenario.scenarioName}\nGoal: Beat {rival_username}'s PB of {rival_pb:.2f}")
-        new_csv_path = watch_for_new_csv(stats_folder, initial_files, stop_event)
-        if skip_event.is_set(): hooks["update_history"](
-            f"(Skipped) {selected_scenario.scenarioName}"); skip_event.clear(); continue
-        if not hooks["is_active"](): hooks["update_history"](f"(Cancelled) {selected_scenario.scenarioName}"); break
-        new_score = parse_score_from_csv(new_csv_path) if new_csv_path else None
-        if new_score:
-            result_text = f"Your Score: {new_score:.2f} | Rival's PB: {rival_pb:.2f}";
-            hooks["update_history"](f"{selected_scenario.scenarioName} - {result_text}")
-            if new_score > rival_pb:
-                rival_pbs_beaten += 1;
-                hooks["update_score_label"](f"Rival PBs Beaten: {rival_pbs_beaten}")
-                hooks["update_status"](f"✅ Success! You beat {rival_username}!\nLoading next challenge...");
-                time.sleep(3)
-            else:
-                hooks["update_status"](f"❌ Failed to beat rival's PB.\nLoading next challenge..."); time.sleep(3)
+def _quiet(text):
+    pass
+
+
+def _is_cancelled(cancel_event):
+    return cancel_event is not None and cancel_event.is_set()
+
+
+def _pb_to_beat(client, username, stats_index, scenario, status, cancel_event=None, session_pb=None):
+    """
+    Your PB on the scenario: the best of the stats folder, session_pb (the best run graded this
+    session) and the leaderboard. The folder alone can be short of it, since earlier versions of this
+    app deleted every stats CSV they read. Raises if the leaderboard can't be read and there's no local PB.
+    """
+    local = max((pb for pb in (stats_index.local_pb(scenario.scenarioName), session_pb) if pb is not None),
+                default=None)
+    status(f"Fetching your PB for {scenario.scenarioName}...")
+    try:
+        score_obj = client.get_user_score(scenario.leaderboardId, username, stop_event=cancel_event)
+    except Exception as e:
+        if local is None: raise
+        print(f"   Could not fetch your PB for {scenario.scenarioName}, using your local one: {e}")
+        return local
+    online = score_obj['score'] if score_obj else 0
+    return online if local is None else max(local, online)
+
+
+@traced("resolve_rival_round")
+def resolve_rival_round(client, rival_username, status, cancel_event=None, exclude_id=None, attempts=1, profile=None,
+                        sampler=None):
+    """
+    Picks a scenario and resolves the rival's PB on it. With a ready rival profile the pick comes from
+    the scenarios the rival has played, with no network access; without one (or while it is still
+    loading or empty) it retries up to `attempts` random picks until one has a rival score. sampler's
+    weighting and filters apply either way.
+    Returns (scenario, rival_pb), with rival_pb 0 if none was found, or None.
+    """
+    if profile is not None and profile.ready.is_set():
+        pair = profile.pick(exclude_id, sampler.over(profile) if sampler else None)
+        if pair: return pair
+    result = None
+    for _ in range(attempts):
+        status("🔎 Picking a random scenario...")
+        selected_scenario = get_random_scenario_object(client, sampler=sampler, exclude_id=exclude_id)
+        if _is_cancelled(cancel_event): return None
+        if not selected_scenario or not selected_scenario.leaderboardId: continue
+        if selected_scenario.leaderboardId == exclude_id: continue
+        status(f"Fetching {rival_username}'s PB for {selected_scenario.scenarioName}...")
+        try:
+            rival_score_obj = client.get_user_score(selected_scenario.leaderboardId, rival_username, stop_event=cancel_event)
+        except Exception as e:
+            print(f"   Could not fetch {rival_username}'s PB for {selected_scenario.scenarioName}: {e}"); continue
+        if _is_cancelled(cancel_event): return None
+        result = (selected_scenario, rival_score_obj['score'] if rival_score_obj else 0)
+        if result[1]: break
+    return result
+
+
+# PB Challenge focuses: where picks come from besides anywhere at random.
+FOCUSES = {
+    "random": None,
+    "likely-pb": ("🔎 Picking a scenario you're close to a PB on...", "likely_pbs"),
+    "weakest": ("🔎 Picking a scenario of your weakest aim type...", "weakest"),
+}
+
+
+class FocusPool:
+    """The scenarios a PB Challenge focus narrows picks down to, as a sampler source."""
+
+    def __init__(self):
+        self.version, self._scenarios = 0, []
+
+    def scenarios(self):
+        return self._scenarios
+
+    def update(self, scenarios):
+        if [s.leaderboardId for s in scenarios] != [s.leaderboardId for s in self._scenarios]:
+            self._scenarios = scenarios; self.version += 1
+
+
+class PbMode(ChallengeMode):
+    """Beat your own PB on random scenarios, or on those a SkillProfile of your stats folder singles out."""
+    name = "pb"
+
+    def __init__(self, username, hooks, sampler, focus="random"):
+        self.client, self.username, self.hooks, self.sampler = get_client(), username, hooks, sampler
+        self.stats_index, self.pb_count = None, 0
+        self.focus, self.pool, self._profiled = focus, FocusPool(), None
+        self._session_pbs = {}  # lowercased scenario name -> best score graded this session
+
+    def settings(self):
+        return {"username": self.username, "focus": self.focus}
+
+    @traced("profile")
+    def _refresh_pool(self):
+        """Re-reads the stats folder and, if it changed, rebuilds the skill profile and the focus pool."""
+        self.stats_index.refresh()
+        catalog = get_scenario_catalog()
+        if self._profiled == (self.stats_index.version, catalog.version): return
+        from analytics import SkillProfile  # loads NumPy, which the other commands don't need
+        by_name = catalog.by_name()
+        profile = SkillProfile(self.stats_index.runs(ordered=False),
+                               lambda key: by_name[key].aimType if key in by_name else None)
+        self.pool.update([by_name[s.name.lower()] for s in getattr(profile, FOCUSES[self.focus][1])() if s.name.lower() in by_name])
+        self._profiled = (self.stats_index.version, catalog.version)
+
+    def restore(self, rounds):
+        self.pb_count = sum(r.outcome == "success" for r in rounds)
+        for r in rounds:
+            if r.score is not None: self._record_score(r.text, r.score)
+
+    def _record_score(self, scenario_name, score):
+        key = scenario_name.lower()
+        if score > self._session_pbs.get(key, float("-inf")): self._session_pbs[key] = score
+
+    def setup(self, stats_folder, cancel_event):
+        self.stats_index = load_stats_index(stats_folder, self.hooks)
+
+    def score_text(self):
+        return f"PBs Achieved: {self.pb_count}"
+
+    @traced("pick")
+    def pick(self, exclude_id, quiet, cancel_event):
+        if FOCUSES[self.focus]:
+            if not quiet: self.hooks["update_status"](FOCUSES[self.focus][0])
+            self._refresh_pool()
+            scenario = self.sampler.over(self.pool).draw(exclude_id)
+            if scenario: return Round(scenario)
+            # Not enough history to single anything out yet.
+        if not quiet: self.hooks["update_status"]("🔎 Picking a random scenario...")
+        scenario = get_random_scenario_object(self.client, sampler=self.sampler, exclude_id=exclude_id)
+        return Round(scenario) if scenario and scenario.leaderboardId else None
+
+    @traced("resolve_target")
+    def resolve_target(self, scenario, cancel_event):
+        self.stats_index.refresh()  # runs since setup, in case the scenario comes round again
+        return _pb_to_beat(self.client, self.username, self.stats_index, scenario, _quiet, cancel_event,
+                           self._session_pbs.get(scenario.scenarioName.lower()))
+
+    def pending_text(self, round_):
+        return f"(Pending PB) {round_.scenario.scenarioName}"
+
+    def goal_text(self, round_):
+        goal = f"Your PB to beat: {round_.target:.2f}" if round_.target > 0 else "No PB set. Any score is a new PB!"
+        return f"▶️ Now playing: {round_.scenario.scenarioName}\n{goal}"
+
+    def grade(self, round_, score, cancel_event):
+        name, pb = round_.scenario.scenarioName, round_.target
+        if not score:
+            return "no-score", f"(No new score) {name}", "No new score file detected. Loading next scenario...", 2, True
+        self._record_score(name, score)
+        history = f"{name} - New Score: {score:.2f} | Your PB: {pb:.2f}"
+        if score > pb:
+            self.pb_count += 1
+            return "success", history, "✅ New PB! Congratulations!\nLoading next scenario...", 3, True
+        return "fail", history, "So close! No new PB this time.\nLoading next scenario...", 2, True
+
+
+class FirstTryMode(ChallengeMode):
+    """Reach a leaderboard percentile on your first try of scenarios you've never played."""
+    name = "first-try"
+
+    def __init__(self, username, difficulty, hooks, sampler):
+        self.client, self.username, self.hooks, self.sampler = get_client(), username, hooks, sampler
+        self.difficulty, self.required_percentile = difficulty, DIFFICULTY_THRESHOLDS[difficulty]
+        self.thresholds = ThresholdCache(self.client)
+        self.played, self.successful_runs, self.unsuccessful_runs = set(), 0, 0
+
+    def settings(self):
+        return {"username": self.username, "difficulty": self.difficulty}
+
+    def restore(self, rounds):
+        self.successful_runs = sum(r.outcome == "success" for r in rounds)
+        self.unsuccessful_runs = sum(r.outcome == "fail" for r in rounds)
+
+    def setup(self, stats_folder, cancel_event):
+        self.played = load_stats_index(stats_folder, self.hooks).played()
+
+    def score_text(self):
+        return f"Score: {self.successful_runs} Successful, {self.unsuccessful_runs} Unsuccessful"
+
+    def pick(self, exclude_id, quiet, cancel_event):
+        hooks = dict(self.hooks, is_active=lambda: self.hooks["is_active"]() and not cancel_event.is_set())
+        if quiet: hooks["update_status"] = _quiet
+        scenario = find_unplayed_scenario(self.client, self.username, hooks, self.played, self.sampler)
+        return Round(scenario) if scenario else None
+
+    def nothing_picked(self):
+        return "❌ Could not find an unplayed scenario. Stopping challenge.", 4, False
+
+    @traced("resolve_target")
+    def resolve_target(self, scenario, cancel_event):
+        return self.thresholds.cutoff(scenario, self.required_percentile)
+
+    def launched(self, round_):
+        self.played.add(round_.scenario.scenarioName.lower())
+
+    def goal_text(self, round_):
+        goal = f"Top {(1 - self.required_percentile) * 100:.0f}%" + (
+            f" (score {round_.target:.2f} needed)" if round_.target is not None else "")
+        return f"▶️ Unplayed map: {round_.scenario.scenarioName}\nGoal: Set a score in the {goal}"
+
+    def grade(self, round_, score, cancel_event):
+        scenario, needed, top = round_.scenario, round_.target, (1 - self.required_percentile) * 100
+        if not score:
+            return "no-score", f"(No new score) {scenario.scenarioName}", "Timed out waiting for new score file.", 0, False
+        if needed is not None:
+            result_text = f"First Score: {score:.2f} | Needed: {needed:.2f} (Top {top:.0f}%)"
+            success, failed_text = score >= needed, f"❌ Challenge Failed. {result_text}"
         else:
-            hooks["update_history"](f"(No new score) {selected_scenario.scenarioName}"); hooks["update_status"](
-                f"No new score detected. Loading next challenge..."); time.sleep(2)
-    hooks["challenge_ended"]()
\ No newline at end of file
+            # The cut-off couldn't be resolved before the run, so fall back to locating the rank online.
+            self.hooks["update_status"](f"Score detected: {score:.2f}. Checking rank online...")
+            try:
+                rank = get_rank_for_score(scenario.leaderboardId, score, scenario.entries, self.client)
+            except Exception as e:
+                print(f"   Rank check failed: {e}")
+                return ("error", f"(Rank check failed) {scenario.scenarioName} - First Score: {score:.2f}",
+                        "⚠️ Could not check your rank online. Not counted.\nSearching for next unplayed scenario...", 3, True)
+            percentile = 1 - (rank / scenario.entries)
+            result_text = f"First Score: {score:.2f} | Approx. Rank: {rank} (Top {percentile:.1%})"
+            success = percentile >= self.required_percentile
+            failed_text = f"❌ Challenge Failed. {result_text}\nNeeded Top {top:.0f}%."
+        history = f"{scenario.scenarioName} - {result_text}"
+        if success:
+            self.successful_runs += 1
+            return "success", history, f"✅ Success! {result_text}\nSearching for next unplayed scenario...", 3, True
+        self.unsuccessful_runs += 1
+        return "fail", history, failed_text, 0, False
+
+
+RIVAL_PROFILE_WAIT = 5.0  # seconds Rival mode waits for the rival's profile before picking at random
+
+
+class RivalMode(ChallengeMode):
+    """Beat a rival's PB on scenarios they have played."""
+    name = "rival"
+
+    def __init__(self, username, rival_username, hooks, sampler):
+        self.client, self.username, self.rival_username = get_client(), username, rival_username
+        self.hooks, self.sampler = hooks, sampler
+        self.profile, self.rival_pbs_beaten = None, 0
+
+    def settings(self):
+        return {"username": self.username, "rival": self.rival_username}
+
+    def restore(self, rounds):
+        self.rival_pbs_beaten = sum(r.outcome == "success" for r in rounds)
+
+    def setup(self, stats_folder, cancel_event):
+        # Resolved once per session in the background; rounds are picked from it once it is ready, and
+        # at random (checking the rival's score online) until then, so a slow refresh doesn't hold the start up.
+        self.profile = get_rival_profile(self.client, self.rival_username)
+        if not self.profile.ready.is_set():
+            self.hooks["update_status"](f"⏳ Loading the scenarios {self.rival_username} has played...")
+        deadline = time.monotonic() + RIVAL_PROFILE_WAIT
+        while (not self.profile.ready.wait(0.2) and not cancel_event.is_set()
+               and time.monotonic() < deadline): pass
+
+    def score_text(self):
+        return f"Rival PBs Beaten: {self.rival_pbs_beaten}"
+
+    def pick(self, exclude_id, quiet, cancel_event):
+        result = resolve_rival_round(self.client, self.rival_username, _quiet if quiet else self.hooks["update_status"],
+                                     cancel_event, exclude_id, attempts=10 if quiet else 1, profile=self.profile,
+                                     sampler=self.sampler)
+        return Round(*result, resolved=True) if result else None
+
+    def unplayable(self, round_):
+        if not round_.target: return f"Rival has no score for {round_.scenario.scenarioName}. Skipping."
+
+    def pending_text(self, round_):
+        return f"(vs {self.rival_username}) {round_.scenario.scenarioName}"
+
+    def goal_text(self, round_):
+        return f"▶️ Now playing: {round_.scenario.scenarioName}\nGoal: Beat {self.rival_username}'s PB of {round_.target:.2f}"
+
+    def grade(self, round_, score, cancel_event):
+        name, rival_pb = round_.scenario.scenarioName, round_.target
+        if not score: return "no-score", f"(No new score) {name}", "No new score detected. Loading next challenge...", 2, True
+        history = f"{name} - Your Score: {score:.2f} | Rival's PB: {rival_pb:.2f}"
+        if score > rival_pb:
+            self.rival_pbs_beaten += 1
+            return "success", history, f"✅ Success! You beat {self.rival_username}!\nLoading next challenge...", 3, True
+        return "fail", history, "❌ Failed to beat rival's PB.\nLoading next challenge...", 3, True
+
+    def close(self):
+        if self.profile is not None: self.profile.stop()
+
+
+def _await_score(stats_folder, initial_files, stop_event):
+    new_csv_path = watch_for_new_csv(stats_folder, initial_files, stop_event)
+    return parse_score_from_csv(new_csv_path) if new_csv_path else None
+
+
+def run_challenge(mode, stats_folder, hooks, resume=None):
+    """
+    Runs a challenge mode to its end on the calling thread, recording it to the run archive.
+    resume is (session id, archived rounds) from RunArchive.unfinished_session to carry one on.
+    """
+    # Looked up per call so the launcher and watcher can be swapped out, e.g. by bench.py.
+    RoundEngine(mode, stats_folder, hooks, lambda name, folder, stop_event: launch_scenario(name, folder, stop_event),
+                lambda folder, files, stop_event: _await_score(folder, files, stop_event), snapshot_folder,
+                archive=get_run_archive(), resume=resume).run()
+
+
+def run_pb_challenge_loop(stats_folder, username, hooks, sampler=None, resume=None, focus="random"):
+    # One sampler per session, so no scenario comes round twice in quick succession.
+    run_challenge(PbMode(username, hooks, sampler or get_scenario_catalog().sampler(), focus), stats_folder, hooks,
+                  resume)
+
+
+def run_online_challenge_loop(stats_folder, username, difficulty, hooks, sampler=None, resume=None):
+    run_challenge(FirstTryMode(username, difficulty, hooks, sampler or get_scenario_catalog().sampler()), stats_folder,
+                  hooks, resume)
+
+
+def run_rival_challenge_loop(stats_folder, username, rival_username, hooks, sampler=None, resume=None):
+    run_challenge(RivalMode(username, rival_username, hooks, sampler or get_scenario_catalog().sampler()), stats_folder,
+                  hooks, resume)
+
+
+COMMANDS = ("pick", "pb", "rival", "first-try", "search", "resume")
+
+
+def console_hooks(emit=print, minutes=None):
+    """Hooks dict that reports to the console, for running the challenges without the GUI."""
+    stop_event, state = SignalEvent(), {"left": minutes * 60 if minutes else None, "since": None}
+
+    def is_active():
+        if state["left"] is not None and state["since"] is not None:
+            if state["left"] - (time.monotonic() - state["since"]) <= 0: stop_event.set()
+        return not stop_event.is_set()
+
+    def pause_timer():
+        if state["left"] is not None and state["since"] is not None:
+            state["left"] -= time.monotonic() - state["since"]; state["since"] = None
+
+    def resume_timer():
+        if state["left"] is not None and state["since"] is None: state["since"] = time.monotonic()
+
+    def time_left():
+        if state["left"] is None: return None
+        return state["left"] - (time.monotonic() - state["since"] if state["since"] is not None else 0)
+
+    def timer():
+        while not stop_event.wait(1): is_active()  # ends a timed challenge mid-round, like the GUI timer
+
+    if minutes: threading.Thread(target=timer, daemon=True, name="challenge-timer").start()
+    return {"is_active": is_active, "update_status": lambda text: emit(f"» {text}"),
+            "add_history": lambda text: emit(f"+ {text}"), "update_history": lambda text: emit(f"= {text}"),
+            "update_score_label": lambda text: emit(f"# {text}"), "challenge_ended": lambda: emit("🏁 Challenge ended."),
+            "skip_event": SignalEvent(), "pause_timer": pause_timer, "resume_timer": resume_timer,
+            "stop_polling_event": stop_event, "time_left": time_left}
+
+
+def _parse_args(argv):
+    import argparse
+    parser = argparse.ArgumentParser(prog="python -m kovaakscenpicker",
+                                     description="Runs the KovaaK's challenges from the console.")
+    parser.add_argument("command", choices=COMMANDS + ("serve",))
+    parser.add_argument("query", nargs="*", help='search text and filters, e.g. "smooth aim:tracking entries<5k" (search)')
+    parser.add_argument("--user", help="your KovaaK's username (pb, first-try, rival)")
+    parser.add_argument("--rival", help="the rival's KovaaK's username (rival)")
+    parser.add_argument("--difficulty", choices=tuple(DIFFICULTY_THRESHOLDS), default="Medium", help="first-try goal")
+    parser.add_argument("--stats", help="KovaaK's stats folder (found automatically if omitted)")
+    parser.add_argument("--minutes", type=float, help="challenge duration (unlimited if omitted)")
+    parser.add_argument("--weight", choices=tuple(WEIGHTS), default="uniform",
+                        help="favour popular scenarios by plays or leaderboard entries (pick, pb, first-try, rival)")
+    parser.add_argument("--aim", action="append", help="only pick scenarios of this aim type (repeatable)")
+    parser.add_argument("--author", action="append", help="only pick scenarios by this author (repeatable)")
+    parser.add_argument("--focus", choices=tuple(FOCUSES), default="random",
+                        help="pick scenarios whose PB looks within reach, or of your weakest aim type (pb)")
+    parser.add_argument("--local", action="store_true", help="don't hand the command to a running server")
+    args = parser.parse_intermixed_args(argv)
+    if args.command in ("pb", "first-try", "rival") and not args.user: parser.error(f"{args.command} needs --user")
+    if args.command == "rival" and not args.rival: parser.error("rival needs --rival")
+    args.resume = None
+    if args.command == "resume":
+        archive = get_run_archive()
+        unfinished = archive.unfinished_session()
+        if not unfinished: parser.error("there is no interrupted challenge to resume")
+        start, settings, rounds = unfinished
+        time_left = next((r.time_left for r in reversed(rounds) if r.time_left is not None), start.time_left)
+        if time_left is not None and time_left < 1:
+            # Out of time: close it like the GUI does, rather than launch a scenario only to end.
+            archive.end_session(start.session, start.mode)
+            parser.error("the interrupted challenge had no time left; nothing to resume")
+        args.command, args.resume = start.mode, (start.session, rounds)  # modes are archived by command name
+        args.user, args.rival = settings.get("username"), settings.get("rival")
+        args.difficulty = settings.get("difficulty", args.difficulty)
+        args.focus = settings.get("focus", args.focus)
+        args.minutes = time_left / 60 if time_left is not None else None
+    return args
+
+
+def _warm_caches(search=False):
+    """Imports the client and loads (or starts refreshing) the scenario catalog, and with search its search index, off the main thread."""
+    def warm():
+        try:
+            catalog = get_scenario_catalog()
+            if search: catalog.search_index()
+        except Exception as e:
+            print(f"   Cache warm-up failed: {e}")
+    thread = threading.Thread(target=warm, daemon=True, name="cache-warm")
+    thread.start()
+    return thread
+
+
+def run_command(args, hooks):
+    """Runs one CLI command with the given hooks. Returns a process exit code."""
+    sampler = None
+    if args.command != "search" and (args.weight != "uniform" or args.aim or args.author):
+        sampler = get_scenario_catalog().sampler(args.weight, aim_types=args.aim, authors=args.author)
+    if args.command == "pick":
+        get_and_launch_random_scenario(hooks, sampler); return 0
+    if args.command == "search":
+        catalog = get_scenario_catalog()
+        if not len(catalog):
+            hooks["update_status"]("Downloading the scenario list first..."); catalog.refresh_in_background().join()
+        for s in catalog.search(" ".join(args.query)):
+            hooks["update_status"](f"{s.scenarioName}  [{s.aimType or '?'}]  {s.plays or 0:,} plays, {s.entries or 0:,} entries")
+        return 0
+    stats_folder = args.stats or find_stats_folder_automatically()
+    if not stats_folder or not os.path.isdir(stats_folder):
+        hooks["update_status"]("❌ Stats folder not found. Pass it with --stats."); return 1
+    if args.command == "pb":
+        run_pb_challenge_loop(stats_folder, args.user, hooks, sampler, args.resume, args.focus)
+    elif args.command == "first-try":
+        run_online_challenge_loop(stats_folder, args.user, args.difficulty, hooks, sampler, args.resume)
+    else:
+        run_rival_challenge_loop(stats_folder, args.user, args.rival, hooks, sampler, args.resume)
+    return 0
+
+
+def _server_key_path():
+    from storage import cache_path
+    return cache_path("server.key")
+
+
+def _write_server_key(key):
+    """
+    Writes the server's authkey readable by the current user only. The old file is removed first,
+    since the mode only applies to a file being created, and O_EXCL refuses anything put in its place.
+    On Windows the mode bits do nothing; the key sits in the user's own %LOCALAPPDATA%.
+    """
+    path = _server_key_path()
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_BINARY", 0), 0o600)
+    with os.fdopen(fd, 'wb') as f:
+        f.write(key)
+
+
+def _server_address():
+    # A named pipe / unix socket rather than TCP: local only, and no Nagle delay on the small messages.
+    if os.name == 'nt': return r"\\.\pipe\KovaaksChallenge"
+    from storage import cache_path
+    return cache_path("server.sock")
+
+
+def serve():
+    """
+    Persistent server: keeps the interpreter, client, catalog and indexes warm and runs commands
+    handed over by later `python -m kovaakscenpicker` invocations, streaming the hooks' output back.
+    One command runs at a time; closing the invoking console stops it.
+    """
+    from multiprocessing.connection import Listener
+    key = os.urandom(16)
+    _write_server_key(key)
+    address = _server_address()
+    if os.name != 'nt' and os.path.exists(address): os.remove(address)  # left behind by a killed server
+    _warm_caches(search=True)
+    print(f"🟢 Serving on {address}. Ctrl+C to stop.")
+    with Listener(address, authkey=key) as listener:
+        while True:
+            try:
+                conn = listener.accept()
+            except (OSError, EOFError) as e:  # includes failed authentication
+                print(f"   Rejected a connection: {e}"); continue
+            with conn:
+                try:
+                    args = _parse_args(conn.recv())
+                except (SystemExit, EOFError, OSError):
+                    continue
+                lock = threading.Lock()
+
+                def emit(text):
+                    with lock:
+                        try:
+                            conn.send(("line", text))
+                        except OSError:
+                            hooks["stop_polling_event"].set()
+
+                hooks = console_hooks(emit, args.minutes)
+
+                def watch_invoker():
+                    try:
+                        conn.recv()
+                    except (EOFError, OSError):
+                        pass
+                    hooks["stop_polling_event"].set()
+
+                threading.Thread(target=watch_invoker, daemon=True, name="invoker-watch").start()
+                try:
+                    code = run_command(args, hooks)
+                except Exception as e:
+                    emit(f"❌ {e}"); code = 1
+                with lock:
+                    try:
+                        conn.send(("exit", code))
+                    except OSError:
+                        pass
+
+
+def _run_via_server(argv):
+    """Hands the command to a running server. Returns its exit code, or None if no server answered."""
+    try:
+        with open(_server_key_path(), 'rb') as f:
+            key = f.read()
+        from multiprocessing.connection import Client
+        conn = Client(_server_address(), authkey=key)
+    except (OSError, EOFError):
+        return None
+    with conn:
+        conn.send(argv)
+        try:
+            while True:
+                kind, value = conn.recv()
+                if kind == "exit": return value
+                print(value)
+        except EOFError:
+            return 1
+        except KeyboardInterrupt:
+            return 130
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    args = _parse_args(argv)
+    if args.command == "serve":
+        try:
+            serve()
+        except KeyboardInterrupt:
+            pass
+        return 0
+    if not args.local:
+        code = _run_via_server(argv)
+        if code is not None: return code
+    _warm_caches(search=args.command == "search")
+    try:
+        return run_command(args, console_hooks(minutes=args.minutes))
+    except KeyboardInterrupt:
+        print("\n🛑 Stopped."); return 130
+
+
+if __name__ == "__main__":
+    sys.exit(main())
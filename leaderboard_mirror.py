@@ -0,0 +1,294 @@
+import gzip
+import json
+import os
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from models import LeaderboardPage
+from storage import cache_path
+from tracing import span
+
+PER_PAGE = 100
+# Score fields a mirror keeps besides rank, score and username: who the row is and when it was set.
+MIRROR_FIELDS = ("steamId", "epoch")
+MIN_SYNC_INTERVAL = 60  # a board synced this recently is served as is
+FULL_SCAN_AGE = 24 * 60 * 60  # a board last scanned in full this long ago is scanned in full again
+PROBE_SPACING = 32  # pages; interior pages checked on every sync are at least this far apart...
+MAX_PROBES = 8  # ...and there are at most this many of them
+MAX_BOARDS = 8  # boards kept in memory
+MAX_DISK_BYTES = 64 * 1024 * 1024  # mirror files kept on disk; the least recently synced go first
+
+
+def _page_columns(page):
+    """(keys, usernames, scores, epochs) of a LeaderboardPage; a row's key is its steamId, or username without one."""
+    keys = [steam_id or username for steam_id, username in zip(page.column("steamId"), page.usernames)]
+    return keys, list(page.usernames), array('d', page.scores), array('q', (e or 0 for e in page.column("epoch")))
+
+
+class MirroredLeaderboard:
+    """A local copy of one leaderboard, best first, as columns; a row's rank is its position + 1."""
+    __slots__ = ("keys", "usernames", "scores", "epochs", "synced", "scanned", "_positions", "_by_username")
+
+    def __init__(self, keys, usernames, scores, epochs, synced, scanned):
+        self.keys, self.usernames, self.scores, self.epochs = keys, usernames, scores, epochs
+        self.synced, self.scanned = synced, scanned  # last sync and last full scan, epoch seconds
+        self._positions = self._by_username = None
+
+    def __len__(self):
+        return len(self.scores)
+
+    @property
+    def exact(self):
+        """
+        Whether the last sync fetched every row (a full scan). After an incremental one, a PB improved
+        inside a stretch that wasn't fetched leaves rows out of place, so ranks and cut-offs read off
+        the copy are only a close guess.
+        """
+        return self.scanned >= self.synced
+
+    def positions(self):
+        """Row key -> position, built on first use."""
+        if self._positions is None: self._positions = {key: i for i, key in enumerate(self.keys) if key}
+        return self._positions
+
+    def position(self, username):
+        """Position of the user's row (webapp username, any case), or None."""
+        if self._by_username is None:
+            self._by_username = {name.lower(): i for i, name in enumerate(self.usernames) if name}
+        return self._by_username.get(username.lower())
+
+    def user(self, username):
+        """{"rank", "score"} of the user's PB, like KovaakerClient.get_user_score, or None."""
+        i = self.position(username)
+        return None if i is None else {"rank": i + 1, "score": self.scores[i]}
+
+    def extend(self, page):
+        """Appends a page's rows, e.g. while a full scan streams in."""
+        for column, values in zip((self.keys, self.usernames, self.scores, self.epochs), _page_columns(page)):
+            column.extend(values)
+
+    def rank_for_score(self, score):
+        """The rank a score would take: that of the first row at or below it, or the one after the last."""
+        return bisect_left(self.scores, -score, key=lambda s: -s) + 1
+
+    def to_json(self):
+        return {"synced": self.synced, "scanned": self.scanned, "keys": self.keys, "usernames": self.usernames,
+                "scores": self.scores.tolist(), "epochs": self.epochs.tolist()}
+
+    @classmethod
+    def from_json(cls, data):
+        return cls(data["keys"], data["usernames"], array('d', data["scores"]), array('q', data["epochs"]),
+                   data["synced"], data["scanned"])
+
+
+class LeaderboardMirror:
+    """
+    Local copies of the leaderboards that have been scanned in full, kept up to date incrementally.
+    A sync fetches the first and last page and a few evenly spaced probe pages, then lines each fetched
+    page up with the copy: a row that is still there with the same score and epoch tells how far rows
+    have shifted at that point. Where the shift at both ends of a run of unfetched pages agrees, those
+    pages are taken from the copy, moved by the shift; where it doesn't, new or removed entries lie in
+    between and the middle page is fetched, until every changed page is found. A score that improves
+    without leaving the stretch between two fetched pages goes unnoticed until one of them is fetched
+    (or the next full scan), so pages holding users asked about are always fetched too, and a copy that
+    isn't exact is only a hint for ranks and cut-offs. The files of the least recently synced copies are deleted once they add up to more than max_disk_bytes.
+    """
+
+    def __init__(self, client, folder=None, per_page=PER_PAGE, min_interval=MIN_SYNC_INTERVAL, max_age=FULL_SCAN_AGE,
+                 clock=time.time, max_disk_bytes=MAX_DISK_BYTES):
+        self.client = client
+        self.folder = folder or cache_path("leaderboards")
+        os.makedirs(self.folder, exist_ok=True)
+        self.max_disk_bytes = max_disk_bytes
+        self.per_page = per_page
+        self.min_interval = min_interval
+        self.max_age = max_age
+        self.clock = clock
+        self._lock = threading.Lock()  # guards _boards and _board_locks
+        self._boards = OrderedDict()  # leaderboardId -> MirroredLeaderboard, least recently used first
+        self._board_locks = {}
+
+    def _path(self, leaderboard_id):
+        return os.path.join(self.folder, f"{leaderboard_id}.json.gz")
+
+    def _board_lock(self, leaderboard_id):
+        with self._lock: return self._board_locks.setdefault(leaderboard_id, threading.Lock())
+
+    def get(self, leaderboard_id):
+        """The local copy as it is, or None if the leaderboard isn't mirrored. No network access."""
+        with self._lock:
+            board = self._boards.get(leaderboard_id)
+            if board is not None: self._boards.move_to_end(leaderboard_id); return board
+        try:
+            with gzip.open(self._path(leaderboard_id), 'rt', encoding='utf-8') as f:
+                board = MirroredLeaderboard.from_json(json.load(f))
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+        self._keep(leaderboard_id, board)
+        return board
+
+    def _keep(self, leaderboard_id, board):
+        with self._lock:
+            self._boards[leaderboard_id] = board
+            self._boards.move_to_end(leaderboard_id)
+            while len(self._boards) > MAX_BOARDS: self._boards.popitem(last=False)
+
+    def _save(self, leaderboard_id, board):
+        self._keep(leaderboard_id, board)
+        tmp_path = self._path(leaderboard_id) + ".tmp"
+        try:
+            with gzip.open(tmp_path, 'wt', encoding='utf-8', compresslevel=1) as f:
+                json.dump(board.to_json(), f, separators=(',', ':'))
+            os.replace(tmp_path, self._path(leaderboard_id))
+        except OSError as e:
+            print(f"   Could not save leaderboard mirror: {e}")
+        self._evict(leaderboard_id)
+
+    def _evict(self, keep_id):
+        """Deletes the least recently synced mirror files (file mtime) until they fit in max_disk_bytes."""
+        files = []
+        with os.scandir(self.folder) as entries:
+            for entry in entries:
+                if not entry.name.endswith(".json.gz"): continue
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, entry.name))
+        total, removed = sum(size for _, size, _ in files), set()
+        keep = os.path.basename(self._path(keep_id))
+        for _, size, name in sorted(files):
+            if total <= self.max_disk_bytes: break
+            if name == keep: continue
+            try:
+                os.remove(os.path.join(self.folder, name))
+            except OSError:
+                continue
+            total -= size
+            removed.add(name)
+        if removed:
+            with self._lock:
+                for leaderboard_id in [i for i in self._boards if os.path.basename(self._path(i)) in removed]:
+                    del self._boards[leaderboard_id]
+
+    def _touch(self, leaderboard_id):
+        """Marks a mirror file as just synced without rewriting it, so eviction keeps it."""
+        try:
+            os.utime(self._path(leaderboard_id))
+        except OSError:
+            pass
+
+    def builder(self):
+        """An empty board to extend() with a full scan's pages (fetched with MIRROR_FIELDS) as they arrive, then store()."""
+        now = self.clock()
+        return MirroredLeaderboard([], [], array('d'), array('q'), now, now)
+
+    def store(self, leaderboard_id, board):
+        """Mirrors a leaderboard from a board built from every one of its pages, e.g. a finished full scan."""
+        with self._board_lock(leaderboard_id): self._save(leaderboard_id, board)
+        return board
+
+    def sync(self, leaderboard_id, watch=(), stop_event=None):
+        """
+        Brings a mirrored leaderboard up to date and returns it, or returns None if the leaderboard isn't
+        mirrored (or stop_event was set). watch names users whose rows must be checked against the server.
+        Raises requests.RequestException if a page can't be fetched.
+        """
+        with self._board_lock(leaderboard_id):
+            board = self.get(leaderboard_id)
+            if board is None: return None
+            now = self.clock()
+            if now - board.synced < self.min_interval: return board
+            with span("mirror_sync") as trace:
+                if now - board.scanned > self.max_age: synced = self._full_scan(leaderboard_id, stop_event)
+                else: synced = self._refresh(leaderboard_id, board, watch, stop_event, trace)
+            if synced is None: return None
+            if synced.keys == board.keys and synced.scores == board.scores and synced.epochs == board.epochs:
+                board.synced = synced.synced  # unchanged: no need to rewrite the file
+                self._touch(leaderboard_id)
+                return board
+            self._save(leaderboard_id, synced)
+            return synced
+
+    def _full_scan(self, leaderboard_id, stop_event):
+        board = self.builder()
+        for page in self.client.scenario_leaderboard(leaderboard_id, per_page=self.per_page, by_page=True,
+                                                     concurrency=self.client.scan_concurrency, strict=True,
+                                                     fields=MIRROR_FIELDS):
+            if stop_event is not None and stop_event.is_set(): return None
+            board.extend(page)
+        return board
+
+    def _fetch_page(self, leaderboard_id, page_index):
+        return next(self.client.scenario_leaderboard(leaderboard_id, start_page=page_index, per_page=self.per_page,
+                                                     max_page=1, strict=True, fields=MIRROR_FIELDS), LeaderboardPage([]))
+
+    def _refresh(self, leaderboard_id, board, watch, stop_event, trace):
+        n, pages = self.per_page, {}
+        first = self._fetch_page(leaderboard_id, 0)
+        if first.total is None: return self._full_scan(leaderboard_id, stop_event)
+        pages[0] = _page_columns(first)
+        last = max(first.total - 1, 0) // n
+        spacing = max(PROBE_SPACING, last // (MAX_PROBES + 1) + 1)
+        wanted = {last, *range(spacing, last, spacing)}
+        wanted.update(min(i // n, last) for i in map(board.position, watch) if i is not None)
+        with ThreadPoolExecutor(max_workers=max(1, self.client.scan_concurrency),
+                                thread_name_prefix="mirror-pages") as executor:
+            while True:
+                wanted = sorted(p for p in wanted if p not in pages)
+                for p, page in zip(wanted, executor.map(lambda p: self._fetch_page(leaderboard_id, p), wanted)):
+                    pages[p] = _page_columns(page)
+                if stop_event is not None and stop_event.is_set(): return None
+                # A page of the wrong length means the leaderboard changed size mid-sync; start over from scratch.
+                if any(len(rows[0]) != (n if p < last else first.total - last * n) for p, rows in pages.items()):
+                    return self._full_scan(leaderboard_id, stop_event)
+                dirty = self._dirty_gaps(board, pages)
+                if dirty: wanted = {(a + b) // 2 for a, b in dirty}; continue
+                synced = self._merge(board, pages)
+                # Rows of watched users must come from a fetched page, not the copy.
+                wanted = {i // n for i in map(synced.position, watch) if i is not None} - pages.keys()
+                if not wanted:
+                    trace.set(pages=len(pages), of=last + 1)
+                    return synced
+
+    def _shift(self, board, rows, position, index):
+        """How far the row at rows[index] (now at position) moved since the copy was made, or None if it changed."""
+        if not rows[0]: return None
+        key, score, epoch = rows[0][index], rows[2][index], rows[3][index]
+        i = board.positions().get(key)
+        if i is None or board.scores[i] != score or board.epochs[i] != epoch: return None
+        return position - i
+
+    def _gaps(self, pages):
+        ordered = sorted(pages)
+        return [(a, b) for a, b in zip(ordered, ordered[1:]) if b > a + 1]
+
+    def _dirty_gaps(self, board, pages):
+        """Runs of unfetched pages (as (fetched page before, fetched page after)) that can't be taken from the copy."""
+        n, fetched_keys, dirty = self.per_page, None, []
+        for a, b in self._gaps(pages):
+            above = self._shift(board, pages[a], a * n + len(pages[a][0]) - 1, -1)
+            below = self._shift(board, pages[b], b * n, 0)
+            start, end = (a + 1) * n, b * n
+            if above is None or above != below or start - above < 0 or end - above > len(board):
+                dirty.append((a, b)); continue
+            if fetched_keys is None: fetched_keys = {key for rows in pages.values() for key in rows[0]}
+            # A row both in the stretch and on a fetched page has moved; the shift alone doesn't account for it.
+            if not fetched_keys.isdisjoint(board.keys[start - above:end - above]): dirty.append((a, b))
+        return dirty
+
+    def _merge(self, board, pages):
+        n, columns = self.per_page, ([], [], array('d'), array('q'))
+        previous = None
+        for p in sorted(pages):
+            if previous is not None and p > previous + 1:
+                shift = self._shift(board, pages[p], p * n, 0)
+                start, end = (previous + 1) * n - shift, p * n - shift
+                for column, values in zip(columns, (board.keys, board.usernames, board.scores, board.epochs)):
+                    column.extend(values[start:end])
+            for column, values in zip(columns, pages[p]): column.extend(values)
+            previous = p
+        return MirroredLeaderboard(*columns, self.clock(), board.scanned)
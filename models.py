@@ -1,8 +1,10 @@
-from dataclasses import dataclass
+import sys
+from array import array
+from dataclasses import dataclass, fields as dataclass_fields
 from enum import Enum
 from datetime import datetime
 
-@dataclass
+@dataclass(slots=True)
 class Scenario:
     rank: int
     leaderboardId: int
@@ -13,7 +15,7 @@ class Scenario:
     plays: int
     entries: int
 
-@dataclass
+@dataclass(slots=True)
 class Score:
     steamId: str
     score: float
@@ -38,6 +40,74 @@ class Score:
     clientBuildVersion: str
     webappUsername: str
 
+SCORE_FIELDS = tuple(f.name for f in dataclass_fields(Score))
+# Score fields that sit at the top level of a leaderboard row; the rest are under "attributes".
+SCORE_TOP_LEVEL_FIELDS = frozenset({"steamId", "score", "rank", "steamAccountName", "kovaaksPlusActive", "webappUsername"})
+
+
+class LeaderboardPage:
+    """
+    One page of a leaderboard, stored column-wise: ranks and scores in typed arrays and usernames
+    interned. Score objects are only built when a row is indexed or iterated. The raw rows aren't
+    kept; fields projects the page down to those Score fields (all of them by default), so
+    unprojected Score fields are None. total is the leaderboard's entry count as the server
+    reported it with the page, if it did.
+    """
+    __slots__ = ("ranks", "scores", "usernames", "total", "_columns")
+
+    def __init__(self, data, fields=None, total=None):
+        self.ranks = array('q', [entry.get("rank") or 0 for entry in data])
+        self.scores = array('d', [entry.get("score") or 0.0 for entry in data])
+        self.usernames = [sys.intern(name) if (name := entry.get("webappUsername")) else None for entry in data]
+        self.total = total
+        wanted = [field for field in (SCORE_FIELDS if fields is None else fields)
+                  if field not in ("rank", "score", "webappUsername")]
+        attributes = [entry.get("attributes") or {} for entry in data] if any(
+            field not in SCORE_TOP_LEVEL_FIELDS for field in wanted) else None
+        self._columns = {field: [row.get(field) for row in (data if field in SCORE_TOP_LEVEL_FIELDS else attributes)]
+                         for field in wanted}
+
+    def __len__(self):
+        return len(self.ranks)
+
+    def __bool__(self):
+        return len(self.ranks) > 0
+
+    def __getitem__(self, index):
+        if isinstance(index, slice): return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0: index += len(self)
+        if not 0 <= index < len(self): raise IndexError("leaderboard page index out of range")
+        score = Score(*[self._columns[field][index] if field in self._columns else None for field in SCORE_FIELDS])
+        score.rank, score.score, score.webappUsername = self.ranks[index], self.scores[index], self.usernames[index]
+        return score
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    def column(self, field):
+        """One Score field for every row, e.g. column("epoch"); None for rows (or projections) without it."""
+        if field == "rank": return list(self.ranks)
+        if field == "score": return list(self.scores)
+        if field == "webappUsername": return list(self.usernames)
+        return self._columns.get(field, [None] * len(self))
+
+    def rows(self):
+        """(username, rank, score) tuples without building Score objects."""
+        return zip(self.usernames, self.ranks, self.scores)
+
+
+@dataclass(slots=True)
+class RunStats:
+    scenarioName: str
+    score: float
+    kills: int
+    accuracy: float
+    avgTtk: float
+    horizSens: float
+    sensScale: str
+    fov: float
+    timestamp: float
+
 class LeaderboardFilter(Enum):
     GLOBAL = 1
     VIP = 2
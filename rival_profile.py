@@ -0,0 +1,159 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from models import Scenario
+from sampler import ScenarioSampler
+from storage import cache_path
+
+DEFAULT_MAX_AGE = 6 * 60 * 60
+# When the profile endpoint is unavailable, the most played leaderboards are checked one by one instead,
+# smallest first, reading at most SCAN_FALLBACK_PAGES pages in all (a rival without a score on one
+# means reading every page of it).
+SCAN_FALLBACK_LIMIT = 100
+SCAN_FALLBACK_PAGES = 500
+
+
+class RivalProfile:
+    """
+    Every scenario a rival has a score on, with their PB, so Rival mode only picks rounds it can
+    play. The last profile is loaded from disk and refreshed in the background; pages are merged in
+    as they arrive, so picks work from the first page on, and scenarios only drop out of the cached
+    set once a refresh has completed without them.
+    """
+
+    def __init__(self, client, username, path=None, max_age=DEFAULT_MAX_AGE):
+        self.client = client
+        self.username = username
+        key = hashlib.sha1(username.lower().encode()).hexdigest()[:12]
+        self.path = path or cache_path(f"rival-{key}.json")
+        self.max_age = max_age
+        self.fetched_at = 0
+        self.version = 0  # bumped whenever the set of scenarios changes, so samplers know to rebuild
+        self.ready = threading.Event()  # set once there is something to pick from, or a refresh has finished
+        self._lock = threading.Lock()
+        self._pairs = {}  # leaderboardId -> (Scenario, rival PB)
+        self._refresh_thread = None
+        self._stop = threading.Event()
+        self._sampler = ScenarioSampler(self)
+
+    def __len__(self):
+        return len(self._pairs)
+
+    def load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                snapshot = json.load(f)
+            pairs = {row[1]: (Scenario(*row[:8]), row[8]) for row in snapshot["rows"]}
+        except (OSError, ValueError, KeyError, TypeError, IndexError):
+            return False
+        with self._lock:
+            self._pairs, self.fetched_at = pairs, snapshot.get("fetched", 0)
+            self.version += 1
+        if pairs: self.ready.set()
+        return True
+
+    def save(self):
+        with self._lock:
+            rows = [[s.rank, s.leaderboardId, s.scenarioName, s.aimType, s.authors, s.description, s.plays, s.entries, pb]
+                    for s, pb in self._pairs.values()]
+            snapshot = {"username": self.username, "fetched": self.fetched_at, "rows": rows}
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(snapshot, f, separators=(',', ':'))
+        os.replace(tmp_path, self.path)
+
+    def is_stale(self):
+        return time.time() - self.fetched_at > self.max_age
+
+    def _merge(self, pairs):
+        with self._lock:
+            for scenario, pb in pairs:
+                if not pb: continue
+                if scenario.leaderboardId not in self._pairs: self.version += 1
+                self._pairs[scenario.leaderboardId] = (scenario, pb)
+        if self._pairs: self.ready.set()
+
+    def refresh(self, per_page=100):
+        """Pulls the rival's scenario list, falling back to checking popular leaderboards if that fails."""
+        seen = set()
+        self._stop.clear()
+        try:
+            for page in self.client.user_scenarios(self.username, per_page=per_page, concurrency=4, strict=True):
+                if self._stop.is_set(): self.ready.set(); return False
+                self._merge(page)
+                seen.update(scenario.leaderboardId for scenario, _ in page)
+        except Exception as e:
+            print(f"   Could not fetch {self.username}'s scenario list: {e}")
+            if not self._pairs: self._scan_popular()
+            self.ready.set()
+            return False
+        with self._lock:
+            if seen:
+                kept = {k: v for k, v in self._pairs.items() if k in seen}
+                if len(kept) != len(self._pairs): self._pairs = kept; self.version += 1
+            self.fetched_at = time.time()
+        self.ready.set()
+        try:
+            self.save()
+        except OSError as e:
+            print(f"   Could not save rival profile: {e}")
+        return True
+
+    def _scan_popular(self, limit=SCAN_FALLBACK_LIMIT, max_pages=SCAN_FALLBACK_PAGES, per_page=100):
+        from catalog import get_scenario_catalog
+        candidates = sorted((s for s in get_scenario_catalog().scenarios() if s.leaderboardId and s.entries),
+                            key=lambda s: -(s.plays or 0))[:limit]
+        budget = max_pages
+        for scenario in sorted(candidates, key=lambda s: s.entries):
+            if self._stop.is_set(): return
+            pages = -(-scenario.entries // per_page)  # the worst case, a full scan
+            if pages > budget: return  # the rest are bigger still
+            budget -= pages
+            try:
+                score_obj = self.client.get_user_score(scenario.leaderboardId, self.username, stop_event=self._stop)
+            except Exception:
+                continue
+            if score_obj: self._merge([(scenario, score_obj['score'])])
+
+    def refresh_in_background(self):
+        if self._refresh_thread and self._refresh_thread.is_alive(): return self._refresh_thread
+        self._refresh_thread = threading.Thread(target=self.refresh, daemon=True, name="rival-profile")
+        self._refresh_thread.start()
+        return self._refresh_thread
+
+    def pairs(self):
+        with self._lock: return list(self._pairs.values())
+
+    def scenarios(self):
+        with self._lock: return [scenario for scenario, _ in self._pairs.values()]
+
+    def pick(self, exclude_id=None, sampler=None):
+        """
+        A random (scenario, rival PB), avoiding exclude_id when there is any alternative, or None if
+        nothing matches. sampler, if given, is a ScenarioSampler over this profile that sets the weighting and filters.
+        """
+        scenario = (sampler or self._sampler).draw(exclude_id)
+        if scenario is None: return None
+        with self._lock:
+            return self._pairs.get(scenario.leaderboardId)
+
+    def stop(self):
+        """Abandons an in-flight refresh at its next page or leaderboard."""
+        self._stop.set()
+
+
+_profiles = {}
+_profiles_lock = threading.Lock()
+
+
+def get_rival_profile(client, username):
+    """Shared profile per rival: loaded from disk once and refreshed in the background when stale."""
+    with _profiles_lock:
+        profile = _profiles.get(username.lower())
+        if profile is None:
+            profile = _profiles[username.lower()] = RivalProfile(client, username)
+            profile.load()
+    if profile.is_stale(): profile.refresh_in_background()
+    return profile
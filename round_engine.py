@@ -0,0 +1,309 @@
+import asyncio
+import threading
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from tracing import span, tracer
+
+# The skip and end signals are checked this often when they are plain threading.Events.
+SIGNAL_POLL_INTERVAL = 0.05
+
+
+class SignalEvent(threading.Event):
+    """A threading.Event that coroutines can also await, so setting it from another thread wakes them at once."""
+
+    def __init__(self):
+        super().__init__()
+        self._waiters_lock = threading.Lock()
+        self._waiters = set()  # (loop, future)
+
+    def set(self):
+        super().set()
+        with self._waiters_lock:
+            waiters, self._waiters = self._waiters, set()
+        for loop, future in waiters:
+            try:
+                loop.call_soon_threadsafe(_resolve, future)
+            except RuntimeError:
+                pass  # that loop has already closed
+
+    async def wait_async(self):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self._waiters_lock: self._waiters.add((loop, future))
+        try:
+            if not self.is_set(): await future
+        finally:
+            with self._waiters_lock: self._waiters.discard((loop, future))
+        return True
+
+
+def _resolve(future):
+    if not future.done(): future.set_result(True)
+
+
+async def wait_for_signal(event):
+    """Waits for a SignalEvent without delay, or polls any other threading.Event."""
+    if isinstance(event, SignalEvent): return await event.wait_async()
+    while not event.is_set(): await asyncio.sleep(SIGNAL_POLL_INTERVAL)
+    return True
+
+
+class Round:
+    """One scenario to play and what has to be beaten on it, once resolved."""
+    __slots__ = ("scenario", "target", "resolved", "launched")
+
+    def __init__(self, scenario, target=None, resolved=False):
+        self.scenario, self.target, self.resolved, self.launched = scenario, target, resolved, False
+
+
+class ChallengeMode(ABC):
+    """
+    What makes a challenge mode different; RoundEngine runs everything else. The blocking methods
+    run on worker threads and get a cancel_event, set once their result is no longer wanted.
+    A mode has to implement score_text, pick, goal_text and grade.
+    """
+    name = "challenge"
+
+    def settings(self):
+        """What the mode was started with (usernames, difficulty), as archived for resuming it."""
+        return {}
+
+    def setup(self, stats_folder, cancel_event):
+        """Loads whatever the mode needs before its first round."""
+
+    def restore(self, rounds):
+        """Picks the score back up from the archived rounds of a session being resumed."""
+
+    @abstractmethod
+    def score_text(self):
+        """The running score, as shown under the status."""
+
+    @abstractmethod
+    def pick(self, exclude_id, quiet, cancel_event):
+        """The next Round, or None if no scenario could be picked. May resolve the target too."""
+
+    def nothing_picked(self):
+        """(status text, seconds to show it for, whether the challenge continues) when pick found nothing."""
+        return "Error finding a valid scenario. Skipping.", 3, True
+
+    def resolve_target(self, scenario, cancel_event):
+        """The target to beat on a picked scenario. Runs while the game loads the scenario."""
+        return None
+
+    def unplayable(self, round_):
+        """Why a resolved round shouldn't be played, or None if it can."""
+        return None
+
+    def pending_text(self, round_):
+        return f"(Pending) {round_.scenario.scenarioName}"
+
+    @abstractmethod
+    def goal_text(self, round_):
+        """What the player has to beat on a resolved round."""
+
+    def launched(self, round_):
+        """Called once the round's scenario has been launched."""
+
+    @abstractmethod
+    def grade(self, round_, score, cancel_event):
+        """
+        Judges a finished run (score is None if no new run turned up). Returns (outcome, history text
+        or None, status text, seconds to show it for, whether the challenge continues), outcome being
+        one of run_archive.OUTCOMES.
+        """
+
+    def close(self):
+        """Releases whatever setup acquired."""
+
+
+class RoundEngine:
+    """
+    Runs a challenge as rounds of pick -> resolve target -> launch -> await score -> grade on an
+    asyncio loop of its own. Blocking steps run on a small thread pool; the next round is prefetched
+    while the current one is played, and a target still unknown at launch is resolved while the game
+    loads the scenario. A finished round's result stays on screen for its pause while the next round is
+    launched, the statuses after it waiting their turn. Skip and End cancel the current round at whatever
+    step it is in, pauses included.
+    With an archive, the session and each round's result are recorded to it; resume is (session id,
+    archived rounds) of an interrupted session to carry on with.
+    """
+
+    def __init__(self, mode, stats_folder, hooks, launch, await_score, list_files, max_workers=4, archive=None,
+                 resume=None):
+        self.mode = mode
+        self.stats_folder = stats_folder
+        self.hooks = hooks
+        self.launch = launch  # (scenario name, stats folder, stop event)
+        self.await_score = await_score  # (stats folder, files before launch, stop event) -> new run's score or None
+        self.list_files = list_files  # stats folder -> set of its filenames, e.g. stats_watcher.snapshot_folder
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"{mode.name}-round")
+        self._prefetch = None
+        self._current = None
+        self._held_until = 0.0  # loop time until which the status shown by _hold stays up
+        self._deferred = None  # TimerHandle of a status waiting for the held one
+        self.archive = archive
+        self.resume = resume
+        self.session = None
+
+    def run(self):
+        """Runs the challenge to its end on the calling thread."""
+        asyncio.run(self._run())
+
+    async def _blocking(self, func, *args):
+        """Runs func(*args, cancel_event) on the pool. Cancelling the await sets cancel_event."""
+        cancel_event = threading.Event()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args, cancel_event)
+        finally:
+            cancel_event.set()
+
+    async def _pause(self, seconds):
+        if seconds:
+            with span("pause"): await asyncio.sleep(seconds)
+
+    def _status(self, text):
+        """Shows a status, or, while a held one is still up, once its time is over."""
+        self._release()
+        loop = asyncio.get_running_loop()
+        if loop.time() < self._held_until: self._deferred = loop.call_at(self._held_until, self.hooks["update_status"], text)
+        else: self.hooks["update_status"](text)
+
+    def _hold(self, text, seconds):
+        """Shows a status and keeps it up for seconds without holding up the next round."""
+        self._release()
+        self.hooks["update_status"](text)
+        self._held_until = asyncio.get_running_loop().time() + (seconds or 0)
+
+    def _release(self, clear=False):
+        """Drops the status waiting for the held one; clear also lets the next status show at once."""
+        if self._deferred is not None: self._deferred.cancel(); self._deferred = None
+        if clear: self._held_until = 0.0
+
+    def _time_left(self):
+        return self.hooks.get("time_left", lambda: None)()
+
+    def _record(self, round_, score, outcome):
+        if self.archive is not None:
+            self.archive.record_round(self.session, self.mode.name, round_.scenario, score, round_.target, outcome,
+                                      self._time_left())
+
+    def _active(self):
+        return self.hooks["is_active"]() and not self.hooks["stop_polling_event"].is_set()
+
+    async def _run(self):
+        hooks, skip_event, end_event = self.hooks, self.hooks["skip_event"], self.hooks["stop_polling_event"]
+        tracer.start_session(self.mode.name)
+        skip_event.clear()
+        end_wait = asyncio.ensure_future(wait_for_signal(end_event))
+        try:
+            setup = asyncio.ensure_future(self._blocking(self.mode.setup, self.stats_folder))
+            await asyncio.wait({setup, end_wait}, return_when=asyncio.FIRST_COMPLETED)
+            if not setup.done(): setup.cancel(); return
+            setup.result()
+            if self.resume is not None:
+                self.session, rounds = self.resume
+                self.mode.restore(rounds)
+            elif self.archive is not None:
+                self.session = self.archive.start_session(self.mode.name, self.mode.settings(), self._time_left())
+            hooks["update_score_label"](self.mode.score_text())
+            while self._active():
+                round_task = asyncio.ensure_future(self._play_round())
+                skip_wait = asyncio.ensure_future(wait_for_signal(skip_event))
+                await asyncio.wait({round_task, skip_wait, end_wait}, return_when=asyncio.FIRST_COMPLETED)
+                skip_wait.cancel()
+                skip_event.clear()
+                if round_task.done():
+                    if not round_task.result(): break
+                    continue
+                round_task.cancel()
+                await asyncio.gather(round_task, return_exceptions=True)
+                self._release(clear=True)
+                skipped = self._active()
+                if self._current is not None and self._current.launched:
+                    name = self._current.scenario.scenarioName
+                    hooks["update_history"](f"(Skipped) {name}" if skipped else f"(Cancelled) {name}")
+                    self._record(self._current, None, "skipped" if skipped else "cancelled")
+                if not skipped: break
+        finally:
+            end_wait.cancel()
+            self._release()
+            if self._prefetch is not None: self._prefetch.cancel()
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self.mode.close()
+            if self.session is not None and self.archive is not None:
+                self.archive.end_session(self.session, self.mode.name, self._time_left())
+            tracer.end_session()
+            hooks["challenge_ended"]()
+
+    async def _next_round(self):
+        prefetch, self._prefetch = self._prefetch, None
+        if prefetch is not None:
+            if not prefetch.done(): self._status("⏳ Getting the next scenario ready...")
+            try:
+                # Shielded, so a skip while waiting leaves the prefetch running for the round after.
+                round_ = await asyncio.shield(prefetch)
+            except asyncio.CancelledError:
+                if not prefetch.done(): self._prefetch = prefetch
+                raise
+            except Exception as e:
+                print(f"   Prefetch of the next round failed: {e}"); round_ = None
+            if round_ is not None: return round_
+        return await self._blocking(self.mode.pick, None, False)
+
+    def _start_prefetch(self, exclude_id):
+        async def prefetch():
+            round_ = await self._blocking(self.mode.pick, exclude_id, True)
+            if round_ is not None and not round_.resolved:
+                round_.target, round_.resolved = await self._blocking(self.mode.resolve_target, round_.scenario), True
+            return round_
+        self._prefetch = asyncio.ensure_future(prefetch())
+
+    def _launch(self, name, cancel_event):
+        self.launch(name, self.stats_folder, cancel_event)
+
+    async def _play_round(self):
+        """Plays one round. Returns whether the challenge continues."""
+        hooks, mode = self.hooks, self.mode
+        self._current = None
+        hooks["pause_timer"]()
+        tracer.print_summary()
+        round_ = await self._next_round()
+        if round_ is None:
+            status, pause, keep_going = mode.nothing_picked()
+            self._hold(status, pause); await self._pause(pause); return keep_going
+        self._current = round_
+        problem = round_.resolved and mode.unplayable(round_)
+        if problem: self._hold(problem, 3); await self._pause(3); return True
+        initial_files = self.list_files(self.stats_folder)
+        hooks["resume_timer"]()
+        launch = asyncio.ensure_future(self._blocking(self._launch, round_.scenario.scenarioName))
+        if not round_.resolved:
+            self._status(f"Working out the goal for {round_.scenario.scenarioName}...")
+            try:
+                round_.target, round_.resolved = await self._blocking(mode.resolve_target, round_.scenario), True
+            except Exception as e:
+                print(f"   Could not work out the goal for {round_.scenario.scenarioName}: {e}")
+                await launch
+                # The game is already on the scenario, so the round still goes into the history and archive.
+                round_.launched = True
+                hooks["add_history"](f"(Error) {round_.scenario.scenarioName}")
+                self._current = None
+                self._record(round_, None, "error")
+                self._hold("Error finding a valid scenario. Skipping.", 3); await self._pause(3); return True
+        await launch
+        round_.launched = True
+        hooks["add_history"](mode.pending_text(round_))
+        mode.launched(round_)
+        self._status(mode.goal_text(round_))
+        self._start_prefetch(round_.scenario.leaderboardId)
+        score = await self._blocking(self.await_score, self.stats_folder, initial_files)
+        if not self._active(): return False
+        outcome, history, status, pause, keep_going = await self._blocking(mode.grade, round_, score)
+        self._current = None
+        self._record(round_, score, outcome)
+        if history: hooks["update_history"](history)
+        hooks["update_score_label"](mode.score_text())
+        # The result stays up for its pause while the next round launches; the last one holds up the end.
+        self._hold(status, pause)
+        if not keep_going: await self._pause(pause)
+        return keep_going
@@ -0,0 +1,235 @@
+import json
+import math
+import os
+import queue
+import struct
+import threading
+import time
+import zlib
+from array import array
+from collections import namedtuple
+from storage import cache_path
+
+BLOCK_SIZE = 512  # journal records compacted into one compressed block
+RESUME_MAX_AGE = 12 * 60 * 60
+KINDS = ("start", "round", "end")
+OUTCOMES = ("", "success", "fail", "no-score", "skipped", "cancelled", "error")
+_BLOCK_HEADER = struct.Struct("<4sIIqdd")  # magic, records, payload bytes, last seq, first ts, last ts
+_MAGIC = b"KRA1"
+# Numeric columns in block order: (field, array typecode).
+_COLUMNS = (("seq", "q"), ("ts", "d"), ("session", "q"), ("leaderboard_id", "q"), ("score", "d"),
+            ("target", "d"), ("time_left", "d"))
+
+RunRecord = namedtuple("RunRecord", "seq ts session kind mode leaderboard_id text score target outcome time_left")
+RunRecord.__doc__ = """
+One archived event. kind is "start" (text holds the session's settings as JSON), "round" (text is the
+scenario name) or "end". score, target and time_left are None when unknown.
+"""
+
+
+def _none_to_nan(value):
+    return math.nan if value is None else float(value)
+
+
+def _nan_to_none(value):
+    return None if value != value else value
+
+
+def _encode_block(records):
+    columns = [array(code, (_none_to_nan(getattr(r, name)) if code == "d" else getattr(r, name) or 0 for r in records))
+               for name, code in _COLUMNS]
+    small = bytes(KINDS.index(r.kind) | OUTCOMES.index(r.outcome) << 2 for r in records)
+    texts = "\0".join(f"{r.mode}\0{r.text}" for r in records).encode("utf-8")
+    payload = zlib.compress(b"".join(c.tobytes() for c in columns) + small + texts, 6)
+    header = _BLOCK_HEADER.pack(_MAGIC, len(records), len(payload), records[-1].seq, records[0].ts, records[-1].ts)
+    return header + payload
+
+
+def _matcher(start, end, mode, session, scenario, kind):
+    def matches(ts, record_session, record_kind, record_mode, text):
+        return (start <= ts < end and (mode is None or record_mode == mode)
+                and (session is None or record_session == session) and (kind is None or record_kind == kind)
+                and (scenario is None or (record_kind == "round" and text.lower() == scenario)))
+    return matches
+
+
+def _decode_block(count, payload, matches, needle=None):
+    """The block's records that pass matches(); needle, if given, is lowercased text every match must contain."""
+    data = zlib.decompress(payload)
+    if needle is not None and needle not in data.lower(): return []
+    offset, columns = 0, []
+    for _, code in _COLUMNS:
+        column = array(code)
+        size = column.itemsize * count
+        column.frombytes(data[offset:offset + size]); offset += size
+        columns.append(column)
+    small = data[offset:offset + count]
+    texts = data[offset + count:].decode("utf-8").split("\0")
+    seqs, stamps, sessions, leaderboards, scores, targets, time_lefts = columns
+    return [RunRecord(seqs[i], stamps[i], sessions[i], KINDS[small[i] & 3], texts[2 * i], leaderboards[i] or None,
+                      texts[2 * i + 1], _nan_to_none(scores[i]), _nan_to_none(targets[i]), OUTCOMES[small[i] >> 2],
+                      _nan_to_none(time_lefts[i]))
+            for i in range(count) if matches(stamps[i], sessions[i], KINDS[small[i] & 3], texts[2 * i], texts[2 * i + 1])]
+
+
+class RunArchive:
+    """
+    Append-only record of every challenge session and round. New records go to a JSON-lines journal
+    on a background thread, so recording a round never waits on the disk and a crash loses at most
+    the record being written. Every BLOCK_SIZE records the journal is compacted into a zlib-compressed
+    columnar block; block headers carry their time range, so range queries decompress only the
+    blocks they need.
+    """
+
+    def __init__(self, path=None, block_size=BLOCK_SIZE, clock=time.time):
+        self.path = path or cache_path("runs.bin")
+        self.clock = clock
+        self.journal_path = self.path + ".journal"
+        self.block_size = block_size
+        self._lock = threading.Lock()  # guards the files, the block index and the journal
+        self._blocks = []  # (offset, records, payload bytes, first ts, last ts)
+        self._journal = []  # RunRecords not yet compacted
+        self._seq = 0
+        self._queue = queue.Queue()
+        self._load()
+        self._writer = threading.Thread(target=self._write_loop, daemon=True, name="run-archive")
+        self._writer.start()
+
+    def _load(self):
+        offset = 0
+        try:
+            with open(self.path, 'rb') as f:
+                while True:
+                    header = f.read(_BLOCK_HEADER.size)
+                    if len(header) < _BLOCK_HEADER.size: break
+                    magic, count, size, last_seq, first_ts, last_ts = _BLOCK_HEADER.unpack(header)
+                    if magic != _MAGIC or f.seek(size, os.SEEK_CUR) > os.fstat(f.fileno()).st_size: break
+                    self._blocks.append((offset + _BLOCK_HEADER.size, count, size, first_ts, last_ts))
+                    self._seq, offset = last_seq, offset + _BLOCK_HEADER.size + size
+        except OSError:
+            pass
+        if os.path.exists(self.path) and os.path.getsize(self.path) > offset:
+            with open(self.path, 'r+b') as f: f.truncate(offset)  # a block torn by a crash mid-compaction
+        try:
+            with open(self.journal_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = RunRecord(*json.loads(line))
+                    except (ValueError, TypeError):
+                        continue  # the line being written when the app died
+                    # Records already compacted, if the app died before the journal was cleared.
+                    if record.seq > self._seq: self._journal.append(record)
+        except OSError:
+            pass
+        if self._journal: self._seq = self._journal[-1].seq
+
+    def _append(self, session, kind, mode, leaderboard_id=None, text="", score=None, target=None, outcome="",
+                time_left=None):
+        with self._lock:
+            self._seq += 1
+            record = RunRecord(self._seq, self.clock(), session or self._seq, kind, mode, leaderboard_id, text, score,
+                               target, outcome, time_left)
+        self._queue.put(record)
+        return record
+
+    def start_session(self, mode, settings, time_left=None):
+        """Records a new session's settings (username etc.) and returns its id."""
+        return self._append(None, "start", mode, text=json.dumps(settings), time_left=time_left).session
+
+    def record_round(self, session, mode, scenario, score, target, outcome, time_left=None):
+        self._append(session, "round", mode, scenario.leaderboardId, scenario.scenarioName, score, target, outcome,
+                     time_left)
+
+    def end_session(self, session, mode, time_left=None):
+        self._append(session, "end", mode, time_left=time_left)
+
+    def _write_loop(self):
+        while True:
+            batch = [self._queue.get()]  # plus whatever else is already queued, written together
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                pending = [record for record in batch if record is not None]
+                with self._lock:
+                    while pending:
+                        room = self.block_size - len(self._journal)
+                        chunk, pending = pending[:room], pending[room:]
+                        with open(self.journal_path, 'a', encoding='utf-8') as f:
+                            f.write("".join(json.dumps(record, separators=(',', ':')) + "\n" for record in chunk))
+                        self._journal.extend(chunk)
+                        if len(self._journal) >= self.block_size: self._compact()
+            except OSError as e:
+                print(f"   Could not write run archive: {e}")
+            finally:
+                for _ in batch: self._queue.task_done()
+            if None in batch: return
+
+    def _compact(self):
+        """Moves the journal into a new compressed block. Caller holds the lock."""
+        block = _encode_block(self._journal)
+        with open(self.path, 'ab') as f:
+            offset = f.tell() + _BLOCK_HEADER.size
+            f.write(block); f.flush(); os.fsync(f.fileno())
+        self._blocks.append((offset, len(self._journal), len(block) - _BLOCK_HEADER.size, self._journal[0].ts,
+                             self._journal[-1].ts))
+        open(self.journal_path, 'w').close()
+        self._journal = []
+
+    def flush(self):
+        """Waits until everything recorded so far is on disk."""
+        self._queue.join()
+
+    def close(self):
+        self._queue.put(None)
+        self._writer.join()
+
+    def query(self, start=None, end=None, mode=None, session=None, scenario=None, kind=None):
+        """Records with start <= ts < end (epoch seconds, None for open-ended) matching the filters, oldest first."""
+        self.flush()
+        start = -math.inf if start is None else start
+        end = math.inf if end is None else end
+        scenario = scenario.lower() if scenario else None
+        matches = _matcher(start, end, mode, session, scenario, kind)
+        with self._lock:
+            blocks, journal = [b for b in self._blocks if b[4] >= start and b[3] < end], list(self._journal)
+        found = []
+        if blocks:
+            needle = scenario.encode("utf-8") if scenario else None
+            with open(self.path, 'rb') as f:
+                for offset, count, size, _, _ in blocks:
+                    f.seek(offset)
+                    found.extend(_decode_block(count, f.read(size), matches, needle))
+        found.extend(r for r in journal if matches(r.ts, r.session, r.kind, r.mode, r.text))
+        return found
+
+    def unfinished_session(self, max_age=RESUME_MAX_AGE):
+        """
+        (start record, settings, round records) of the latest session from the last max_age seconds
+        that never recorded its end, i.e. one a crash or a kill interrupted. None if there isn't one.
+        """
+        records = self.query(start=self.clock() - max_age)
+        ended = {r.session for r in records if r.kind == "end"}
+        starts = [r for r in records if r.kind == "start" and r.session not in ended]
+        if not starts: return None
+        start = starts[-1]
+        rounds = [r for r in records if r.kind == "round" and r.session == start.session]
+        try:
+            settings = json.loads(start.text)
+        except ValueError:
+            return None
+        return start, settings, rounds
+
+
+_shared_archive = None
+_shared_lock = threading.Lock()
+
+
+def get_run_archive():
+    """The process-wide run archive."""
+    global _shared_archive
+    with _shared_lock:
+        if _shared_archive is None: _shared_archive = RunArchive()
+        return _shared_archive
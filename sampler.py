@@ -0,0 +1,162 @@
+import random
+import threading
+from collections import deque
+
+WEIGHTS = {
+    "uniform": lambda s: 1.0,
+    "plays": lambda s: float(s.plays or 0),
+    "entries": lambda s: float(s.entries or 0),
+}
+REPEAT_WINDOW = 50
+MAX_REJECTIONS = 32
+
+
+class AliasTable:
+    """Vose's alias method: O(n) to build, O(1) per weighted draw."""
+    __slots__ = ("prob", "alias", "total")
+
+    def __init__(self, weights):
+        n = len(weights)
+        self.total = total = float(sum(weights))
+        self.prob, self.alias = [1.0] * n, list(range(n))
+        if not n or total <= 0: return
+        scaled = [w * n / total for w in weights]
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            s, l = small.pop(), large.pop()
+            self.prob[s], self.alias[s] = scaled[s], l
+            scaled[l] -= 1.0 - scaled[s]
+            (small if scaled[l] < 1.0 else large).append(l)
+        for i in small + large: self.prob[i] = 1.0  # leftovers are 1 up to float error
+
+    def __len__(self):
+        return len(self.prob)
+
+    def draw(self, rng=random):
+        i = int(rng.random() * len(self.prob))
+        return i if rng.random() < self.prob[i] else self.alias[i]
+
+
+class _Group:
+    """Some scenarios and their alias table."""
+    __slots__ = ("scenarios", "table")
+
+    def __init__(self, scenarios, weight):
+        self.scenarios = scenarios
+        self.table = AliasTable([weight(s) for s in scenarios])
+
+
+class ScenarioSampler:
+    """
+    Weighted random scenarios from a source with .version and .scenarios() (the scenario catalog or
+    a rival profile), with optional aim type, author and entry-count filters. Scenarios are grouped
+    by aim type with one alias table each, so switching aim type filters only rebuilds the small
+    table that picks a group; other filters build one table over the matching scenarios, kept until
+    the source changes. Tables are rebuilt when the source's version changes. The last
+    `repeat_window` scenarios served are not served again while there is anything else to draw.
+    """
+
+    def __init__(self, source, weight="uniform", repeat_window=REPEAT_WINDOW, rng=None):
+        self.source = source
+        self.weight = WEIGHTS[weight]
+        self.rng = rng or random.Random()
+        self._lock = threading.Lock()
+        self._version = None
+        self._groups = {}  # lowercased aim type -> _Group
+        self._filtered = {}  # filters -> _Group of the scenarios matching them
+        self._by_author = None  # lowercased author -> scenarios, built on the first author filter
+        self._filters = (None, None, None, None)
+        self._groups_in_use = []  # the _Groups draws come from
+        self._group_table = AliasTable([])
+        self._recent = deque(maxlen=repeat_window)
+        self._recent_ids = set()
+        self._siblings = {}
+
+    def set_filters(self, aim_types=None, authors=None, min_entries=None, max_entries=None):
+        """Restricts draws to these aim types / authors (any of) and entry-count range. None means no restriction."""
+        with self._lock:
+            self._filters = (frozenset(a.lower() for a in aim_types) if aim_types else None,
+                             frozenset(a.lower() for a in authors) if authors else None, min_entries, max_entries)
+            self._select()
+
+    def over(self, source):
+        """The sampler over another source that shares this one's weighting, filters and no-repeat window."""
+        with self._lock:
+            other = self._siblings.get(source)
+            if other is None or other._filters != self._filters:
+                other = self._siblings[source] = ScenarioSampler(source, rng=self.rng)
+                other.weight, other._filters = self.weight, self._filters
+                other._lock, other._recent, other._recent_ids = self._lock, self._recent, self._recent_ids
+            return other
+
+    def _rebuild(self):
+        by_aim, version = {}, self.source.version
+        for scenario in self.source.scenarios():
+            if scenario.leaderboardId: by_aim.setdefault((scenario.aimType or "").lower(), []).append(scenario)
+        self._groups = {aim: _Group(scenarios, self.weight) for aim, scenarios in by_aim.items()}
+        self._filtered, self._by_author = {}, None
+        self._version = version
+        self._select()
+
+    def _author_index(self):
+        if self._by_author is None:
+            self._by_author = {}
+            for group in self._groups.values():
+                for s in group.scenarios:
+                    for author in s.authors or ():
+                        if isinstance(author, str): self._by_author.setdefault(author.lower(), []).append(s)
+        return self._by_author
+
+    def _select(self):
+        aim_types, authors, min_entries, max_entries = self._filters
+        groups = [g for aim, g in self._groups.items() if aim_types is None or aim in aim_types]
+        if authors is not None or min_entries is not None or max_entries is not None:
+            group = self._filtered.get(self._filters)
+            if group is None:
+                if authors is None: pool = (s for g in groups for s in g.scenarios)
+                else:
+                    pool = {id(s): s for author in authors for s in self._author_index().get(author, ())}.values()
+                    if aim_types is not None: pool = [s for s in pool if (s.aimType or "").lower() in aim_types]
+                matching = [s for s in pool if (min_entries is None or (s.entries or 0) >= min_entries)
+                            and (max_entries is None or (s.entries or 0) <= max_entries)]
+                group = self._filtered[self._filters] = _Group(matching, self.weight)
+            groups = [group] if group.scenarios else []
+        self._groups_in_use = groups
+        self._group_table = AliasTable([g.table.total for g in groups])
+
+    def __len__(self):
+        with self._lock:
+            if self._version != self.source.version: self._rebuild()
+            return sum(len(g.scenarios) for g in self._groups_in_use)
+
+    def _draw_one(self):
+        group = self._groups_in_use[self._group_table.draw(self.rng)]
+        return group.scenarios[group.table.draw(self.rng)]
+
+    def draw(self, exclude_id=None):
+        """One weighted scenario, or None if nothing matches the filters."""
+        with self._lock:
+            if self._version != self.source.version: self._rebuild()
+            if not self._groups_in_use or self._group_table.total <= 0: return None
+            scenario = None
+            for _ in range(MAX_REJECTIONS):
+                scenario = self._draw_one()
+                if scenario.leaderboardId != exclude_id and scenario.leaderboardId not in self._recent_ids: break
+            self._remember(scenario.leaderboardId)
+            return scenario
+
+    def sample(self, count):
+        """Up to count distinct weighted scenarios, all recorded as served."""
+        picked = {}
+        for _ in range(count * 4):
+            if len(picked) >= count: break
+            scenario = self.draw()
+            if scenario is None: break
+            picked.setdefault(scenario.leaderboardId, scenario)
+        return list(picked.values())
+
+    def _remember(self, leaderboard_id):
+        if len(self._recent) == self._recent.maxlen: self._recent_ids.discard(self._recent[0])
+        self._recent.append(leaderboard_id)
+        self._recent_ids.add(leaderboard_id)
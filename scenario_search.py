@@ -0,0 +1,172 @@
+import json
+import os
+import re
+import struct
+from array import array
+
+_FILTER = re.compile(r"^(aim|author|entries|plays)(:|<=|>=|<|>|=)(.+)$", re.IGNORECASE)
+_SUFFIXES = {"k": 1_000, "m": 1_000_000}
+
+
+def _number(text):
+    text = text.strip().lower()
+    scale = _SUFFIXES.get(text[-1:], 1)
+    return float(text[:-1] if scale != 1 else text) * scale
+
+
+def parse_query(text):
+    """
+    Splits a search box string into free text and filters, e.g.
+    "close long aim:tracking entries<5k" -> ("close long", {"aim_type": "tracking", "max_entries": 4999}).
+    Supported: aim:<type>, author:<name>, entries</<=/>/>=/=N and plays>/>=N, with k/m suffixes.
+    """
+    words, filters = [], {}
+    for token in text.split():
+        match = _FILTER.match(token)
+        if not match:
+            words.append(token); continue
+        field, op, value = match.group(1).lower(), match.group(2), match.group(3)
+        try:
+            if field == "aim": filters["aim_type"] = value
+            elif field == "author": filters["author"] = value
+            else:
+                number = _number(value)
+                low, high = ("min_" + field, "max_" + field)
+                if op in ("<", "<="): filters[high] = number - (op == "<")
+                elif op in (">", ">="): filters[low] = number + (op == ">")
+                elif op in ("=", ":"): filters[low] = filters[high] = number
+        except ValueError:
+            words.append(token)
+    return " ".join(words), filters
+
+
+_INDEX_HEADER = struct.Struct("<4sI")  # magic, JSON header bytes
+_INDEX_MAGIC = b"KSI1"
+
+
+def _trigrams(text):
+    padded = f" {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class ScenarioSearchIndex:
+    """
+    Trigram inverted index over scenario names, authors, aim types and descriptions. Documents are
+    numbered in descending plays order, so walking a posting list visits the most played scenarios
+    first and a query can stop as soon as it has `limit` results. A term's rarest trigram gives the
+    candidates; each candidate is confirmed with a substring check. Building the posting lists is
+    the slow part, so they can be saved and loaded back for the same scenarios (see save and load).
+    """
+
+    def __init__(self, scenarios, postings=None):
+        self.scenarios = sorted(scenarios, key=lambda s: -(s.plays or 0))
+        self._names, self._texts, self._aim_types, self._authors = [], [], [], []
+        self._postings = {} if postings is None else postings
+        build = postings is None
+        for doc, s in enumerate(self.scenarios):
+            name = (s.scenarioName or "").lower()
+            authors = " ".join(a for a in (s.authors or []) if isinstance(a, str)).lower()
+            aim_type = (s.aimType or "").lower()
+            # Padded, with the fields space-separated, so word starts and ends are trigrams too.
+            text = f" {name} \n {authors} \n {aim_type} \n {(s.description or '').lower()} "
+            self._names.append(name); self._texts.append(text)
+            self._aim_types.append(aim_type); self._authors.append(authors)
+            if not build: continue
+            postings = self._postings
+            for gram in {text[i:i + 3] for i in range(len(text) - 2)}:
+                posting = postings.get(gram)
+                if posting is None: postings[gram] = posting = array('I')
+                posting.append(doc)
+
+    def __len__(self):
+        return len(self.scenarios)
+
+    def save(self, path, key):
+        """Writes the posting lists to path, tagged with key (JSON) to tell which scenarios they index."""
+        grams = list(self._postings)
+        lengths, docs = array('I', [len(self._postings[gram]) for gram in grams]), array('I')
+        for gram in grams: docs.extend(self._postings[gram])
+        header = json.dumps({"key": key, "docs": len(self.scenarios), "grams": grams}).encode('utf-8')
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(_INDEX_HEADER.pack(_INDEX_MAGIC, len(header))); f.write(header)
+            f.write(lengths.tobytes()); f.write(docs.tobytes())
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, scenarios, key):
+        """The index saved at path if it was saved with key for as many scenarios, else None."""
+        try:
+            with open(path, 'rb') as f:
+                magic, header_size = _INDEX_HEADER.unpack(f.read(_INDEX_HEADER.size))
+                if magic != _INDEX_MAGIC: return None
+                header = json.loads(f.read(header_size))
+                if header["key"] != key or header["docs"] != len(scenarios): return None
+                grams, lengths, docs = header["grams"], array('I'), array('I')
+                lengths.frombytes(f.read(len(grams) * lengths.itemsize))
+                docs.frombytes(f.read())
+        except (OSError, ValueError, KeyError, TypeError, struct.error):
+            return None
+        if len(lengths) != len(grams) or len(docs) != sum(lengths): return None
+        postings, offset = {}, 0
+        for gram, length in zip(grams, lengths):
+            postings[gram] = docs[offset:offset + length]; offset += length
+        return cls(scenarios, postings)
+
+    def _matches_filters(self, doc, aim_type, author, min_entries, max_entries, min_plays, max_plays):
+        s = self.scenarios[doc]
+        if aim_type is not None and self._aim_types[doc] != aim_type: return False
+        if author is not None and author not in self._authors[doc]: return False
+        entries, plays = s.entries or 0, s.plays or 0
+        if min_entries is not None and entries < min_entries: return False
+        if max_entries is not None and entries > max_entries: return False
+        if min_plays is not None and plays < min_plays: return False
+        if max_plays is not None and plays > max_plays: return False
+        return True
+
+    def _candidates(self, terms):
+        """Doc ids that might contain every term, from the rarest trigram among them (all docs if none apply)."""
+        best = None
+        for term in terms:
+            for i in range(len(term) - 2):
+                posting = self._postings.get(term[i:i + 3], ())
+                if best is None or len(posting) < len(best): best = posting
+        return range(len(self.scenarios)) if best is None else best
+
+    def search(self, query="", limit=20, aim_type=None, author=None, min_entries=None, max_entries=None,
+               min_plays=None, max_plays=None, fuzzy=True):
+        """
+        Scenarios containing every word of query, most played first, with scenarios whose name
+        matches ahead of ones matching only on author, aim type or description. With no exact match
+        and fuzzy set, falls back to the scenarios sharing the most trigrams with the query.
+        """
+        terms = query.lower().split()
+        filters = (aim_type.lower() if aim_type else None, author.lower() if author else None,
+                   min_entries, max_entries, min_plays, max_plays)
+        by_name, by_text = [], []
+        texts, names, has_filters = self._texts, self._names, any(f is not None for f in filters)
+        for doc in self._candidates(terms):
+            text = texts[doc]
+            if not all(term in text for term in terms): continue
+            if has_filters and not self._matches_filters(doc, *filters): continue
+            name = names[doc]
+            (by_name if all(term in name for term in terms) else by_text).append(doc)
+            if len(by_name) >= limit: break
+            if len(by_name) + len(by_text) >= limit * 4: break  # enough to fill the page after name hits
+        docs = (by_name + by_text)[:limit]
+        if not docs and fuzzy and terms: docs = self._fuzzy(terms, limit, filters)
+        return [self.scenarios[doc] for doc in docs]
+
+    def _fuzzy(self, terms, limit, filters, max_candidates=2_000):
+        """Typo-tolerant fallback: candidates from the query's rarest trigrams, ranked by how many of its trigrams they share."""
+        grams = sorted(set().union(*(_trigrams(term) for term in terms)), key=lambda g: len(self._postings.get(g, ())))
+        candidates = set()
+        for gram in grams:
+            posting = self._postings.get(gram, ())
+            if candidates and len(candidates) + len(posting) > max_candidates: break
+            candidates.update(posting[:max_candidates])  # the most played of a common trigram
+        threshold = max(1, len(grams) // 3)
+        scored = ((sum(gram in self._texts[doc] for gram in grams), doc) for doc in candidates)
+        # Ties keep the most played first, since doc ids are in plays order.
+        ranked = sorted((item for item in scored if item[0] >= threshold), key=lambda item: (-item[0], item[1]))
+        return [doc for _, doc in ranked if self._matches_filters(doc, *filters)][:limit]
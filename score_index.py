@@ -0,0 +1,64 @@
+import sqlite3
+import threading
+import time
+from storage import cache_path
+
+DEFAULT_TTL = 6 * 60 * 60
+
+
+class ScoreIndex:
+    """
+    On-disk (leaderboardId, username) -> rank/score index, filled from every leaderboard page
+    the client downloads. A leaderboard that was scanned to the end within the TTL also answers
+    "no score" lookups without touching the network.
+    """
+
+    def __init__(self, path=None, ttl=DEFAULT_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path or cache_path("scores.db"), check_same_thread=False)
+        with self._lock, self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute("""CREATE TABLE IF NOT EXISTS scores (
+                leaderboard_id INTEGER, username TEXT, rank INTEGER, score REAL, updated REAL,
+                PRIMARY KEY (leaderboard_id, username)) WITHOUT ROWID""")
+            self._db.execute("CREATE TABLE IF NOT EXISTS scans (leaderboard_id INTEGER PRIMARY KEY, completed REAL)")
+        self.prune()
+
+    def record_page(self, leaderboard_id, rows):
+        """Stores (username, rank, score) rows from one downloaded leaderboard page."""
+        now = time.time()
+        params = [(leaderboard_id, username.lower(), rank, score, now) for username, rank, score in rows if username]
+        if not params: return
+        with self._lock, self._db:
+            self._db.executemany("INSERT OR REPLACE INTO scores VALUES (?, ?, ?, ?, ?)", params)
+
+    def mark_scanned(self, leaderboard_id):
+        """Records that every page of this leaderboard has just been downloaded."""
+        with self._lock, self._db:
+            self._db.execute("INSERT OR REPLACE INTO scans VALUES (?, ?)", (leaderboard_id, time.time()))
+
+    def lookup(self, leaderboard_id, username):
+        """
+        Returns (found, score_obj). found is False when the index can't answer and the
+        leaderboard has to be scanned; score_obj is None when the user has no score.
+        """
+        fresh_after = time.time() - self.ttl
+        with self._lock:
+            row = self._db.execute("SELECT rank, score FROM scores WHERE leaderboard_id = ? AND username = ? AND updated >= ?",
+                                   (leaderboard_id, username.lower(), fresh_after)).fetchone()
+            if row: return True, {"rank": row[0], "score": row[1]}
+            scanned = self._db.execute("SELECT 1 FROM scans WHERE leaderboard_id = ? AND completed >= ?",
+                                       (leaderboard_id, fresh_after)).fetchone()
+        return (True, None) if scanned else (False, None)
+
+    def prune(self):
+        """Drops expired rows so the file doesn't grow without bound."""
+        fresh_after = time.time() - self.ttl
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM scores WHERE updated < ?", (fresh_after,))
+            self._db.execute("DELETE FROM scans WHERE completed < ?", (fresh_after,))
+
+    def close(self):
+        with self._lock: self._db.close()
@@ -0,0 +1,92 @@
+import hashlib
+import json
+import os
+from stats_parser import parse_stats_filename, read_score, read_scores
+from storage import cache_path
+
+# New files from this many on are read across a process pool (a first index of a long history);
+# below it, starting the pool costs more than it saves.
+POOL_THRESHOLD = 2_000
+
+
+class StatsIndex:
+    """
+    Index of the runs in the KovaaK's stats folder, one entry per CSV. Entries are cached on disk
+    keyed by file mtime, so a refresh only reads files that are new or changed since the last one.
+    """
+
+    def __init__(self, stats_folder, cache_file=None):
+        self.stats_folder = stats_folder
+        folder_key = hashlib.sha1(os.path.abspath(stats_folder).lower().encode()).hexdigest()[:12]
+        self.cache_file = cache_file or cache_path(f"stats-{folder_key}.json")
+        self._entries = {}  # filename -> [mtime, scenario name, timestamp, score]
+        self._pbs = {}  # lowercased scenario name -> best score (None if no score could be read)
+        self.version = 0  # bumped whenever the indexed runs change
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as f:
+                self._entries = json.load(f)
+        except (OSError, ValueError):
+            self._entries = {}
+        self._rebuild()
+
+    def _save(self):
+        tmp_path = self.cache_file + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._entries, f, separators=(',', ':'))
+        os.replace(tmp_path, self.cache_file)
+
+    def _rebuild(self):
+        pbs = {}
+        for _, name, _, score in self._entries.values():
+            key = name.lower()
+            best = pbs.get(key)
+            if best is None or (score is not None and score > best): pbs[key] = score
+        self._pbs = pbs
+        self.version += 1
+
+    def refresh(self):
+        """Rescans the folder, reading only new or modified CSVs. Returns how many files were read."""
+        seen, new = {}, []  # new: (filename, path, mtime, (scenario name, timestamp))
+        try:
+            with os.scandir(self.stats_folder) as it:
+                for entry in it:
+                    if not entry.name.lower().endswith('.csv'): continue
+                    mtime = entry.stat().st_mtime
+                    cached = self._entries.get(entry.name)
+                    if cached and cached[0] == mtime:
+                        seen[entry.name] = cached; continue
+                    info = parse_stats_filename(entry.name)
+                    if info: new.append((entry.name, entry.path, mtime, info))
+        except OSError as e:
+            print(f"   Could not scan stats folder: {e}")
+            return 0
+        paths = [path for _, path, _, _ in new]
+        scores = read_scores(paths) if len(paths) >= POOL_THRESHOLD else map(read_score, paths)
+        for (name, _, mtime, info), score in zip(new, scores): seen[name] = [mtime, info[0], info[1], score]
+        parsed = len(new)
+        changed = parsed or len(seen) != len(self._entries)
+        self._entries = seen
+        if changed:
+            self._rebuild()
+            try:
+                self._save()
+            except OSError as e:
+                print(f"   Could not save stats index: {e}")
+        return parsed
+
+    def played(self):
+        """Set of lowercased scenario names that have at least one run in the folder."""
+        return set(self._pbs)
+
+    def local_pb(self, scenario_name):
+        """Best score in the stats folder for this scenario, or None if there isn't one."""
+        return self._pbs.get(scenario_name.lower())
+
+    def runs(self, ordered=True):
+        """(scenario name, timestamp, score) for every indexed run, oldest first unless ordered is False."""
+        runs = [(name, timestamp, score) for _, name, timestamp, score in self._entries.values()]
+        if ordered: runs.sort(key=lambda run: run[1])
+        return runs
@@ -0,0 +1,103 @@
+import mmap
+import os
+import re
+from datetime import datetime
+from models import RunStats
+
+# e.g. "1wall 6targets TE - Challenge - 2024.05.14-18.35.22 Stats.csv"
+STATS_FILENAME = re.compile(r"^(?P<name>.+) - (?P<mode>[^-]+?) - "
+                            r"(?P<stamp>(\d{4})\.(\d{2})\.(\d{2})-(\d{2})\.(\d{2})\.(\d{2})) Stats\.csv$", re.IGNORECASE)
+WEAPON_HEADER = b"\nWeapon,Shots,Hits,"
+
+
+def parse_stats_filename(filename):
+    """Returns (scenario_name, timestamp) from a stats CSV filename, or None if it doesn't match."""
+    match = STATS_FILENAME.match(filename)
+    if not match: return None
+    try:
+        timestamp = datetime(*map(int, match.groups()[3:])).timestamp()
+    except ValueError:
+        return None
+    return match["name"], timestamp
+
+
+def _number(value, cast=float):
+    try:
+        return cast(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _accuracy(data, end):
+    """Hits / shots from the first row under the weapon table header, which precedes the summary."""
+    header = data.rfind(WEAPON_HEADER, 0, end)
+    if header < 0: return None
+    row_start = data.find(b"\n", header + 1) + 1
+    row_end = data.find(b"\n", row_start)
+    columns = data[row_start:row_end if row_end >= 0 else end].split(b",")
+    shots, hits = (_number(c) for c in columns[1:3]) if len(columns) >= 3 else (None, None)
+    return hits / shots if shots and hits is not None else None
+
+
+def parse_stats_file(csv_path):
+    """
+    Parses a KovaaK's stats CSV into a RunStats record. The file is memory-mapped and only the summary
+    block at its end (from the last "Kills:," line) and the weapon row above it are decoded, so cost
+    doesn't grow with the number of kill rows. Returns None if the file has no score.
+    """
+    with open(csv_path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0: return None
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            summary_start = data.rfind(b"\nKills:,")
+            if summary_start < 0: summary_start = data.rfind(b"\nScore:,")
+            if summary_start < 0: return None
+            summary = data[summary_start:].decode('utf-8', errors='ignore')
+            accuracy = _accuracy(data, summary_start)
+    fields = {}
+    for line in summary.splitlines():
+        key, separator, rest = line.partition(":,")
+        if separator: fields[key] = rest.split(",", 1)[0].strip()
+    score = _number(fields.get("Score"))
+    if score is None: return None
+    info = parse_stats_filename(os.path.basename(csv_path))
+    return RunStats(
+        fields.get("Scenario") or (info[0] if info else None), score, _number(fields.get("Kills"), int),
+        accuracy, _number(fields.get("Avg TTK")), _number(fields.get("Horiz Sens")), fields.get("Sens Scale"),
+        _number(fields.get("FOV")), info[1] if info else os.path.getmtime(csv_path),
+    )
+
+
+def read_score(csv_path):
+    """Reads the score of a stats CSV without modifying the file; None if it has none or can't be read."""
+    try:
+        run = parse_stats_file(csv_path)
+    except (OSError, ValueError):
+        return None
+    return run.score if run else None
+
+
+def _parse_or_none(csv_path):
+    try:
+        return parse_stats_file(csv_path)
+    except (OSError, ValueError):
+        return None
+
+
+def _map(func, paths, workers, chunksize):
+    """func over paths, across a process pool unless there is only one worker to use."""
+    if (workers or os.cpu_count() or 1) == 1: return list(map(func, paths))
+    from concurrent.futures import ProcessPoolExecutor  # pulls in multiprocessing, so only when needed
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(func, paths, chunksize=chunksize))
+
+
+def read_scores(paths, workers=None, chunksize=256):
+    """read_score for every path, in order, across a process pool: for importing a large history at once."""
+    return _map(read_score, paths, workers, chunksize)
+
+
+def parse_folder(stats_folder, workers=None, chunksize=256):
+    """Parses every stats CSV in a folder across a process pool, for bulk history import."""
+    with os.scandir(stats_folder) as it:
+        paths = [entry.path for entry in it if entry.name.lower().endswith('.csv')]
+    return [run for run in _map(_parse_or_none, paths, workers, chunksize) if run]
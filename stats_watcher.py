@@ -0,0 +1,260 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import time
+
+POLL_INTERVAL = 0.05
+# Even with an unchanged directory mtime, rescan this often in case the filesystem's mtime is coarse.
+FULL_RESCAN_INTERVAL = 5.0
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+class FolderSnapshot(frozenset):
+    """A stats folder's filenames, and its mtime (ns) from just before they were listed."""
+    mtime_ns = None
+
+
+def snapshot_folder(stats_folder):
+    """The folder's filenames to pass a watcher as initial_files. The mtime lets it skip re-listing an unchanged folder."""
+    try:
+        mtime = os.stat(stats_folder).st_mtime_ns  # before listing: a file added in between still counts as a change
+    except OSError:
+        mtime = None
+    snapshot = FolderSnapshot(os.listdir(stats_folder))
+    snapshot.mtime_ns = mtime
+    return snapshot
+
+
+def _folder_mtime(stats_folder):
+    try:
+        return os.stat(stats_folder).st_mtime_ns
+    except OSError:
+        return None
+
+
+def _changed_since(stats_folder, initial_files):
+    """Whether the folder may have gained files since initial_files was listed (always, without a FolderSnapshot)."""
+    mtime = getattr(initial_files, "mtime_ns", None)
+    return mtime is None or _folder_mtime(stats_folder) != mtime
+
+
+def _new_csvs(stats_folder, known_files):
+    with os.scandir(stats_folder) as it:
+        return [entry for entry in it if entry.name.lower().endswith('.csv') and entry.name not in known_files]
+
+
+def _wait_until_written(path, stop_event, settle=0.02, timeout=10.0):
+    """Waits until the file's size has stopped changing, so a half-written CSV is never handed off."""
+    deadline, last_size = time.monotonic() + timeout, -1
+    while time.monotonic() < deadline and not stop_event.is_set():
+        try:
+            size = os.stat(path).st_size
+        except OSError:
+            return False
+        if size and size == last_size: return True
+        last_size = size
+        stop_event.wait(settle)
+    return not stop_event.is_set()
+
+
+def poll_for_new_csv(stats_folder, initial_files, stop_event, timeout=120.0):
+    """
+    Portable watcher: stats the directory every POLL_INTERVAL and only lists it when its mtime
+    changes, instead of a full listdir on every poll. With a FolderSnapshot as initial_files the
+    folder isn't listed again until it changes.
+    """
+    deadline = time.monotonic() + timeout
+    last_mtime = getattr(initial_files, "mtime_ns", None)
+    last_scan = time.monotonic() if last_mtime is not None else 0.0
+    while time.monotonic() < deadline and not stop_event.is_set():
+        try:
+            mtime = os.stat(stats_folder).st_mtime_ns
+        except OSError:
+            return None
+        now = time.monotonic()
+        if mtime != last_mtime or now - last_scan >= FULL_RESCAN_INTERVAL:
+            last_mtime, last_scan = mtime, now
+            for entry in _new_csvs(stats_folder, initial_files):
+                if _wait_until_written(entry.path, stop_event): return entry.path
+        stop_event.wait(POLL_INTERVAL)
+    return None
+
+
+def _load_inotify():
+    if not sys.platform.startswith("linux"): return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        return libc
+    except (OSError, AttributeError):
+        return None
+
+
+_libc = _load_inotify()
+
+
+def inotify_for_new_csv(stats_folder, initial_files, stop_event, timeout=120.0):
+    """
+    Linux watcher: blocks on inotify close-write/moved-to events, so a CSV is reported as soon as
+    KovaaK's closes it. Falls back to polling if inotify can't be set up.
+    """
+    fd = _libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC) if _libc else -1
+    if fd < 0: return poll_for_new_csv(stats_folder, initial_files, stop_event, timeout)
+    try:
+        if _libc.inotify_add_watch(fd, os.fsencode(stats_folder), IN_CLOSE_WRITE | IN_MOVED_TO) < 0:
+            return poll_for_new_csv(stats_folder, initial_files, stop_event, timeout)
+        # Catch anything written between the caller's snapshot and the watch being added.
+        if _changed_since(stats_folder, initial_files):
+            for entry in _new_csvs(stats_folder, initial_files):
+                if _wait_until_written(entry.path, stop_event): return entry.path
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline and not stop_event.is_set():
+            ready, _, _ = select.select([fd], [], [], POLL_INTERVAL)
+            if not ready: continue
+            try:
+                buffer = os.read(fd, 64 * 1024)
+            except BlockingIOError:
+                continue
+            offset = 0
+            while offset < len(buffer):
+                _, _, _, name_length = _EVENT_HEADER.unpack_from(buffer, offset)
+                offset += _EVENT_HEADER.size
+                name = os.fsdecode(buffer[offset:offset + name_length].rstrip(b"\0"))
+                offset += name_length
+                if name.lower().endswith('.csv') and name not in initial_files:
+                    return os.path.join(stats_folder, name)
+        return None
+    finally:
+        os.close(fd)
+
+
+FILE_LIST_DIRECTORY = 0x0001
+FILE_SHARE_ALL = 0x0001 | 0x0002 | 0x0004
+OPEN_EXISTING = 3
+FILE_FLAG_BACKUP_SEMANTICS = 0x02000000
+FILE_FLAG_OVERLAPPED = 0x40000000
+FILE_NOTIFY_CHANGE_FILE_NAME = 0x0001
+FILE_NOTIFY_CHANGE_SIZE = 0x0008
+FILE_NOTIFY_CHANGE_LAST_WRITE = 0x0010
+FILE_ACTION_ADDED, FILE_ACTION_MODIFIED, FILE_ACTION_RENAMED_NEW_NAME = 1, 3, 5
+WAIT_OBJECT_0 = 0
+_NOTIFY_HEADER = struct.Struct("III")  # NextEntryOffset, Action, FileNameLength; the UTF-16 name follows
+
+
+def _load_kernel32():
+    """kernel32 with the directory-change calls typed, and the OVERLAPPED struct; None off Windows."""
+    if sys.platform != "win32": return None
+    try:
+        from ctypes import wintypes
+        kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
+
+        class OVERLAPPED(ctypes.Structure):
+            _fields_ = [("Internal", ctypes.c_void_p), ("InternalHigh", ctypes.c_void_p), ("Offset", wintypes.DWORD),
+                        ("OffsetHigh", wintypes.DWORD), ("hEvent", wintypes.HANDLE)]
+
+        overlapped_p, dword_p = ctypes.POINTER(OVERLAPPED), ctypes.POINTER(wintypes.DWORD)
+        for name, restype, argtypes in (
+                ("CreateFileW", wintypes.HANDLE, [wintypes.LPCWSTR, wintypes.DWORD, wintypes.DWORD, ctypes.c_void_p,
+                                                  wintypes.DWORD, wintypes.DWORD, wintypes.HANDLE]),
+                ("ReadDirectoryChangesW", wintypes.BOOL, [wintypes.HANDLE, ctypes.c_void_p, wintypes.DWORD, wintypes.BOOL,
+                                                          wintypes.DWORD, dword_p, overlapped_p, ctypes.c_void_p]),
+                ("CreateEventW", wintypes.HANDLE, [ctypes.c_void_p, wintypes.BOOL, wintypes.BOOL, wintypes.LPCWSTR]),
+                ("ResetEvent", wintypes.BOOL, [wintypes.HANDLE]),
+                ("WaitForSingleObject", wintypes.DWORD, [wintypes.HANDLE, wintypes.DWORD]),
+                ("GetOverlappedResult", wintypes.BOOL, [wintypes.HANDLE, overlapped_p, dword_p, wintypes.BOOL]),
+                ("CancelIoEx", wintypes.BOOL, [wintypes.HANDLE, overlapped_p]),
+                ("CloseHandle", wintypes.BOOL, [wintypes.HANDLE])):
+            function = getattr(kernel32, name)
+            function.restype, function.argtypes = restype, argtypes
+        return kernel32, OVERLAPPED
+    except (OSError, AttributeError, ImportError):
+        return None
+
+
+_kernel32 = _load_kernel32()
+
+
+def _notify_names(buffer):
+    """(action, filename) of each FILE_NOTIFY_INFORMATION record in a ReadDirectoryChangesW buffer."""
+    offset = 0
+    while True:
+        next_offset, action, length = _NOTIFY_HEADER.unpack_from(buffer, offset)
+        start = offset + _NOTIFY_HEADER.size
+        yield action, buffer[start:start + length].decode("utf-16-le", errors="replace")
+        if not next_offset: return
+        offset += next_offset
+
+
+def windows_for_new_csv(stats_folder, initial_files, stop_event, timeout=120.0):
+    """
+    Windows watcher: an overlapped ReadDirectoryChangesW on the folder, waited on POLL_INTERVAL at a
+    time so stop_event is still honoured. Windows reports a file when it is created, not when it is
+    closed, so a new CSV is handed off once its size settles. Falls back to polling if the watch
+    can't be set up.
+    """
+    kernel32, OVERLAPPED = _kernel32
+    handle = kernel32.CreateFileW(stats_folder, FILE_LIST_DIRECTORY, FILE_SHARE_ALL, None, OPEN_EXISTING,
+                                  FILE_FLAG_BACKUP_SEMANTICS | FILE_FLAG_OVERLAPPED, None)
+    if handle in (None, ctypes.c_void_p(-1).value): return poll_for_new_csv(stats_folder, initial_files, stop_event, timeout)
+    event = kernel32.CreateEventW(None, True, False, None)
+    buffer, overlapped, received = ctypes.create_string_buffer(64 * 1024), OVERLAPPED(), ctypes.c_ulong()
+    overlapped.hEvent = event
+    armed = False
+
+    def arm():
+        kernel32.ResetEvent(event)
+        return bool(kernel32.ReadDirectoryChangesW(
+            handle, buffer, len(buffer), False,
+            FILE_NOTIFY_CHANGE_FILE_NAME | FILE_NOTIFY_CHANGE_SIZE | FILE_NOTIFY_CHANGE_LAST_WRITE,
+            None, ctypes.byref(overlapped), None))
+
+    try:
+        armed = event is not None and arm()
+        if not armed: return poll_for_new_csv(stats_folder, initial_files, stop_event, timeout)
+        # Catch anything written between the caller's snapshot and the watch being armed.
+        if _changed_since(stats_folder, initial_files):
+            for entry in _new_csvs(stats_folder, initial_files):
+                if _wait_until_written(entry.path, stop_event): return entry.path
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline and not stop_event.is_set():
+            if kernel32.WaitForSingleObject(event, int(POLL_INTERVAL * 1000)) != WAIT_OBJECT_0: continue
+            armed = False
+            if not kernel32.GetOverlappedResult(handle, ctypes.byref(overlapped), ctypes.byref(received), False):
+                return poll_for_new_csv(stats_folder, initial_files, stop_event, max(0.0, deadline - time.monotonic()))
+            if received.value:
+                names = [name for action, name in _notify_names(buffer.raw[:received.value])
+                         if action in (FILE_ACTION_ADDED, FILE_ACTION_MODIFIED, FILE_ACTION_RENAMED_NEW_NAME)]
+            else:  # the buffer overflowed: the changes are lost, so list the folder
+                names = [entry.name for entry in _new_csvs(stats_folder, initial_files)]
+            armed = arm()
+            for name in dict.fromkeys(names):
+                if not name.lower().endswith('.csv') or name in initial_files: continue
+                path = os.path.join(stats_folder, name)
+                if _wait_until_written(path, stop_event): return path
+            if not armed: return poll_for_new_csv(stats_folder, initial_files, stop_event, max(0.0, deadline - time.monotonic()))
+        return None
+    finally:
+        if armed:
+            # The pending read writes into buffer and overlapped; wait for it to be cancelled before they go.
+            kernel32.CancelIoEx(handle, ctypes.byref(overlapped))
+            kernel32.GetOverlappedResult(handle, ctypes.byref(overlapped), ctypes.byref(received), True)
+        if event is not None: kernel32.CloseHandle(event)
+        kernel32.CloseHandle(handle)
+
+
+def wait_for_new_csv(stats_folder, initial_files, stop_event, timeout=120.0):
+    """
+    Returns the path of the first new, fully written CSV in the folder, or None on stop/timeout.
+    Pass a FolderSnapshot (snapshot_folder) as initial_files to spare the watcher a listing.
+    """
+    watcher = inotify_for_new_csv if _libc else windows_for_new_csv if _kernel32 else poll_for_new_csv
+    return watcher(stats_folder, initial_files, stop_event, timeout)
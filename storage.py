@@ -0,0 +1,15 @@
+import os
+
+
+def cache_dir():
+    """Folder for the app's on-disk caches. Never inside the KovaaK's install or stats folder."""
+    base = os.environ.get("KOVAAKS_CACHE_DIR")
+    if not base:
+        root = os.environ.get("LOCALAPPDATA") or os.path.join(os.path.expanduser("~"), ".cache")
+        base = os.path.join(root, "KovaaksChallenge")
+    os.makedirs(base, exist_ok=True)
+    return base
+
+
+def cache_path(name):
+    return os.path.join(cache_dir(), name)
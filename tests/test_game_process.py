@@ -0,0 +1,147 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+from game_process import ProcessMonitor
+
+
+class FakeProcessTable:
+    """Process table for ProcessMonitor: {pid: name}, editable from a test."""
+
+    def __init__(self, processes=None):
+        self.processes_by_pid = dict(processes or {})
+        self.walks = 0
+
+    def processes(self):
+        self.walks += 1
+        return list(self.processes_by_pid.items())
+
+    def name(self, pid):
+        return self.processes_by_pid.get(pid)
+
+
+def _later(delay, func):
+    timer = threading.Timer(delay, func)
+    timer.start()
+    return timer
+
+
+class IsRunningTest(unittest.TestCase):
+    def test_walks_once_then_checks_the_cached_pid(self):
+        table = FakeProcessTable({1: "explorer.exe", 4242: "FPSAimTrainer.exe"})
+        monitor = ProcessMonitor(process_table=table)
+        for _ in range(5): self.assertTrue(monitor.is_running())
+        self.assertEqual(monitor.pid, 4242)
+        self.assertEqual(table.walks, 1)
+
+    def test_walks_again_when_the_pid_is_gone_or_reused(self):
+        table = FakeProcessTable({4242: "FPSAimTrainer.exe"})
+        monitor = ProcessMonitor(process_table=table)
+        self.assertTrue(monitor.is_running())
+        table.processes_by_pid = {4242: "notepad.exe", 5000: "FPSAimTrainer.exe"}
+        self.assertTrue(monitor.is_running())
+        self.assertEqual((monitor.pid, table.walks), (5000, 2))
+        table.processes_by_pid = {}
+        self.assertFalse(monitor.is_running())
+        self.assertIsNone(monitor.pid)
+
+
+class WaitUntilReadyTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.stats_folder = os.path.join(tmp.name, "FPSAimTrainer", "stats")
+        self.log_path = os.path.join(tmp.name, "FPSAimTrainer", "Saved", "Logs", "FPSAimTrainer.log")
+        os.makedirs(self.stats_folder)
+        os.makedirs(os.path.dirname(self.log_path))
+        self.table = FakeProcessTable({1: "explorer.exe"})
+
+    def wait(self, has_window=lambda pid: None, stats_folder=None, timeout=2.0, **kwargs):
+        monitor = ProcessMonitor(process_table=self.table, has_window=has_window)
+        start = time.monotonic()
+        ready = monitor.wait_until_ready(stats_folder, timeout=timeout, settle=0.05, poll=0.01, **kwargs)
+        return ready, time.monotonic() - start
+
+    def start_game(self):
+        self.table.processes_by_pid[4242] = "FPSAimTrainer.exe"
+
+    def write_log(self, age=0.0):
+        with open(self.log_path, 'a') as log: log.write("LogInit: Display\n")
+        mtime = time.time() - age
+        os.utime(self.log_path, (mtime, mtime))
+
+    def test_ready_once_the_process_has_been_up_for_settle(self):
+        self.start_game()
+        ready, elapsed = self.wait()
+        self.assertTrue(ready)
+        self.assertLess(elapsed, 1.0)
+
+    def test_waits_for_the_process_with_spaced_out_walks(self):
+        _later(0.3, self.start_game)
+        ready, elapsed = self.wait(walk_interval=0.1)
+        self.assertTrue(ready)
+        self.assertGreaterEqual(elapsed, 0.3)
+        self.assertLessEqual(self.table.walks, 6)
+
+    def test_visible_window_and_quiet_log_is_ready_after_a_longer_settle(self):
+        self.write_log(age=60)  # the log is there but the game doesn't write to it
+        self.start_game()
+        ready, elapsed = self.wait(has_window=lambda pid: True, stats_folder=self.stats_folder)
+        self.assertTrue(ready)
+        self.assertGreaterEqual(elapsed, 5 * 0.05)
+
+    def test_hidden_window_holds_the_launch_until_timeout(self):
+        self.start_game()
+        ready, elapsed = self.wait(has_window=lambda pid: False, timeout=0.3)
+        self.assertFalse(ready)
+        self.assertGreaterEqual(elapsed, 0.3)
+
+    def test_ready_once_the_log_goes_quiet_after_writing(self):
+        self.write_log(age=60)
+        self.start_game()
+        _later(0.1, lambda: self.write_log(age=1))
+        ready, elapsed = self.wait(stats_folder=self.stats_folder)
+        self.assertTrue(ready)
+        self.assertGreaterEqual(elapsed, 0.1)
+
+    def test_log_still_being_written_is_not_ready(self):
+        self.write_log(age=60)
+        self.start_game()
+        done = threading.Event()
+
+        def keep_writing():
+            while not done.wait(0.01): self.write_log()
+
+        writer = threading.Thread(target=keep_writing)
+        writer.start()
+        try:
+            ready, _ = self.wait(stats_folder=self.stats_folder, timeout=0.3)
+        finally:
+            done.set(); writer.join()
+        self.assertFalse(ready)
+
+    def test_touched_stats_folder_counts_without_a_process(self):
+        touched = time.time() + 10
+        _later(0.1, lambda: os.utime(self.stats_folder, (touched, touched)))
+        ready, elapsed = self.wait(stats_folder=self.stats_folder)
+        self.assertTrue(ready)
+        self.assertLess(elapsed, 1.0)
+
+    def test_times_out_without_a_process(self):
+        ready, elapsed = self.wait(timeout=0.2, walk_interval=0.05)
+        self.assertFalse(ready)
+        self.assertGreaterEqual(elapsed, 0.2)
+        self.assertLessEqual(self.table.walks, 6)
+
+    def test_stop_event_ends_the_wait(self):
+        stop_event = threading.Event()
+        _later(0.1, stop_event.set)
+        ready, elapsed = self.wait(timeout=5.0, stop_event=stop_event)
+        self.assertFalse(ready)
+        self.assertLess(elapsed, 1.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,105 @@
+import json
+import os
+import threading
+import time
+from storage import cache_path
+from tracing import traced
+
+DIFFICULTY_THRESHOLDS = {"Easy": 0.20, "Medium": 0.50, "Hard": 0.80}
+DEFAULT_TTL = 6 * 60 * 60
+
+
+def cutoff_rank(total_entries, percentile):
+    """Worst rank that still counts as beating `percentile` of the leaderboard (1 - rank / total >= percentile)."""
+    return max(1, int(total_entries * (1 - percentile) + 1e-9))  # epsilon absorbs float error in (1 - p)
+
+
+def cutoffs_from_scores(scores, percentiles, total_entries=None):
+    """
+    Cut-off scores for several percentiles in one pass over a full, best-first score snapshot
+    (e.g. a mirrored leaderboard) instead of one page fetch each.
+    """
+    total_entries = total_entries or len(scores)
+    if not scores or not total_entries: return {}
+    return {p: scores[min(cutoff_rank(total_entries, p), len(scores)) - 1] for p in percentiles}
+
+
+class ThresholdCache:
+    """
+    Resolves the score needed to reach each First Try difficulty on a scenario, from the rows at the
+    cut-off ranks, and caches the result on disk with a TTL so grading a run is a local comparison.
+    """
+
+    def __init__(self, client, path=None, ttl=DEFAULT_TTL, per_page=100):
+        self.client = client
+        self.path = path or cache_path("thresholds.json")
+        self.ttl = ttl
+        self.per_page = per_page
+        self._lock = threading.Lock()
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self._entries = json.load(f)  # str(leaderboardId) -> [fetched, entries, {str(percentile): score}]
+        except (OSError, ValueError):
+            self._entries = {}
+
+    def _save(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._entries, f, separators=(',', ':'))
+        os.replace(tmp_path, self.path)
+
+    def _cached(self, scenario, percentiles):
+        entry = self._entries.get(str(scenario.leaderboardId))
+        if not entry or time.time() - entry[0] > self.ttl: return None
+        cutoffs = {p: entry[2].get(str(p)) for p in percentiles}
+        return None if None in cutoffs.values() else cutoffs
+
+    def cutoffs(self, scenario, percentiles=tuple(DIFFICULTY_THRESHOLDS.values()), scores=None):
+        """
+        {percentile: score needed} for the scenario. Each cut-off rank costs at most one page fetch, shared
+        between percentiles that land on the same page; a full `scores` snapshot, or the client's mirror of
+        the leaderboard if it is exact, skips the page fetches.
+        Raises requests.RequestException if a page can't be fetched.
+        """
+        with self._lock:
+            cached = self._cached(scenario, percentiles)
+        if cached: return cached
+        total_entries = scenario.entries or 0
+        if scores is None and getattr(self.client, "mirror", None) is not None:
+            board = self.client.mirror.sync(scenario.leaderboardId)
+            if board is not None and board.exact: scores, total_entries = board.scores, len(board)
+            elif board is not None: total_entries = len(board)  # still the current entry count
+        if scores is not None:
+            cutoffs = cutoffs_from_scores(scores, percentiles, total_entries)
+        else:
+            cutoffs, pages = {}, {}
+            for p in percentiles:
+                if not total_entries: break
+                rank = cutoff_rank(total_entries, p)
+                page_index, row = divmod(rank - 1, self.per_page)
+                if page_index not in pages:
+                    pages[page_index] = next(self.client.scenario_leaderboard(
+                        scenario.leaderboardId, start_page=page_index, per_page=self.per_page, max_page=1,
+                        strict=True, fields=()), None)
+                page = pages[page_index]
+                # The entry count can be ahead of the leaderboard; then the last row there is the cut-off.
+                if page: cutoffs[p] = page.scores[min(row, len(page) - 1)]
+        if len(cutoffs) < len(percentiles): return cutoffs
+        with self._lock:
+            entry = self._entries.setdefault(str(scenario.leaderboardId), [0, 0, {}])
+            entry[0], entry[1] = time.time(), total_entries
+            entry[2].update({str(p): score for p, score in cutoffs.items()})
+            try:
+                self._save()
+            except OSError as e:
+                print(f"   Could not save threshold cache: {e}")
+        return cutoffs
+
+    @traced("score_needed")
+    def cutoff(self, scenario, percentile):
+        """Score needed for one percentile, or None if it couldn't be resolved."""
+        try:
+            return self.cutoffs(scenario, (percentile,)).get(percentile)
+        except Exception as e:
+            print(f"   Could not resolve the score needed on {scenario.scenarioName}: {e}")
+            return None
@@ -0,0 +1,130 @@
+import functools
+import json
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from storage import cache_path
+
+# Off unless KOVAAK_TRACE is set to something other than "", "0" or "false".
+ENABLED = os.environ.get("KOVAAK_TRACE", "").lower() not in ("", "0", "false")
+SAMPLES_PER_SPAN = 2048
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return None
+
+    def set(self, **attrs):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("tracer", "name", "attrs", "start")
+
+    def __init__(self, tracer, name, attrs):
+        self.tracer, self.name, self.attrs = tracer, name, attrs
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.tracer._finish(self, time.perf_counter() - self.start, exc_type)
+        return None
+
+    def set(self, **attrs):
+        """Adds attributes known only once the span has run, e.g. a response's size."""
+        self.attrs.update(attrs)
+
+
+class Tracer:
+    """
+    Records span durations to a JSONL file per session and keeps recent samples per span name for
+    p50/p95 summaries. When disabled, span() hands back a shared no-op object, so it costs one call.
+    """
+
+    def __init__(self, enabled=ENABLED):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._file = None
+        self._samples = defaultdict(lambda: deque(maxlen=SAMPLES_PER_SPAN))
+        self._counts = defaultdict(int)
+        self._bytes = defaultdict(int)
+
+    def span(self, name, **attrs):
+        return _Span(self, name, attrs) if self.enabled else _NULL_SPAN
+
+    def _finish(self, span, seconds, exc_type):
+        record = {"t": round(time.time(), 3), "span": span.name, "ms": round(seconds * 1000, 3),
+                  "thread": threading.current_thread().name, **span.attrs}
+        if exc_type: record["error"] = exc_type.__name__
+        with self._lock:
+            self._samples[span.name].append(seconds)
+            self._counts[span.name] += 1
+            self._bytes[span.name] += span.attrs.get("bytes", 0)
+            if self._file:
+                self._file.write(json.dumps(record, default=str) + "\n")
+
+    def start_session(self, label):
+        """Opens a new JSONL trace file for a challenge session and resets the summary."""
+        if not self.enabled: return None
+        folder = cache_path("traces")
+        os.makedirs(folder, exist_ok=True)
+        path = os.path.join(folder, f"session-{time.strftime('%Y%m%d-%H%M%S')}-{label}.jsonl")
+        with self._lock:
+            if self._file: self._file.close()
+            self._file = open(path, 'a', encoding='utf-8', buffering=64 * 1024)
+            self._samples.clear(); self._counts.clear(); self._bytes.clear()
+        print(f"   Tracing this session to {path}")
+        return path
+
+    def end_session(self):
+        if not self.enabled: return
+        self.print_summary()
+        with self._lock:
+            if self._file: self._file.close(); self._file = None
+
+    def summary(self):
+        """{span name: {"count", "p50_ms", "p95_ms", "bytes"}} over the recent samples."""
+        with self._lock:
+            result = {}
+            for name, samples in self._samples.items():
+                ordered = sorted(samples)
+                result[name] = {"count": self._counts[name], "bytes": self._bytes[name],
+                                "p50_ms": ordered[len(ordered) // 2] * 1000,
+                                "p95_ms": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000}
+            return result
+
+    def format_summary(self):
+        rows = sorted(self.summary().items(), key=lambda item: -item[1]["p50_ms"] * item[1]["count"])
+        return "\n".join(f"   {name:<22} n={s['count']:<6} p50={s['p50_ms']:9.1f}ms p95={s['p95_ms']:9.1f}ms"
+                         + (f" {s['bytes'] / 1024:,.0f} KiB" if s['bytes'] else "") for name, s in rows)
+
+    def print_summary(self):
+        if self.enabled and self._samples: print("⏱️ Phase timings:\n" + self.format_summary())
+
+
+tracer = Tracer()
+span = tracer.span
+
+
+def traced(name):
+    """Decorator form of span(); returns the function untouched when tracing is off."""
+    def decorate(func):
+        if not tracer.enabled: return func
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with tracer.span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
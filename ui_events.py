@@ -0,0 +1,101 @@
+import threading
+import time
+from collections import deque
+from storage import cache_path
+
+FRAME_INTERVAL_MS = 50
+HISTORY_CAPACITY = 500
+
+
+class UIEventQueue:
+    """
+    UI updates posted by worker threads, drained by the Tk main loop once per frame. Within a
+    frame only the latest status text and score label survive; history edits keep their order.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._status = self._score = None
+        self._history = []  # ["add" | "update", text]
+        self._calls = []
+        self.posted = 0
+
+    def status(self, text):
+        with self._lock: self._status = text; self.posted += 1
+
+    def score(self, text):
+        with self._lock: self._score = text; self.posted += 1
+
+    def add_history(self, text):
+        with self._lock: self._history.append(["add", text]); self.posted += 1
+
+    def update_history(self, text):
+        with self._lock:
+            self.posted += 1
+            # An entry added and resolved within the same frame is only drawn once.
+            if self._history: self._history[-1][1] = text
+            else: self._history.append(["update", text])
+
+    def call(self, func):
+        """Runs func on the Tk thread at the next frame."""
+        with self._lock: self._calls.append(func); self.posted += 1
+
+    def drain(self):
+        """(status or None, score or None, history edits, calls) posted since the last drain."""
+        with self._lock:
+            batch = self._status, self._score, self._history, self._calls
+            self._status = self._score = None
+            self._history, self._calls = [], []
+        return batch
+
+
+class HistoryLog:
+    """Append-only log of every finished history line, searchable after it has scrolled out of view."""
+
+    def __init__(self, path=None):
+        self.path = path or cache_path("history.log")
+
+    def append(self, text):
+        try:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(f"{time.strftime('%Y-%m-%d %H:%M')}  {text}\n")
+        except OSError as e:
+            print(f"   Could not write history log: {e}")
+
+    def search(self, query, limit=HISTORY_CAPACITY):
+        """Newest-first lines containing query (case-insensitive), at most limit of them."""
+        needle, matches = query.lower(), deque(maxlen=limit)
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    if needle in line.lower(): matches.append(line.rstrip("\n"))
+        except OSError:
+            return []
+        return list(reversed(matches))
+
+
+class HistoryBuffer:
+    """
+    The most recent history lines in a fixed-size ring, so a long session keeps a flat footprint.
+    A line goes to the log once it is final, i.e. when the next one is added or the buffer is flushed.
+    """
+
+    def __init__(self, capacity=HISTORY_CAPACITY, log=None):
+        self.lines = deque(maxlen=capacity)
+        self.log = log
+
+    def add(self, text):
+        """Appends a line. Returns True if the oldest line was evicted to make room."""
+        if self.lines and self.log: self.log.append(self.lines[-1])
+        evicted = len(self.lines) == self.lines.maxlen
+        self.lines.append(text)
+        return evicted
+
+    def replace_last(self, text):
+        if self.lines: self.lines[-1] = text
+        else: self.lines.append(text)
+
+    def flush(self):
+        """Logs the last line and empties the buffer."""
+        if self.lines and self.log: self.log.append(self.lines[-1])
+        self.lines.clear()